@@ -1,8 +1,8 @@
 from datasets import Dataset
 import sympy as sp
-import re
 from typing import Dict, List
 import numpy as np
+from backend.math_normalization import normalize_math, normalize_many
 
 
 class OpenMathProcessor:
@@ -13,14 +13,6 @@ class OpenMathProcessor:
             'Varsity' : ['Varsity']
         }
 
-        self.replacements = [
-            (r'\b(\d+)\s*([a-zA-Z])\b', r'\1*\2'),  # 2x → 2*x
-            (r'\s+', ' '),  # Normalize whitespace
-            ('×', '*'), ('÷', '/'), ('^', '**'),
-            (r'\\frac\{([^}]+)\}\{([^}]+)\}', r'(\1)/(\2)'),  # LaTeX fractions
-            (r'\\sqrt\{([^}]+)\}', r'sqrt(\1)')  # LaTeX sqrt
-        ]
-
     def process_dataset(self, hf_dataset: Dataset) -> List[Dict]:
         """Process the entire HuggingFace dataset"""
         processed_data = []
@@ -40,7 +32,7 @@ class OpenMathProcessor:
         
         # Process solution
         solution = problem.get('solution', {})
-        steps = [self._normalize_text(step) for step in solution.get('steps', [])]
+        steps = self._normalize_many(solution.get('steps', []))
         
         # Process metadata
         metadata = problem.get('metadata', {})
@@ -80,7 +72,7 @@ class OpenMathProcessor:
             samples.append({
                 'problem_id': f"{problem['id']}_{error['type']}",
                 'text': problem['text'],
-                'workings': [self._normalize_text(step) for step in error.get('incorrect_steps', [])],
+                'workings': self._normalize_many(error.get('incorrect_steps', [])),
                 'answer': self._normalize_text(error.get('incorrect_answer', '')),
                 'domain': problem['domain'],
                 'grade': problem['grade_level'],
@@ -98,9 +90,12 @@ class OpenMathProcessor:
         if not isinstance(text, str):
             return str(text)
             
-        for pattern, repl in self.replacements:
-            text = re.sub(pattern, repl, text)
-        return text.strip()
+        return normalize_math(text).strip()
+
+    def _normalize_many(self, texts: List[str]) -> List[str]:
+        """Normalize a list of steps in one batch"""
+        strings = [text if isinstance(text, str) else str(text) for text in texts]
+        return [text.strip() for text in normalize_many(strings)]
     
     def _map_grade_level(self, level: str) -> str:
         """Map to specific grade"""
@@ -3,7 +3,8 @@ from .models import (
     Program, Module, Topic,
     TopicResource, Assessment, Question,
     UserProgress, TestResult,
-    UserProfile
+    UserProfile, UserRatingStats, ConceptWeakness,
+    QuestionAttempt
 )
 from django.utils.html import format_html
 import markdown
@@ -27,4 +28,7 @@ admin.site.register(Assessment)
 admin.site.register(Question)
 admin.site.register(UserProfile)
 admin.site.register(UserProgress)
-admin.site.register(TestResult)
\ No newline at end of file
+admin.site.register(TestResult)
+admin.site.register(UserRatingStats)
+admin.site.register(ConceptWeakness)
+admin.site.register(QuestionAttempt)
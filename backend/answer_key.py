@@ -0,0 +1,124 @@
+"""
+Answer keys for assessment grading.
+
+An assessment's questions are compiled once into an answer key (expected
+answers already normalized for the question type's matcher) and kept in the
+Django cache until a question of that assessment is saved or deleted (see
+signals.py). Submissions are then graded in one pass over the key, looking
+submitted answers up by question id.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Question
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+# How a submitted answer is compared with the correct one, per question type
+MATCHERS = {
+    'MCQ': 'exact',  # Same text as the stored answer, case-insensitive; letters aren't mapped to options
+    'TF': 'exact',
+    'FIB': 'text',  # Free text: case-insensitive, runs of whitespace ignored
+    'SA': 'text',
+}
+
+
+def normalize_answer(value, matcher: str) -> str:
+    text = str(value).lower()
+    if matcher == 'text':
+        text = _WHITESPACE.sub(' ', text).strip()
+    return text
+
+
+def build_answer_key(questions) -> dict:
+    """Answer key from question rows (dicts with id, text, question_type, correct_answer, concept_tags)"""
+    entries = []
+    for question in questions:
+        matcher = MATCHERS.get(question['question_type'], 'exact')
+        entries.append({
+            'id': question['id'],
+            'text': question['text'],
+            'correct_answer': question['correct_answer'],
+            'concept': question['concept_tags'],
+            'matcher': matcher,
+            'expected': normalize_answer(question['correct_answer'], matcher),
+        })
+    return {'questions': entries}
+
+
+def answer_key_cache_key(assessment_id) -> str:
+    return f"answerkey:v1:{assessment_id}"
+
+
+def get_answer_key(assessment_id) -> dict:
+    """The assessment's compiled answer key, from the cache or built with one query"""
+    cache = caches[getattr(settings, 'ASSESSMENT_ANSWER_KEY_CACHE', 'default')]
+    key = answer_key_cache_key(assessment_id)
+    try:
+        answer_key = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Answer key cache read failed: {str(e)}")
+        answer_key = None
+    if answer_key is not None:
+        return answer_key
+
+    answer_key = build_answer_key(
+        Question.objects.filter(assessment_id=assessment_id).order_by('id').values(
+            'id', 'text', 'question_type', 'correct_answer', 'concept_tags'
+        )
+    )
+    try:
+        cache.set(key, answer_key, getattr(settings, 'ASSESSMENT_ANSWER_KEY_TIMEOUT', 3600))
+    except Exception as e:
+        logger.warning(f"Answer key cache write failed: {str(e)}")
+    return answer_key
+
+
+def invalidate_answer_key(assessment_id):
+    try:
+        caches[getattr(settings, 'ASSESSMENT_ANSWER_KEY_CACHE', 'default')].delete(
+            answer_key_cache_key(assessment_id)
+        )
+    except Exception as e:
+        logger.warning(f"Could not invalidate answer key for assessment {assessment_id}: {str(e)}")
+
+
+def grade_answers(answer_key: dict, answers: list) -> dict:
+    """Grade submitted [{'question_id', 'answer'}, ...] against an answer key in one pass"""
+    submitted = {}
+    for answer in answers:
+        try:
+            submitted[int(answer['question_id'])] = answer.get('answer')
+        except (KeyError, TypeError, ValueError):
+            continue
+
+    correct = 0
+    detailed_results = []
+    for question in answer_key['questions']:
+        user_answer = submitted.get(question['id'])
+        is_correct = (
+            user_answer is not None
+            and normalize_answer(user_answer, question['matcher']) == question['expected']
+        )
+        correct += is_correct
+        detailed_results.append({
+            'question_id': question['id'],
+            'question_text': question['text'],
+            'correct_answer': question['correct_answer'],
+            'user_answer': user_answer,
+            'is_correct': is_correct,
+            'concept': question['concept']
+        })
+
+    total = len(answer_key['questions'])
+    return {
+        'correct': correct,
+        'total': total,
+        'score': (correct / total) * 100 if total > 0 else 0,
+        'detailed_results': detailed_results,
+    }
@@ -2,7 +2,9 @@ import logging
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import get_user_model
-from firebase_admin import auth
+from .lazy_imports import lazy_module
+
+auth = lazy_module('firebase_admin.auth')
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -0,0 +1,112 @@
+"""
+Canonical forms of stored correct answers.
+
+Question and MathProblem parse their correct_answer once and keep the result
+in ``canonical_answer``. Grading then probes only the submitted answer and
+compares it with the stored fingerprint, so the expected side of a comparison
+is never re-parsed per submission.
+
+Parsing may start the sympy worker pool, so save() never does it: it only
+drops a form computed from an older answer and schedules the new one on a
+background thread after commit. Grading computes a form that still isn't
+there (stored_canonical), and canonicalize_answers backfills in bulk.
+"""
+import logging
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .equivalence import canonical_form
+from .executors import get_executor
+from .math_normalization import normalize_math
+from .symbolic_pool import get_symbolic_pool
+
+logger = logging.getLogger(__name__)
+
+
+def answer_expression(text: str) -> str:
+    """The part of an answer that gets compared: the right-hand side of its last '=', normalized"""
+    return normalize_math(str(text).split('=')[-1].strip())
+
+
+def canonicalize_answer(text: str):
+    """
+    Canonical form of a correct answer: its source text, the normalized expression
+    and canonical_form() of it. None if sympy timed out, so it's retried on the next save.
+    """
+    normalized = answer_expression(text)
+    pool = get_symbolic_pool()
+    if pool is not None:
+        form = pool.canonical(normalized)
+    else:
+        form = canonical_form(normalized, probes=getattr(settings, 'MATH_NUMERIC_PROBES', 8))
+    if form is None:
+        logger.warning(f"Could not canonicalize answer {text!r} in time")
+        return None
+    return {'source': text, 'normalized': normalized, **form}
+
+
+def current_canonical(text: str, canonical):
+    """The stored canonical form if it was computed from this answer text, else None"""
+    if canonical and canonical.get('source') == text:
+        return canonical
+    return None
+
+
+def refresh_canonical_answer(instance, force=False) -> bool:
+    """Recompute instance.canonical_answer if correct_answer changed since it was computed"""
+    if not force and current_canonical(instance.correct_answer, instance.canonical_answer):
+        return False
+    instance.canonical_answer = canonicalize_answer(instance.correct_answer)
+    return True
+
+
+def wants_canonical(instance) -> bool:
+    """MathProblems always; Questions only of a free-form type"""
+    types = getattr(instance, 'CANONICAL_TYPES', None)
+    return types is None or instance.question_type in types
+
+
+def prepare_canonical_on_save(instance):
+    """
+    Called from save(): drop a canonical form that no longer matches correct_answer
+    and, once the save commits, compute the new one on a background thread
+    """
+    if not wants_canonical(instance):
+        instance.canonical_answer = None
+        return
+    if current_canonical(instance.correct_answer, instance.canonical_answer):
+        return
+    instance.canonical_answer = None
+    model, text = type(instance), instance.correct_answer
+    transaction.on_commit(
+        lambda: get_executor('canonical-answers', 1).submit(_canonicalize_row, model, instance.pk, text)
+    )
+
+
+def _canonicalize_row(model, pk, text):
+    close_old_connections()
+    try:
+        _store(model, pk, text, canonicalize_answer(text))
+    except Exception as e:
+        logger.error(f"Could not canonicalize {model.__name__} {pk}: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def _store(model, pk, text, canonical):
+    if canonical is not None:
+        # Skipped if the answer was edited again meanwhile; that edit scheduled its own
+        model.objects.filter(pk=pk, correct_answer=text).update(canonical_answer=canonical)
+
+
+def stored_canonical(instance):
+    """The instance's current canonical form, computed and stored now if it isn't there yet"""
+    if not wants_canonical(instance):
+        return None
+    canonical = current_canonical(instance.correct_answer, instance.canonical_answer)
+    if canonical is None:
+        canonical = canonicalize_answer(instance.correct_answer)
+        _store(type(instance), instance.pk, instance.correct_answer, canonical)
+        instance.canonical_answer = canonical
+    return canonical
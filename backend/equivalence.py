@@ -0,0 +1,169 @@
+import zlib
+
+import numpy as np
+
+from .lazy_imports import lazy_module
+
+# Loaded by the first comparison, usually in a symbolic worker process rather than the web worker
+sympy = lazy_module('sympy')
+
+# Which stage of the tiered checker decided a comparison
+TIER_CACHE = 'cache'
+TIER_CANONICAL = 'canonical'
+TIER_NUMERIC = 'numeric'
+TIER_SIMPLIFY = 'simplify'
+TIER_PARSE_ERROR = 'parse_error'
+TIER_TIMEOUT = 'timeout'
+
+
+def numeric_probe(left_expr, right_expr, probes=8, tolerance=1e-8, seed=0):
+    """
+    Compare two sympy expressions at random complex points with NumPy.
+    Returns True if they agree everywhere, False if they disagree everywhere,
+    and None when the probe is inconclusive (mixed results, too many
+    non-finite values, or an expression NumPy can't evaluate).
+    """
+    variables = sorted(left_expr.free_symbols | right_expr.free_symbols, key=str)
+    rng = np.random.default_rng(seed)
+    # Complex points keep sqrt/log of negative values defined
+    points = rng.uniform(-10, 10, size=(len(variables), probes)) + \
+        1j * rng.uniform(-1, 1, size=(len(variables), probes))
+
+    try:
+        left_fn = sympy.lambdify(variables, left_expr, 'numpy')
+        right_fn = sympy.lambdify(variables, right_expr, 'numpy')
+        with np.errstate(all='ignore'):
+            left_values = np.broadcast_to(np.asarray(left_fn(*points), dtype=complex), (probes,))
+            right_values = np.broadcast_to(np.asarray(right_fn(*points), dtype=complex), (probes,))
+    except Exception:
+        return None
+
+    finite = np.isfinite(left_values) & np.isfinite(right_values)
+    if finite.sum() < max(2, probes // 2):
+        return None
+
+    close = np.isclose(left_values[finite], right_values[finite], rtol=tolerance, atol=tolerance)
+    if close.all():
+        return True
+    if not close.any():
+        return False
+    return None
+
+
+def tiered_equivalence(left: str, right: str, probes=8, tolerance=1e-8):
+    """
+    Decide whether two normalized expressions are equivalent, cheapest tier first.
+    Returns (result, tier) where tier names the stage that decided it.
+    """
+    try:
+        left_expr = sympy.parse_expr(left)
+        right_expr = sympy.parse_expr(right)
+    except Exception:
+        return False, TIER_PARSE_ERROR
+
+    if probes > 0:
+        probe = numeric_probe(left_expr, right_expr, probes=probes, tolerance=tolerance)
+        if probe is not None:
+            return probe, TIER_NUMERIC
+
+    try:
+        return bool(sympy.simplify(left_expr - right_expr) == 0), TIER_SIMPLIFY
+    except Exception:
+        return False, TIER_SIMPLIFY
+
+
+def symbol_points(name: str, probes=8, seed=0):
+    """Fixed complex probe points for one symbol, the same in every call"""
+    rng = np.random.default_rng([seed, zlib.crc32(name.encode('utf-8'))])
+    return rng.uniform(-10, 10, size=probes) + 1j * rng.uniform(-1, 1, size=probes)
+
+
+def step_probe_values(step: str, probes=8):
+    """
+    Values of one normalized working step at fixed points: lhs - rhs for an
+    equation, the expression itself otherwise. Each symbol is probed at the same
+    points in every step, so values from different steps can be compared without
+    re-parsing them. Returns a list of complex numbers, or None if the step isn't
+    parsable math.
+    """
+    sides = step.split('=')
+    try:
+        expr = sympy.parse_expr(sides[0])
+        if len(sides) > 1:
+            expr = expr - sympy.parse_expr(sides[-1])
+        return _probe_values(expr, probes)
+    except Exception:
+        return None
+
+
+def _probe_values(expr, probes):
+    variables = sorted(expr.free_symbols, key=str)
+    fn = sympy.lambdify(variables, expr, 'numpy')
+    with np.errstate(all='ignore'):
+        values = fn(*[symbol_points(str(v), probes) for v in variables])
+        return np.broadcast_to(np.asarray(values, dtype=complex), (probes,)).tolist()
+
+
+def canonical_form(expr_text: str, probes=8) -> dict:
+    """
+    Parsed form of a normalized answer, for storing next to it: sympy's srepr,
+    its symbols, and a fingerprint of its values at the step_probe_values
+    points as [real, imag] pairs (None where not finite, so it stays valid JSON).
+    srepr and fingerprint are None if the answer isn't parsable math.
+    """
+    form = {'srepr': None, 'symbols': [], 'probes': probes, 'fingerprint': None}
+    try:
+        expr = sympy.parse_expr(expr_text)
+        form['srepr'] = sympy.srepr(expr)
+        form['symbols'] = sorted(str(s) for s in expr.free_symbols)
+        form['fingerprint'] = [
+            [value.real, value.imag] if np.isfinite(value) else None
+            for value in _probe_values(expr, probes)
+        ]
+    except Exception:
+        pass
+    return form
+
+
+def fingerprint_match(values, fingerprint, tolerance=1e-8):
+    """
+    Compare step_probe_values of a submitted answer with a stored fingerprint.
+    True if they agree at every usable point, False if at none, None if that
+    can't be decided (unparsable answer, mixed results, too few finite points).
+    """
+    if values is None or fingerprint is None or len(values) != len(fingerprint):
+        return None
+    expected = np.array(
+        [complex(*pair) if pair is not None else complex(np.nan, np.nan) for pair in fingerprint]
+    )
+    actual = np.asarray(values, dtype=complex)
+    finite = np.isfinite(actual) & np.isfinite(expected)
+    if finite.sum() < max(2, len(values) // 2):
+        return None
+
+    close = np.isclose(actual[finite], expected[finite], rtol=tolerance, atol=tolerance)
+    if close.all():
+        return True
+    if not close.any():
+        return False
+    return None
+
+
+def follows_from(previous, current, tolerance=1e-6):
+    """
+    Whether a step is the previous one multiplied by a nonzero constant, i.e. the
+    same equation after moving terms or scaling both sides. Takes values from
+    step_probe_values; returns None when they can't decide it.
+    """
+    if previous is None or current is None:
+        return None
+    previous = np.asarray(previous, dtype=complex)
+    current = np.asarray(current, dtype=complex)
+    usable = np.isfinite(previous) & np.isfinite(current) & (np.abs(previous) > 1e-12)
+    if usable.sum() < 2:
+        return None
+
+    ratio = current[usable] / previous[usable]
+    if np.all(np.abs(ratio) < 1e-12):
+        return None
+    return bool(np.allclose(ratio, ratio[0], rtol=tolerance, atol=1e-12))
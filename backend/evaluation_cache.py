@@ -0,0 +1,53 @@
+import hashlib
+import re
+
+from .two_tier_cache import TwoTierCache
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_steps(steps) -> list:
+    """
+    Collapse whitespace in each step. Whitespace is the only difference the
+    tokenizer, error heuristics and symbolic check all ignore, so workings that
+    normalize the same always evaluate the same.
+    """
+    return [_WHITESPACE.sub(' ', str(step)).strip() for step in steps]
+
+
+class EvaluationResultCache:
+    """
+    Content-addressed cache of full evaluation results.
+    Keys hash the model version, the problem text and the normalized steps, so a
+    new model artifact never serves results computed by the old one. Entries live
+    in a TwoTierCache whose local tier expires them after ``ttl`` seconds.
+    """
+
+    def __init__(self, model_version, max_size=20000, ttl=3600,
+                 shared_alias=None, shared_timeout=3600, prefix='mathevals'):
+        self.model_version = model_version
+        self.cache = TwoTierCache(
+            prefix, max_size=max_size, ttl=ttl, shared_alias=shared_alias, shared_timeout=shared_timeout
+        )
+
+    def make_key(self, problem_text: str, steps: list, expected: dict = None) -> str:
+        payload = '\x00'.join([self.model_version, problem_text.strip()] + normalize_steps(steps))
+        if expected is not None:
+            payload += '\x01' + expected['normalized']  # Graded against a stored canonical answer
+        return self.cache.make_key(hashlib.sha1(payload.encode('utf-8')).hexdigest())
+
+    def get(self, problem_text: str, steps: list, expected: dict = None):
+        """Cached evaluation (a fresh copy), or None on a miss"""
+        value = self.cache.get(self.make_key(problem_text, steps, expected))
+        return dict(value) if value is not None else None
+
+    def set(self, problem_text: str, steps: list, value: dict, expected: dict = None):
+        self.cache.set(self.make_key(problem_text, steps, expected), dict(value))
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        data = self.cache.stats()
+        data['model_version'] = self.model_version
+        return data
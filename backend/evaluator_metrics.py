@@ -0,0 +1,132 @@
+"""
+Per-stage timings of math evaluation.
+
+Every evaluation records how long tokenize, predict, detect_errors and
+symbolic took into process-wide histograms, exposed in the Prometheus text
+format at /api/evaluator-metrics/ and summarised in registry_status(). A
+StageTimer also keeps the durations of its own evaluation, which views attach
+to the response when debugging.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_lock = threading.Lock()
+_metrics = None
+
+
+class StageHistogram:
+    """Per-bucket counts plus sum, count and max; cumulative() gives Prometheus' le counts"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def cumulative(self) -> list:
+        total, running = [], 0
+        for count in self.counts:
+            running += count
+            total.append(running)
+        return total
+
+
+class StageMetrics:
+    """Histograms of evaluation stage durations for this process"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = StageHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                stage: {
+                    'count': h.count,
+                    'mean_ms': round(h.sum / h.count * 1000, 3) if h.count else 0.0,
+                    'max_ms': round(h.max * 1000, 3),
+                    'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], h.cumulative())),
+                }
+                for stage, h in sorted(self._histograms.items())
+            }
+
+    def prometheus_text(self) -> str:
+        name = 'math_evaluator_stage_seconds'
+        lines = [
+            f'# HELP {name} Time spent in each stage of a math evaluation',
+            f'# TYPE {name} histogram',
+        ]
+        pid = os.getpid()
+        with self._lock:
+            for stage, h in sorted(self._histograms.items()):
+                labels = f'stage="{stage}",pid="{pid}"'
+                for bound, count in zip([repr(b) for b in self.buckets] + ['+Inf'], h.cumulative()):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{{labels}}} {h.sum}')
+                lines.append(f'{name}_count{{{labels}}} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+def get_stage_metrics():
+    """This process's StageMetrics, or None when MATH_EVALUATOR_STAGE_METRICS is off"""
+    global _metrics
+    if not getattr(settings, 'MATH_EVALUATOR_STAGE_METRICS', True):
+        return None
+    if _metrics is None:
+        with _lock:
+            if _metrics is None:
+                _metrics = StageMetrics(getattr(settings, 'MATH_EVALUATOR_STAGE_BUCKETS', DEFAULT_BUCKETS))
+    return _metrics
+
+
+class StageTimer:
+    """Times the stages of one evaluation, recording each into the process histograms"""
+
+    def __init__(self):
+        self.metrics = get_stage_metrics()
+        self.seconds = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.seconds[name] = self.seconds.get(name, 0.0) + elapsed
+            if self.metrics is not None:
+                self.metrics.observe(name, elapsed)
+
+    def as_ms(self) -> dict:
+        return {name: round(seconds * 1000, 3) for name, seconds in self.seconds.items()}
+
+    def merge_ms(self, timings_ms: dict):
+        """Add durations timed elsewhere, e.g. by the evaluator service"""
+        for name, ms in timings_ms.items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + ms / 1000
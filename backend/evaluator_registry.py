@@ -0,0 +1,182 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .evaluator_metrics import get_stage_metrics
+from .lazy_imports import import_times
+from .process_memory import process_memory
+
+logger = logging.getLogger(__name__)
+
+
+_lock = threading.RLock()
+_artifacts = {}
+_load_info = {}
+_evaluator = None
+
+# Artifacts that own threads, child processes or pipes; a forked worker must build its own
+_PROCESS_BOUND_PREFIXES = ('batcher:', 'symbolic-pool')
+
+
+def get_artifact(key: str, loader):
+    """Return the artifact stored under ``key``, calling ``loader`` at most once per process"""
+    if key in _artifacts:
+        return _artifacts[key]
+
+    with _lock:
+        # Another thread may have finished loading while we waited for the lock
+        if key not in _artifacts:
+            started = time.perf_counter()
+            _artifacts[key] = loader()
+            _load_info[key] = {
+                'loaded': _artifacts[key] is not None,
+                'load_seconds': round(time.perf_counter() - started, 3),
+                'loaded_at': timezone.now().isoformat(),
+            }
+            logger.info(
+                f"Loaded evaluator artifact {key} in "
+                f"{_load_info[key]['load_seconds']}s (pid {os.getpid()})"
+            )
+    return _artifacts[key]
+
+
+def get_math_evaluator():
+    """
+    Shared evaluator for this worker process. With MATH_EVALUATOR_SOCKET set this is a
+    client of run_evaluator_service, so the worker never imports TensorFlow.
+    """
+    global _evaluator
+    if _evaluator is not None:
+        return _evaluator
+
+    with _lock:
+        if _evaluator is None:
+            socket_path = getattr(settings, 'MATH_EVALUATOR_SOCKET', None)
+            if socket_path:
+                from .evaluator_service import RemoteMathEvaluator
+                _evaluator = RemoteMathEvaluator(
+                    socket_path, timeout=getattr(settings, 'MATH_EVALUATOR_SOCKET_TIMEOUT', 30.0)
+                )
+            else:
+                _evaluator = _build_local_evaluator()
+    return _evaluator
+
+
+def get_local_math_evaluator():
+    """In-process MathAnswerEvaluator regardless of MATH_EVALUATOR_SOCKET; the service uses this"""
+    global _evaluator
+    with _lock:
+        if _evaluator is None or getattr(_evaluator, 'is_remote', False):
+            _evaluator = _build_local_evaluator()
+    return _evaluator
+
+
+def _build_local_evaluator():
+    from .math_evaluator import MathAnswerEvaluator  # Avoid circular import
+    return MathAnswerEvaluator()
+
+
+def preload_for_fork():
+    """
+    Load the fork-safe evaluator artifacts in the server master (see gunicorn.conf.py)
+    so workers share them copy-on-write. That is the tokenizer and a quantized .tflite
+    model run by tflite_runtime. The TensorFlow runtime doesn't survive fork, so the
+    master never imports it: without tflite_runtime, or with a Keras model, each
+    worker still loads its own copy.
+    """
+    if not getattr(settings, 'MATH_EVALUATOR_PRELOAD', True):
+        return
+    if getattr(settings, 'MATH_EVALUATOR_SOCKET', None):
+        return  # The evaluator service owns the model
+    from .math_evaluator import default_model_dir, load_step_validator
+    from .tflite_validator import standalone_interpreter
+    from .tokenization import get_tokenizer
+
+    get_tokenizer()
+    if standalone_interpreter() is None:
+        logger.warning(
+            "tflite_runtime is not installed, so the step validator is not preloaded; "
+            "each worker will load it itself. Install tflite-runtime to let workers share one copy."
+        )
+        return
+    model, path, backend = load_step_validator(default_model_dir(), fork_safe_only=True)
+    if model is None:
+        logger.warning(
+            "No .tflite step validator to preload; each worker will load the Keras model itself. "
+            "Run export_math_evaluator to let workers share one copy."
+        )
+
+
+def reinit_after_fork():
+    """Run in each new worker: drop artifacts tied to the parent's threads and processes"""
+    global _lock, _evaluator
+    _lock = threading.RLock()
+    _evaluator = None
+    for key in list(_artifacts):
+        if key.startswith(_PROCESS_BOUND_PREFIXES):
+            del _artifacts[key]
+            _load_info.pop(key, None)
+
+    # Models keep their weights but need a runtime (and thread pool) of their own
+    for artifact in _artifacts.values():
+        if hasattr(artifact, 'reset_after_fork'):
+            artifact.reset_after_fork()
+
+
+def registry_status() -> dict:
+    """Load state of the evaluator and its artifacts, used for cold-worker alerts"""
+    with _lock:
+        artifacts = {key: dict(info) for key, info in _load_info.items()}
+        evaluator = _evaluator
+
+    if getattr(evaluator, 'is_remote', False):
+        service = evaluator.service_status()
+        return {
+            'pid': os.getpid(),
+            'evaluator_loaded': True,
+            'model_ready': bool(service and service.get('model_ready')),
+            'model_backend': evaluator.model_backend,
+            'model_path': evaluator.model_path,
+            'service': service,
+            'lazy_imports': import_times(),
+            'memory': process_memory(),
+        }
+
+    batcher = getattr(evaluator, 'batcher', None)
+    metrics = get_stage_metrics()
+    return {
+        'pid': os.getpid(),
+        'evaluator_loaded': evaluator is not None,
+        'model_ready': evaluator.is_ready() if evaluator is not None else False,
+        'model_backend': evaluator.model_backend if evaluator is not None else None,
+        'model_path': evaluator.model_path if evaluator is not None else None,
+        'total_load_seconds': round(
+            sum(info['load_seconds'] for info in artifacts.values()), 3
+        ),
+        'artifacts': artifacts,
+        'batching': batcher.stats() if batcher is not None else None,
+        'symbolic_cache': evaluator.symbolic_cache.stats() if evaluator is not None else None,
+        'symbolic_tiers': dict(evaluator.symbolic_tiers) if evaluator is not None else None,
+        'symbolic_pool': (
+            evaluator.symbolic_pool.stats()
+            if evaluator is not None and evaluator.symbolic_pool is not None else None
+        ),
+        'prefix_cache': evaluator.prefix_cache.stats() if evaluator is not None else None,
+        'evaluation_cache': evaluator.evaluation_cache.stats() if evaluator is not None else None,
+        'stage_timings': metrics.snapshot() if metrics is not None else None,
+        'lazy_imports': import_times(),
+        'memory': process_memory(),
+    }
+
+
+def reset_registry():
+    """Drop every cached artifact so the next call reloads them"""
+    global _evaluator
+    with _lock:
+        _artifacts.clear()
+        _load_info.clear()
+        _evaluator = None
@@ -0,0 +1,235 @@
+"""
+Optional evaluator sidecar.
+
+``manage.py run_evaluator_service`` owns the model in one process and answers
+over a Unix domain socket. When MATH_EVALUATOR_SOCKET is set, web workers get a
+RemoteMathEvaluator from get_math_evaluator() instead of loading TensorFlow
+themselves. Each client connection is served on its own thread, so concurrent
+requests from all workers meet in the service's micro-batcher and share
+forward passes.
+
+Messages are JSON objects framed by a 4-byte big-endian length.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+
+from .evaluator_metrics import StageTimer, get_stage_metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_BYTES = 16 * 2**20
+_HEADER = struct.Struct('>I')
+
+
+class EvaluatorServiceError(Exception):
+    """The evaluator service could not be reached or could not answer"""
+
+
+def send_message(sock, payload):
+    data = json.dumps(payload).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def recv_message(sock):
+    """Next message from the socket, or None if the peer closed the connection before sending one"""
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_MESSAGE_BYTES:
+        raise ValueError(f"Message of {length} bytes exceeds the {MAX_MESSAGE_BYTES} byte limit")
+    body = _recv_exact(sock, length)
+    if body is None:
+        raise ConnectionError("Connection closed in the middle of a message")
+    return json.loads(body)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            if chunks:
+                raise ConnectionError("Connection closed in the middle of a message")
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                message = recv_message(self.request)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping evaluator service connection: {str(e)}")
+                return
+            if message is None:
+                return
+            try:
+                response = {'ok': True, 'result': self.server.dispatch(message)}
+            except Exception as e:
+                logger.error(f"Evaluator service request failed: {str(e)}", exc_info=True)
+                response = {'ok': False, 'error': str(e)}
+            try:
+                send_message(self.request, response)
+            except OSError:
+                return
+
+
+class EvaluatorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, evaluator, status_fn):
+        self.evaluator = evaluator
+        self.status_fn = status_fn
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # Left behind by a previous run
+        super().__init__(socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o660)
+
+    def dispatch(self, message):
+        op = message.get('op')
+        if op == 'evaluate':
+            timer = StageTimer()
+            result = self.evaluator.evaluate(
+                message['problem_text'], message['workings'], timer=timer, expected=message.get('expected')
+            )
+            if message.get('timings'):
+                result['timings_ms'] = timer.as_ms()
+            return result
+        if op == 'evaluate_many':
+            items = [(problem_text, workings) for problem_text, workings in message['items']]
+            return self.evaluator.evaluate_many(
+                items, batch_size=message.get('batch_size', 256), expected=message.get('expected')
+            )
+        if op == 'symbolic_check':
+            return list(self.evaluator._symbolic_check_with_tier(message['user_answer'], message['correct_answer']))
+        if op == 'status':
+            return self.status_fn()
+        if op == 'metrics':
+            metrics = get_stage_metrics()
+            return metrics.prometheus_text() if metrics is not None else ''
+        raise ValueError(f"Unknown operation {op!r}")
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class EvaluatorClient:
+    """Connection to the evaluator service; each thread keeps its own socket"""
+
+    def __init__(self, socket_path, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def call(self, op, **params):
+        params['op'] = op
+        # One retry on a fresh connection covers a service restart since the last call.
+        # Only retry when the request can't have started: connecting or sending failed,
+        # or the service closed the socket without a byte of reply. After a receive
+        # timeout the evaluation may still be running, so it is never sent twice.
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                send_message(sock, params)
+            except OSError as e:
+                self._disconnect()
+                if attempt:
+                    raise EvaluatorServiceError(f"Evaluator service at {self.socket_path}: {str(e)}") from e
+                continue
+            try:
+                response = recv_message(sock)
+            except (OSError, ValueError) as e:
+                self._disconnect()
+                raise EvaluatorServiceError(f"Evaluator service at {self.socket_path}: {str(e)}") from e
+            if response is not None:
+                break
+            self._disconnect()
+            if attempt:
+                raise EvaluatorServiceError(f"Evaluator service at {self.socket_path} closed the connection")
+
+        if not response['ok']:
+            raise EvaluatorServiceError(response['error'])
+        return response['result']
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+
+class RemoteMathEvaluator:
+    """Stands in for MathAnswerEvaluator in web workers when the evaluator service is configured"""
+    is_remote = True
+    model_backend = 'service'
+
+    def __init__(self, socket_path, timeout=30.0):
+        self.client = EvaluatorClient(socket_path, timeout=timeout)
+        self.model_path = socket_path
+
+    def evaluate(self, problem_text: str, user_workings: list, timer: StageTimer = None,
+                 expected: dict = None) -> dict:
+        result = self.client.call(
+            'evaluate', problem_text=problem_text, workings=list(user_workings),
+            timings=timer is not None, expected=expected
+        )
+        if timer is not None:
+            timer.merge_ms(result.pop('timings_ms', {}))
+        return result
+
+    def evaluate_many(self, items: list, batch_size: int = 256, expected: list = None) -> list:
+        return self.client.call(
+            'evaluate_many',
+            items=[[problem_text, list(workings)] for problem_text, workings in items],
+            batch_size=batch_size,
+            expected=expected
+        )
+
+    def _symbolic_check_with_tier(self, user_answer: str, correct_answer: str):
+        result, tier = self.client.call(
+            'symbolic_check', user_answer=user_answer, correct_answer=correct_answer
+        )
+        return result, tier
+
+    def _symbolic_check(self, user_answer: str, correct_answer: str):
+        return self._symbolic_check_with_tier(user_answer, correct_answer)[0]
+
+    def metrics_text(self) -> str:
+        """The service's stage histograms in the Prometheus text format"""
+        return self.client.call('metrics')
+
+    def service_status(self):
+        """registry_status() of the service process, or None if it can't be reached"""
+        try:
+            return self.client.call('status')
+        except EvaluatorServiceError as e:
+            logger.warning(str(e))
+            return None
+
+    def is_ready(self):
+        status = self.service_status()
+        return bool(status and status.get('model_ready'))
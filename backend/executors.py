@@ -0,0 +1,44 @@
+"""
+Per-process thread pools for background work (prefix warming, grading jobs, profile refreshes).
+
+Pools are started on first use. Their threads don't survive fork, so a forked
+worker calls reset_after_fork (see gunicorn.conf.py) and starts its own.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    """The pool called ``name`` for this process, started on first use"""
+    executor = _executors.get(name)
+    if executor is not None:
+        return executor
+
+    with _lock:
+        # Another thread may have started it while we waited for the lock
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+            logger.info(f"Started {name} pool with {max_workers} threads")
+        return _executors[name]
+
+
+def shutdown_executors(wait=True):
+    """Stop every pool, by default after the work already queued on it"""
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
+
+
+def reset_after_fork():
+    """In a forked child: forget the parent's pools, whose threads didn't come along"""
+    global _lock
+    _lock = threading.Lock()
+    _executors.clear()
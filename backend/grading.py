@@ -0,0 +1,260 @@
+"""
+Background grading of math submissions.
+
+Views persist the submission and a GradingJob, then hand the job id to a
+per-process worker pool once the transaction commits. The request therefore
+only pays for the inserts; clients poll the job for the evaluation.
+The pool lives only as long as its process, so jobs left PENDING or
+PROCESSING by a killed or restarted worker are requeued by
+requeue_stale_jobs: at worker start, when their status is polled, and from
+the requeue_grading_jobs command.
+Bulk submissions get one job per workings but are graded together with
+batched forward passes (run_grading_jobs_bulk); re-grading and imports from
+the command line call grade_workings_bulk directly.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .canonical_answers import stored_canonical
+from .evaluator_registry import get_math_evaluator
+from .executors import get_executor
+from .models import GradingJob, MathWorkings
+
+logger = logging.getLogger(__name__)
+
+
+def build_feedback(evaluation: dict) -> str:
+    if evaluation['is_correct']:
+        return "Your solution is correct!"
+
+    feedback = "There are some issues with your solution:\n"
+    if 'sign_error' in evaluation['errors']:
+        feedback += "- Check your sign changes when moving terms\n"
+    if 'missing_step' in evaluation['errors']:
+        feedback += "- Some steps seem to be missing in your reasoning\n"
+
+    return feedback
+
+
+def get_grading_executor():
+    """Shared grading pool for this process, created on first use"""
+    return get_executor('math-grading', getattr(settings, 'MATH_GRADING_WORKERS', 2))
+
+
+def enqueue_grading(job_id):
+    """Schedule a job once the transaction that created it commits"""
+    transaction.on_commit(lambda: get_grading_executor().submit(run_grading_job, job_id))
+
+
+def enqueue_bulk_grading(job_ids):
+    """Schedule many workings jobs as one batched run once the transaction commits"""
+    job_ids = list(job_ids)
+    transaction.on_commit(lambda: get_grading_executor().submit(run_grading_jobs_bulk, job_ids))
+
+
+def _stale_cutoff():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'MATH_GRADING_STALE_SECONDS', 60))
+
+
+def is_stale(job) -> bool:
+    """Whether a job has waited or run so long that the process holding it is likely gone"""
+    cutoff = _stale_cutoff()
+    if job.status == 'PENDING':
+        return job.created_at < cutoff
+    return job.status == 'PROCESSING' and job.started_at is not None and job.started_at < cutoff
+
+
+def requeue_stale_jobs(job_ids=None) -> dict:
+    """
+    Put stale jobs (see is_stale) on this process's pool, all of them or those in job_ids.
+    A PROCESSING job goes back to PENDING unless it already had MATH_GRADING_MAX_ATTEMPTS
+    tries, in which case it is FAILED so a job that kills its worker can't loop.
+    Requeueing a job another process still holds is harmless: only one can claim it.
+    """
+    jobs = GradingJob.objects.all() if job_ids is None else GradingJob.objects.filter(id__in=job_ids)
+    cutoff = _stale_cutoff()
+    max_attempts = getattr(settings, 'MATH_GRADING_MAX_ATTEMPTS', 3)
+
+    interrupted = jobs.filter(status='PROCESSING', started_at__lt=cutoff)
+    failed = interrupted.filter(attempts__gte=max_attempts).update(
+        status='FAILED', error=f"Grading was interrupted {max_attempts} times", completed_at=timezone.now()
+    )
+    interrupted.filter(attempts__lt=max_attempts).update(status='PENDING')
+
+    stale_ids = list(
+        jobs.filter(status='PENDING', created_at__lt=cutoff).order_by('created_at').values_list('id', flat=True)
+    )
+    executor = get_grading_executor()
+    for job_id in stale_ids:
+        executor.submit(run_grading_job, job_id)
+    if stale_ids or failed:
+        logger.warning(f"Requeued {len(stale_ids)} stale grading jobs, failed {failed} interrupted too often")
+    return {'requeued': len(stale_ids), 'failed': failed}
+
+
+def run_grading_job(job_id):
+    """Grade one job; model inference runs outside any database transaction"""
+    close_old_connections()
+    try:
+        # Claiming with a conditional update stops two workers grading the same job
+        claimed = GradingJob.objects.filter(id=job_id, status='PENDING').update(
+            status='PROCESSING', started_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if not claimed:
+            return
+
+        job = GradingJob.objects.select_related(
+            'workings__problem', 'answer__question'
+        ).get(id=job_id)
+        try:
+            problem_text, steps, expected = _grading_input(job)
+            evaluation = get_math_evaluator().evaluate(problem_text, steps, expected=expected)
+            result = {
+                'is_correct': bool(evaluation['is_correct']),
+                'score': float(evaluation['score']),
+                'errors': list(evaluation['errors']),
+                'feedback': build_feedback(evaluation),
+            }
+            _store_result(job, result)
+        except Exception as e:
+            logger.error(f"Grading job {job_id} failed: {str(e)}", exc_info=True)
+            GradingJob.objects.filter(id=job_id).update(
+                status='FAILED', error=str(e), completed_at=timezone.now()
+            )
+    finally:
+        close_old_connections()
+
+
+def run_grading_jobs_bulk(job_ids):
+    """Grade workings jobs a chunk at a time with batched forward passes (see grade_workings_bulk)"""
+    close_old_connections()
+    chunk_size = getattr(settings, 'MATH_BULK_CHUNK_SIZE', 1000)
+    try:
+        for start in range(0, len(job_ids), chunk_size):
+            ids = job_ids[start:start + chunk_size]
+            # Claim like run_grading_job; the shared started_at tells our claims from another process's
+            started_at = timezone.now()
+            GradingJob.objects.filter(id__in=ids, status='PENDING').update(
+                status='PROCESSING', started_at=started_at, attempts=F('attempts') + 1
+            )
+            jobs = list(GradingJob.objects.filter(
+                id__in=ids, status='PROCESSING', started_at=started_at
+            ).select_related('workings__problem'))
+            if jobs:
+                _grade_jobs_chunk(jobs)
+    finally:
+        close_old_connections()
+
+
+def _grade_jobs_chunk(jobs):
+    try:
+        grade_workings_bulk([job.workings for job in jobs], chunk_size=len(jobs))
+    except Exception as e:
+        logger.error(f"Bulk grading of {len(jobs)} jobs failed: {str(e)}", exc_info=True)
+        GradingJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            status='FAILED', error=str(e), completed_at=timezone.now()
+        )
+        return
+
+    completed_at = timezone.now()
+    for job in jobs:
+        workings = job.workings
+        job.status = 'COMPLETED'
+        job.result = {
+            'is_correct': workings.is_correct,
+            'score': workings.confidence,
+            'errors': workings.error_types,
+            'feedback': workings.feedback,
+        }
+        job.completed_at = completed_at
+    GradingJob.objects.bulk_update(jobs, ['status', 'result', 'completed_at'])
+
+
+def grade_workings_bulk(workings, batch_size=None, chunk_size=None) -> dict:
+    """
+    Grade many MathWorkings (with problem loaded) in batched forward passes,
+    writing results back with one bulk_update per chunk. Returns throughput stats.
+    """
+    batch_size = batch_size or getattr(settings, 'MATH_BULK_BATCH_SIZE', 256)
+    chunk_size = chunk_size or getattr(settings, 'MATH_BULK_CHUNK_SIZE', 1000)
+    evaluator = get_math_evaluator()
+
+    started = time.perf_counter()
+    graded = correct = 0
+    chunk = []
+    for item in workings:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            correct += _grade_chunk(evaluator, chunk, batch_size)
+            graded += len(chunk)
+            chunk = []
+    if chunk:
+        correct += _grade_chunk(evaluator, chunk, batch_size)
+        graded += len(chunk)
+
+    seconds = time.perf_counter() - started
+    return {
+        'graded': graded,
+        'correct': correct,
+        'seconds': round(seconds, 3),
+        'per_second': round(graded / seconds, 1) if seconds else None,
+    }
+
+
+def _grade_chunk(evaluator, chunk, batch_size) -> int:
+    expected = {}
+    for w in chunk:
+        if w.problem_id not in expected:
+            expected[w.problem_id] = stored_canonical(w.problem)
+    evaluations = evaluator.evaluate_many(
+        [(w.problem.text, w.steps) for w in chunk],
+        batch_size=batch_size,
+        expected=[expected[w.problem_id] for w in chunk]
+    )
+    for workings, evaluation in zip(chunk, evaluations):
+        workings.is_correct = bool(evaluation['is_correct'])
+        workings.confidence = float(evaluation['score'])
+        workings.error_types = list(evaluation['errors'])
+        workings.feedback = build_feedback(evaluation)
+
+    MathWorkings.objects.bulk_update(
+        chunk, ['is_correct', 'confidence', 'error_types', 'feedback'], batch_size=len(chunk)
+    )
+    return sum(w.is_correct for w in chunk)
+
+
+def _grading_input(job):
+    """(problem text, steps, stored canonical answer or None) for a job"""
+    if job.workings_id:
+        problem = job.workings.problem
+        return problem.text, job.workings.steps, stored_canonical(problem)
+    steps = list(
+        job.answer.workings.order_by('step_number').values_list('content', flat=True)
+    )
+    question = job.answer.question
+    return question.text, steps, stored_canonical(question)
+
+
+@transaction.atomic
+def _store_result(job, result):
+    if job.workings_id:
+        workings = job.workings
+        workings.is_correct = result['is_correct']
+        workings.confidence = result['score']
+        workings.error_types = result['errors']
+        workings.feedback = result['feedback']
+        workings.save(update_fields=['is_correct', 'confidence', 'error_types', 'feedback'])
+    if job.answer_id:
+        job.answer.is_correct = result['is_correct']
+        job.answer.save(update_fields=['is_correct'])
+
+    job.status = 'COMPLETED'
+    job.result = result
+    job.completed_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'completed_at'])
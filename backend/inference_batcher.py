@@ -0,0 +1,90 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-row inference requests for a few milliseconds
+    and runs them through the model as one batch.
+    Callers block on submit() until their own score is ready.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'batches': 0, 'largest_batch': 0}
+        self._worker = threading.Thread(
+            target=self._run, name='math-eval-batcher', daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, input_ids, attention_mask, timeout=None) -> float:
+        """Queue one tokenized row and wait for its score"""
+        future = Future()
+        self._queue.put((np.asarray(input_ids), np.asarray(attention_mask), future))
+        return future.result(timeout=timeout)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            data = dict(self._stats)
+        data['avg_batch_size'] = (
+            round(data['requests'] / data['batches'], 2) if data['batches'] else 0.0
+        )
+        data['max_batch_size'] = self.max_batch_size
+        data['max_wait_ms'] = self.max_wait * 1000
+        data['queued'] = self._queue.qsize()
+        return data
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            # Rows padded to different length buckets get one forward pass per length
+            by_length = {}
+            for item in batch:
+                by_length.setdefault(item[0].shape[-1], []).append(item)
+            for group in by_length.values():
+                self._predict_group(group)
+
+            with self._stats_lock:
+                self._stats['requests'] += len(batch)
+                self._stats['batches'] += len(by_length)
+                self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+
+    def _predict_group(self, group):
+        futures = [item[2] for item in group]
+        try:
+            input_ids = np.concatenate([item[0] for item in group], axis=0)
+            attention_mask = np.concatenate([item[1] for item in group], axis=0)
+            scores = np.asarray(self.predict_fn(input_ids, attention_mask)).reshape(-1)
+            for future, score in zip(futures, scores):
+                future.set_result(float(score))
+        except Exception as e:
+            logger.error(f"Batched inference failed: {str(e)}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,58 @@
+"""
+Heavy third-party modules, imported on first use.
+
+tensorflow, transformers, sklearn, sympy and firebase_admin each take seconds
+and hundreds of MB to import. Web workers and manage.py commands that never
+touch them shouldn't pay for that at boot, so modules that need one do
+``tf = lazy_module('tensorflow')`` at the top and use ``tf`` as usual.
+"""
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Must not be imported just by loading Django settings, apps and the URLconf
+HEAVY_MODULES = ('tensorflow', 'transformers', 'sklearn', 'sympy', 'firebase_admin', 'datasets', 'torch')
+
+_lock = threading.Lock()
+_load_seconds = {}
+
+
+class LazyModule:
+    """Stands in for a module and imports it on the first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if attr in ('_name', '_module'):
+            raise AttributeError(attr)  # Not initialised yet, e.g. mid-copy
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module {self._name!r} ({state})>"
+
+    def _load(self):
+        if self._module is None:
+            with _lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    _load_seconds[self._name] = round(time.perf_counter() - started, 3)
+                    logger.info(f"Imported {self._name} in {_load_seconds[self._name]}s")
+                    self._module = module
+        return self._module
+
+
+def lazy_module(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def import_times() -> dict:
+    """Seconds each lazily imported module took, for modules imported so far"""
+    with _lock:
+        return dict(_load_seconds)
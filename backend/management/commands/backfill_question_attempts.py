@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from backend.models import QuestionAttempt, TestResult
+from backend.question_attempts import build_attempts, existing_question_ids
+
+
+class Command(BaseCommand):
+    help = (
+        'Writes QuestionAttempt rows for test results saved before the table existed. '
+        'Results are streamed in id order and committed a chunk at a time, so the command '
+        'can be interrupted and re-run; results that already have attempts are skipped '
+        'unless --rebuild is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Test results read and committed per chunk')
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Rewrite the attempts of every result, e.g. after the concept splitting changed'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        pending = TestResult.objects.all()
+        if not options['rebuild']:
+            pending = pending.filter(~Exists(QuestionAttempt.objects.filter(test_result=OuterRef('pk'))))
+        pending = pending.only('id', 'user_id', 'assessment_id', 'timestamp', 'detailed_results').order_by('id')
+
+        last_id = 0
+        results_done = attempts_written = 0
+        while True:
+            # Keyset pagination: each chunk is a fresh indexed range query, not a growing OFFSET
+            chunk = list(pending.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            known = existing_question_ids(result.detailed_results for result in chunk)
+            attempts = [attempt for result in chunk for attempt in build_attempts(result, known)]
+            with transaction.atomic():
+                if options['rebuild']:
+                    QuestionAttempt.objects.filter(test_result__in=chunk).delete()
+                QuestionAttempt.objects.bulk_create(attempts, batch_size=chunk_size)
+            last_id = chunk[-1].id
+            results_done += len(chunk)
+            attempts_written += len(attempts)
+            self.stdout.write(f"{results_done} results, {attempts_written} attempts written")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {attempts_written} question attempts from {results_done} test results"
+        ))
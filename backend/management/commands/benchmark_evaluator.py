@@ -0,0 +1,201 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.test import override_settings
+import json
+import os
+import resource
+import time
+import numpy as np
+from backend.evaluation_cache import EvaluationResultCache
+from backend.lazy_imports import lazy_module
+from backend.symbolic_cache import SymbolicResultCache
+from backend.tokenization import DEFAULT_LENGTH_BUCKETS
+
+tf = lazy_module('tensorflow')
+
+DEFAULT_CORPUS = os.path.join(settings.BASE_DIR, 'backend', 'benchmark_data', 'math_workings.json')
+
+
+def load_corpus(path) -> list:
+    """Benchmark items: dicts with 'problem', 'workings' (list of steps) and the expected 'answer'"""
+    with open(path, encoding='utf-8') as f:
+        items = json.load(f)
+    for index, item in enumerate(items):
+        if not (isinstance(item.get('problem'), str) and isinstance(item.get('answer'), str)
+                and isinstance(item.get('workings'), list) and item['workings']):
+            raise ValueError(f"Corpus item {index} needs problem, answer and a non-empty workings list")
+    return items
+
+
+def build_stand_in_model(vocab_size):
+    """
+    Randomly initialised validator shaped like the trained one (minus the BERT
+    encoder, which needs a download): same inputs, BiLSTM, attention and head.
+    Scores are meaningless; timings and memory are indicative.
+    """
+    input_ids = tf.keras.layers.Input(shape=(None,), dtype=tf.int32, name='input_ids')
+    attention_mask = tf.keras.layers.Input(shape=(None,), dtype=tf.int32, name='attention_mask')
+    embeddings = tf.keras.layers.Embedding(vocab_size, 128)(input_ids)
+    lstm_out = tf.keras.layers.Bidirectional(tf.keras.layers.LSTM(64, return_sequences=True))(embeddings)
+    attention = tf.keras.layers.MultiHeadAttention(num_heads=4, key_dim=64)(lstm_out, lstm_out)
+    pooled = tf.keras.layers.GlobalMaxPooling1D()(attention)
+    dense = tf.keras.layers.Dense(64, activation='relu')(pooled)
+    output = tf.keras.layers.Dense(1, activation='sigmoid')(dense)
+    return tf.keras.Model(inputs=[input_ids, attention_mask], outputs=output, name='math_step_validator_stand_in')
+
+
+def peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def latency_summary(seconds: list) -> dict:
+    ms = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'calls': len(seconds),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'per_second': round(len(seconds) / float(np.sum(seconds)), 1) if np.sum(seconds) else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks MathAnswerEvaluator on a fixed corpus of workings: p50/p95/p99 latency of '
+        'evaluate, _symbolic_check, _normalize_math and _detect_errors, evaluate_many throughput '
+        'per batch size, and peak RSS. Result caches and micro-batching are off so every call '
+        'does the full work. Without a trained model a randomly initialised stand-in is used.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='JSON corpus of workings')
+        parser.add_argument('--repeat', type=int, default=5, help='Passes over the corpus for latency figures')
+        parser.add_argument('--batch-sizes', default='1,8,32,128', help='evaluate_many batch sizes to compare')
+        parser.add_argument('--rows', type=int, default=512, help='Rows per evaluate_many throughput run')
+        parser.add_argument('--stand-in', action='store_true', help='Use the random stand-in even if a trained model exists')
+        parser.add_argument('--output', help='Write the results as JSON to this path')
+        parser.add_argument('--baseline', help='JSON written by an earlier --output run to compare against')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='With --baseline, fail if p95 latency grows or throughput drops by more than this fraction'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            corpus = load_corpus(options['corpus'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not load corpus: {str(e)}")
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',')]
+
+        # Keep benchmark traffic out of the shared caches the web workers use
+        with override_settings(
+            MATH_EVALUATOR_BATCHING=False,
+            MATH_PREFIX_SHARED_CACHE=None,
+            MATH_SYMBOLIC_SHARED_CACHE=None,
+            MATH_EVALUATION_SHARED_CACHE=None,
+        ):
+            evaluator = self._build_evaluator(options['stand_in'])
+            results = {
+                'model_backend': evaluator.model_backend,
+                'corpus_items': len(corpus),
+                'latency': {},
+                'throughput': {},
+                'peak_rss_mb': {'after_load': peak_rss_mb()},
+            }
+
+            # First calls trace the model graph; keep them out of the figures
+            for item in corpus[:3]:
+                evaluator.evaluate(item['problem'], item['workings'])
+
+            passes = [item for _ in range(options['repeat']) for item in corpus]
+            results['latency']['evaluate'] = self._time_each(
+                passes, lambda item: evaluator.evaluate(item['problem'], item['workings'])
+            )
+            results['latency']['symbolic_check'] = self._time_each(
+                passes,
+                lambda item: evaluator._symbolic_check(item['workings'][-1].split('=')[-1].strip(), item['answer'])
+            )
+            steps = [step for item in passes for step in item['workings']]
+            results['latency']['normalize_math'] = self._time_each(steps, evaluator._normalize_math)
+            results['latency']['detect_errors'] = self._time_each(
+                passes, lambda item: evaluator._detect_errors(item['problem'], item['workings'])
+            )
+            results['peak_rss_mb']['after_latency'] = peak_rss_mb()
+
+            rows = [(item['problem'], item['workings']) for item in corpus]
+            rows = (rows * (options['rows'] // len(rows) + 1))[:options['rows']]
+            for batch_size in batch_sizes:
+                started = time.perf_counter()
+                evaluator.evaluate_many(rows, batch_size=batch_size)
+                elapsed = time.perf_counter() - started
+                results['throughput'][str(batch_size)] = round(len(rows) / elapsed, 1)
+            results['peak_rss_mb']['after_throughput'] = peak_rss_mb()
+
+        self._report(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if options['baseline']:
+            self._compare(results, options['baseline'], options['tolerance'])
+
+    def _build_evaluator(self, force_stand_in):
+        from backend.math_evaluator import MathAnswerEvaluator  # Imports TensorFlow
+
+        evaluator = MathAnswerEvaluator()
+        if force_stand_in or evaluator.step_validator is None:
+            self.stdout.write(self.style.WARNING('Using a randomly initialised stand-in model'))
+            evaluator.step_validator = build_stand_in_model(evaluator.tokenizer.vocab_size)
+            evaluator.model_backend = 'stand-in'
+            evaluator.model_path = None
+            evaluator.length_buckets = tuple(
+                getattr(settings, 'MATH_EVALUATOR_LENGTH_BUCKETS', DEFAULT_LENGTH_BUCKETS)
+            )
+
+        # Size-0 caches: every call misses, so repeats measure real work
+        evaluator.evaluation_cache = EvaluationResultCache('benchmark', max_size=0)
+        evaluator.symbolic_cache = SymbolicResultCache(max_size=0)
+        return evaluator
+
+    def _time_each(self, items, fn) -> dict:
+        seconds = []
+        for item in items:
+            started = time.perf_counter()
+            fn(item)
+            seconds.append(time.perf_counter() - started)
+        return latency_summary(seconds)
+
+    def _report(self, results):
+        self.stdout.write(f"model: {results['model_backend']}, corpus: {results['corpus_items']} workings")
+        self.stdout.write(f"{'operation':<16}{'calls':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'calls/s':>12}")
+        for name, stats in results['latency'].items():
+            self.stdout.write(
+                f"{name:<16}{stats['calls']:>8}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+                f"{stats['p99_ms']:>10.3f}{stats['per_second']:>12.1f}"
+            )
+        self.stdout.write(f"{'batch size':<16}{'rows/s':>12}")
+        for batch_size, per_second in results['throughput'].items():
+            self.stdout.write(f"{batch_size:<16}{per_second:>12.1f}")
+        self.stdout.write(
+            'peak RSS MB: ' + ', '.join(f"{stage} {mb}" for stage, mb in results['peak_rss_mb'].items())
+        )
+
+    def _compare(self, results, baseline_path, tolerance):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+        regressions = []
+        for name, stats in results['latency'].items():
+            before = baseline.get('latency', {}).get(name)
+            if before and stats['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{name} p95 {before['p95_ms']}ms -> {stats['p95_ms']}ms")
+        for batch_size, per_second in results['throughput'].items():
+            before = baseline.get('throughput', {}).get(batch_size)
+            if before and per_second < before * (1 - tolerance):
+                regressions.append(f"batch {batch_size} throughput {before} -> {per_second} rows/s")
+
+        if regressions:
+            raise CommandError('Regressions against baseline: ' + '; '.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions beyond {tolerance:.0%} of {baseline_path}"))
@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand
+import random
+import time
+from backend.answer_key import build_answer_key, grade_answers
+
+QUESTION_TYPES = ('MCQ', 'TF', 'FIB', 'SA')
+
+
+def legacy_grade(questions, answers):
+    """What AssessmentViewSet.submit did: scan every answer for every question"""
+    correct = 0
+    detailed_results = []
+    for question in questions:
+        user_answer = next((a for a in answers if a['question_id'] == question['id']), None)
+        is_correct = user_answer and str(user_answer['answer']).lower() == str(question['correct_answer']).lower()
+        if is_correct:
+            correct += 1
+        detailed_results.append({
+            'question_id': question['id'],
+            'question_text': question['text'],
+            'correct_answer': question['correct_answer'],
+            'user_answer': user_answer['answer'] if user_answer else None,
+            'is_correct': is_correct,
+            'concept': question['concept_tags']
+        })
+    return correct, detailed_results
+
+
+def synthetic_assessment(rng, size):
+    questions = [
+        {
+            'id': 1000 + i,
+            'text': f'Question {i}',
+            'question_type': rng.choice(QUESTION_TYPES),
+            'correct_answer': rng.choice(['A', 'B', 'True', 'x = 4', 'Photosynthesis', '3/4']),
+            'concept_tags': rng.choice(['algebra', 'fractions', 'biology']),
+        }
+        for i in range(size)
+    ]
+    answers = [
+        {'question_id': q['id'], 'answer': q['correct_answer'] if rng.random() < 0.7 else 'C'}
+        for q in questions
+    ]
+    rng.shuffle(answers)
+    return questions, answers
+
+
+class Command(BaseCommand):
+    help = (
+        'Microbenchmark of assessment grading: the legacy per-question scan of all answers '
+        'vs the indexed answer-key engine, on synthetic assessments'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=200, help='Questions per assessment')
+        parser.add_argument('--submissions', type=int, default=200, help='Submissions graded per run')
+        parser.add_argument('--repeat', type=int, default=5, help='Timing runs per variant; best is reported')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        questions, answers = synthetic_assessment(rng, options['questions'])
+        answer_key = build_answer_key(questions)
+        submissions = range(options['submissions'])
+
+        variants = [
+            ('legacy scan', lambda: [legacy_grade(questions, answers) for _ in submissions]),
+            ('compile + grade', lambda: [grade_answers(build_answer_key(questions), answers) for _ in submissions]),
+            ('cached key', lambda: [grade_answers(answer_key, answers) for _ in submissions]),
+        ]
+
+        baseline = None
+        self.stdout.write(
+            f"{options['questions']} questions, {options['submissions']} submissions\n"
+            f"{'variant':<18}{'total ms':>12}{'us/submission':>16}{'speedup':>10}"
+        )
+        for name, run in variants:
+            best = min(self._time(run) for _ in range(options['repeat']))
+            baseline = baseline or best
+            self.stdout.write(
+                f"{name:<18}{best * 1000:>12.1f}"
+                f"{best / options['submissions'] * 1e6:>16.1f}{baseline / best:>9.1f}x"
+            )
+
+    def _time(self, run):
+        started = time.perf_counter()
+        run()
+        return time.perf_counter() - started
@@ -0,0 +1,96 @@
+from django.core.management.base import BaseCommand
+import random
+import re
+import time
+from backend.math_normalization import normalize_many, normalize_math
+
+# The rewrite list the evaluator and dataset processor used to apply one re.sub at a time
+LEGACY_REPLACEMENTS = [
+    (r'\b(\d+)\s*([a-zA-Z])\b', r'\1*\2'),
+    (r'\s+', ' '),
+    ('×', '*'), ('÷', '/'), ('^', '**'),
+    (r'\\frac\{([^}]+)\}\{([^}]+)\}', r'(\1)/(\2)'),
+    (r'\\sqrt\{([^}]+)\}', r'sqrt(\1)')
+]
+
+# Step shapes seen in student workings; coefficients and variables are filled in per string
+STEP_TEMPLATES = [
+    '{a}{v} + {b} = {c}',
+    '{a}{v} = {c} - {b}',
+    '{v} = \\frac{{{c}}}{{{a}}}',
+    '{a}{v}^2 - {b} = 0',
+    '{v}^2 = {b}',
+    '{v} = \\sqrt{{{b}}}',
+    '{a} × {b} ÷ {c} = {d}',
+    '\\frac{{{a}{v}}}{{{b}}} + {c}{v} = {d}',
+    '{v}  =  {d}',
+]
+VARIABLES = 'xyzabnt'
+
+
+def random_step(rng):
+    return rng.choice(STEP_TEMPLATES).format(
+        v=rng.choice(VARIABLES), a=rng.randint(2, 20), b=rng.randint(1, 99),
+        c=rng.randint(1, 99), d=rng.randint(1, 99)
+    )
+
+
+def build_corpus(rng, size, duplicates):
+    """
+    size step strings where about ``duplicates`` of them repeat an earlier string,
+    like a class submitting workings for the same problems
+    """
+    corpus = []
+    for _ in range(size):
+        if corpus and rng.random() < duplicates:
+            corpus.append(rng.choice(corpus))
+        else:
+            corpus.append(' '.join(random_step(rng) for _ in range(rng.randint(1, 4))))
+    return corpus
+
+
+def legacy_normalize(expr):
+    for pattern, repl in LEGACY_REPLACEMENTS:
+        expr = re.sub(pattern, repl, expr)
+    return expr
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmark of math normalization: legacy re.sub loop vs shared compiled engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=10000, help='Number of strings to normalize')
+        parser.add_argument('--repeat', type=int, default=5, help='Timing runs per variant; best is reported')
+        parser.add_argument(
+            '--duplicates', type=float, default=0.3,
+            help='Share of strings that repeat an earlier one (normalize_many only normalizes each distinct string once)'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        corpus = build_corpus(rng, options['size'], options['duplicates'])
+        unique = len(set(corpus))
+
+        variants = [
+            ('legacy re.sub loop', lambda: [legacy_normalize(s) for s in corpus]),
+            ('normalize_math', lambda: [normalize_math(s) for s in corpus]),
+            ('normalize_many', lambda: normalize_many(corpus)),
+        ]
+
+        baseline = None
+        self.stdout.write(
+            f"{len(corpus)} strings, {unique} distinct ({1 - unique / len(corpus):.0%} duplicates)"
+        )
+        self.stdout.write(f"{'variant':<22}{'total ms':>12}{'us/string':>12}{'speedup':>10}")
+        for name, run in variants:
+            best = min(self._time(run) for _ in range(options['repeat']))
+            baseline = baseline or best
+            self.stdout.write(
+                f"{name:<22}{best * 1000:>12.1f}"
+                f"{best / len(corpus) * 1e6:>12.2f}{baseline / best:>9.1f}x"
+            )
+
+    def _time(self, run):
+        started = time.perf_counter()
+        run()
+        return time.perf_counter() - started
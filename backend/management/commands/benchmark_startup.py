@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+import json
+import os
+import statistics
+import subprocess
+import sys
+from backend.lazy_imports import HEAVY_MODULES
+
+# Runs in a fresh interpreter: what a web worker does before serving its first request
+BOOT_SCRIPT = """
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+for name in {preload!r}:
+    try:
+        __import__(name)
+    except ImportError:
+        pass
+print(json.dumps({{
+    'seconds': time.perf_counter() - started,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy': [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure_boot(preload=()) -> dict:
+    """Boot Django plus the URLconf in a subprocess and report time, peak RSS and heavy imports"""
+    script = BOOT_SCRIPT.format(preload=tuple(preload), heavy=HEAVY_MODULES)
+    output = subprocess.run(
+        [sys.executable, '-c', script],
+        capture_output=True, text=True, check=True, env=os.environ.copy()
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures web worker boot time with heavy ML imports deferred, against importing them '
+        'eagerly as views.py used to, and fails if boot exceeds the import-time budget'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per variant')
+        parser.add_argument(
+            '--budget',
+            type=float,
+            default=getattr(settings, 'STARTUP_IMPORT_BUDGET_SECONDS', 3.0),
+            help='Fail if the median deferred boot takes longer than this many seconds'
+        )
+        parser.add_argument('--skip-eager', action='store_true', help='Only measure the deferred boot')
+
+    def handle(self, *args, **options):
+        variants = [('deferred', ())]
+        if not options['skip_eager']:
+            variants.append(('eager (before)', HEAVY_MODULES))
+
+        results = {}
+        self.stdout.write(f"{'variant':<18}{'median s':>10}{'max s':>10}{'RSS MB':>10}  heavy modules")
+        for name, preload in variants:
+            runs = [measure_boot(preload) for _ in range(options['runs'])]
+            results[name] = runs
+            self.stdout.write(
+                f"{name:<18}{statistics.median(r['seconds'] for r in runs):>10.2f}"
+                f"{max(r['seconds'] for r in runs):>10.2f}"
+                f"{max(r['max_rss_mb'] for r in runs):>10.0f}  {', '.join(runs[0]['heavy']) or '-'}"
+            )
+
+        deferred = results['deferred']
+        if deferred[0]['heavy']:
+            raise CommandError(
+                f"Booting imported {', '.join(deferred[0]['heavy'])}; "
+                f"use backend.lazy_imports.lazy_module for these"
+            )
+        median = statistics.median(r['seconds'] for r in deferred)
+        if median > options['budget']:
+            raise CommandError(f"Boot took {median:.2f}s, over the {options['budget']}s budget")
+        self.stdout.write(self.style.SUCCESS(f"Boot within budget ({median:.2f}s <= {options['budget']}s)"))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from backend.canonical_answers import refresh_canonical_answer
+from backend.models import MathProblem, Question
+
+
+class Command(BaseCommand):
+    help = (
+        'Stores the canonical form of every MathProblem and free-form Question correct_answer. '
+        'New and edited rows get it in the background after save; run this once for rows saved before that, '
+        'or with --force after changing MATH_NUMERIC_PROBES.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Recompute forms that are already current')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows written per bulk_update')
+
+    def handle(self, *args, **options):
+        querysets = [
+            MathProblem.objects.order_by('id'),
+            Question.objects.filter(question_type__in=Question.CANONICAL_TYPES).order_by('id'),
+        ]
+        for queryset in querysets:
+            checked, updated, unparsable = self._canonicalize(queryset, options['force'], options['chunk_size'])
+            self.stdout.write(
+                f"{queryset.model.__name__}: {checked} checked, {updated} updated, "
+                f"{unparsable} not parsable as math"
+            )
+
+    def _canonicalize(self, queryset, force, chunk_size):
+        checked = updated = unparsable = 0
+        chunk = []
+        for instance in queryset.only('id', 'correct_answer', 'canonical_answer').iterator(chunk_size=chunk_size):
+            checked += 1
+            if refresh_canonical_answer(instance, force=force):
+                chunk.append(instance)
+            if instance.canonical_answer and instance.canonical_answer['srepr'] is None:
+                unparsable += 1
+            if len(chunk) >= chunk_size:
+                queryset.model.objects.bulk_update(chunk, ['canonical_answer'])
+                updated += len(chunk)
+                chunk = []
+        if chunk:
+            queryset.model.objects.bulk_update(chunk, ['canonical_answer'])
+            updated += len(chunk)
+        return checked, updated, unparsable
@@ -0,0 +1,154 @@
+from django.core.management.base import BaseCommand, CommandError
+from pathlib import Path
+import json
+import logging
+import time
+import numpy as np
+import tensorflow as tf
+from transformers import BertTokenizer
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from backend.models import GradingJob, MathProblem, MathWorkings
+from backend.tflite_validator import TFLiteStepValidator
+from backend.tokenization import DEFAULT_LENGTH_BUCKETS, encode_to_bucket
+
+logger = logging.getLogger(__name__)
+
+
+def convert_to_tflite(model, quantization, encoded):
+    """TFLite flatbuffer of a Keras step validator; int8 calibrates on the encoded (ids, mask) samples"""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    # BERT uses a few ops without TFLite builtins; let those fall back to TF kernels
+    converter.target_spec.supported_ops = [
+        tf.lite.OpsSet.TFLITE_BUILTINS,
+        tf.lite.OpsSet.SELECT_TF_OPS,
+    ]
+    if quantization == 'int8':
+        converter.representative_dataset = lambda: (
+            [ids, mask] for ids, mask in encoded
+        )
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+            tf.lite.OpsSet.SELECT_TF_OPS,
+        ]
+    return converter.convert()
+
+
+class Command(BaseCommand):
+    help = (
+        'Exports math_step_validator.h5 to a quantized TFLite model and reports '
+        'how its scores compare with the Keras model'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--quantization',
+            choices=['dynamic', 'int8'],
+            default='dynamic',
+            help='dynamic: int8 weights, float activations. int8: also calibrates activations.'
+        )
+        parser.add_argument(
+            '--variant',
+            choices=['teacher', 'student'],
+            default='teacher',
+            help='student exports the distilled model from train_math_evaluator --distill'
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=200,
+            help='Stored workings used for int8 calibration and the accuracy comparison'
+        )
+
+    def handle(self, *args, **options):
+        MODEL_DIR = Path(settings.BASE_DIR) / 'backend' / 'models'
+        name = 'math_step_validator_student' if options['variant'] == 'student' else 'math_step_validator'
+        KERAS_PATH = MODEL_DIR / f'{name}.h5'
+        TFLITE_PATH = MODEL_DIR / f'{name}.tflite'
+        REPORT_PATH = MODEL_DIR / f'{name}.tflite.json'
+
+        if not KERAS_PATH.exists():
+            raise CommandError(f"No trained model at {KERAS_PATH}; run train_math_evaluator first")
+
+        model = tf.keras.models.load_model(KERAS_PATH)
+        tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
+        seq_len = model.inputs[0].shape[1]
+        buckets = (int(seq_len),) if seq_len is not None else tuple(
+            getattr(settings, 'MATH_EVALUATOR_LENGTH_BUCKETS', DEFAULT_LENGTH_BUCKETS))
+
+        samples = self._load_samples(options['samples'])
+        if not samples:
+            raise CommandError("No math workings or problems in the database to compare against")
+        encoded = [encode_to_bucket(tokenizer, text, buckets) for text, _ in samples]
+
+        self.stdout.write(f"Converting {KERAS_PATH} with {options['quantization']} quantization")
+        TFLITE_PATH.write_bytes(convert_to_tflite(model, options['quantization'], encoded))
+
+        quantized = TFLiteStepValidator(str(TFLITE_PATH))
+        report = self._compare(model, quantized, encoded, [label for _, label in samples])
+        report.update({
+            'quantization': options['quantization'],
+            'keras_size_mb': round(KERAS_PATH.stat().st_size / 2**20, 2),
+            'tflite_size_mb': round(TFLITE_PATH.stat().st_size / 2**20, 2),
+            'label_source': (
+                'Accuracy is measured against the evaluator\'s own past grades of completed '
+                'grading jobs and reference solutions, not human-verified ground truth'
+            ),
+        })
+        REPORT_PATH.write_text(json.dumps(report, indent=2))
+
+        self.stdout.write(f"{'':<24}{'keras':>12}{'tflite':>12}")
+        self.stdout.write(f"{'size (MB)':<24}{report['keras_size_mb']:>12}{report['tflite_size_mb']:>12}")
+        self.stdout.write(f"{'latency p50 (ms)':<24}{report['keras_p50_ms']:>12}{report['tflite_p50_ms']:>12}")
+        self.stdout.write(f"{'accuracy vs stored':<24}{report['keras_accuracy']:>12}{report['tflite_accuracy']:>12}")
+        self.stdout.write(report['label_source'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Saved {TFLITE_PATH}\n"
+            f"Agreement with Keras: {report['agreement']:.3f}, "
+            f"mean score difference {report['mean_abs_diff']:.4f}\n"
+            f"Report saved to {REPORT_PATH}"
+        ))
+
+    def _load_samples(self, limit):
+        """(text, label) pairs from graded workings, falling back to reference solutions"""
+        # Workings are saved before grading with is_correct=False, so only a
+        # finished latest job means is_correct holds a grade
+        latest_status = GradingJob.objects.filter(workings=OuterRef('pk')).order_by('-created_at').values('status')[:1]
+        graded = MathWorkings.objects.annotate(latest_status=Subquery(latest_status)).filter(latest_status='COMPLETED')
+        samples = [
+            (f"Problem: {w.problem.text}\nWorkings: {' '.join(w.steps)}", int(w.is_correct))
+            for w in graded.select_related('problem').order_by('-submitted_at')[:limit]
+        ]
+        if len(samples) < limit:
+            samples += [
+                (f"Problem: {p.text}\nWorkings: {' '.join(p.correct_workings)}", 1)
+                for p in MathProblem.objects.all()[:limit - len(samples)]
+            ]
+        return samples
+
+    def _compare(self, model, quantized, encoded, labels):
+        keras_scores, keras_times = self._score(
+            lambda ids, mask: model.predict([ids, mask], verbose=0), encoded)
+        tflite_scores, tflite_times = self._score(
+            lambda ids, mask: quantized.predict([ids, mask]), encoded)
+        labels = np.array(labels)
+
+        return {
+            'samples': len(encoded),
+            'agreement': float(np.mean((keras_scores > 0.5) == (tflite_scores > 0.5))),
+            'mean_abs_diff': float(np.mean(np.abs(keras_scores - tflite_scores))),
+            'max_abs_diff': float(np.max(np.abs(keras_scores - tflite_scores))),
+            'keras_accuracy': round(float(np.mean((keras_scores > 0.5) == labels)), 3),
+            'tflite_accuracy': round(float(np.mean((tflite_scores > 0.5) == labels)), 3),
+            'keras_p50_ms': round(float(np.percentile(keras_times, 50)) * 1000, 2),
+            'tflite_p50_ms': round(float(np.percentile(tflite_times, 50)) * 1000, 2),
+        }
+
+    def _score(self, predict, encoded):
+        scores, times = [], []
+        for ids, mask in encoded:
+            started = time.perf_counter()
+            scores.append(float(np.asarray(predict(ids, mask)).reshape(-1)[0]))
+            times.append(time.perf_counter() - started)
+        return np.array(scores), np.array(times)
@@ -0,0 +1,105 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from pathlib import Path
+import json
+from backend.grading import grade_workings_bulk
+from backend.models import MathProblem, MathWorkings
+
+
+class Command(BaseCommand):
+    help = (
+        'Grades math workings in batches: re-grades stored workings, or imports and grades '
+        'a JSON file of {"problem": id, "steps": [...]} items. Reports throughput.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--input',
+            help='JSON list of {"problem": id, "steps": [...], "answer": "..."} items to import and grade'
+        )
+        parser.add_argument(
+            '--user',
+            help='Email of the user imported workings are recorded as submitted by (required with --input)'
+        )
+        parser.add_argument(
+            '--problem',
+            type=int,
+            action='append',
+            help='Only re-grade workings for this problem id; may be repeated'
+        )
+        parser.add_argument('--limit', type=int, help='Re-grade at most this many workings')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'MATH_BULK_BATCH_SIZE', 256),
+            help='Rows per model forward pass'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=getattr(settings, 'MATH_BULK_CHUNK_SIZE', 1000),
+            help='Rows evaluated and written back per bulk_update'
+        )
+
+    def handle(self, *args, **options):
+        if options['input']:
+            workings = self._import(options['input'], options['user'], options['chunk_size'])
+        else:
+            queryset = MathWorkings.objects.select_related('problem').order_by('id')
+            if options['problem']:
+                queryset = queryset.filter(problem_id__in=options['problem'])
+            if options['limit']:
+                queryset = queryset[:options['limit']]
+            workings = queryset.iterator(chunk_size=options['chunk_size'])
+
+        stats = grade_workings_bulk(
+            workings,
+            batch_size=options['batch_size'],
+            chunk_size=options['chunk_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Graded {stats['graded']} workings ({stats['correct']} correct) "
+            f"in {stats['seconds']}s, {stats['per_second']} workings/s"
+        ))
+
+    def _import(self, path, email, chunk_size):
+        if not email:
+            raise CommandError("--user is required with --input")
+        try:
+            user = get_user_model().objects.get(email=email)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {email}")
+
+        items = self._valid_items(json.loads(Path(path).read_text()))
+        problems = MathProblem.objects.in_bulk({item['problem'] for item in items})
+        missing = sorted({item['problem'] for item in items} - problems.keys())
+        if missing:
+            raise CommandError(f"Unknown problem ids: {', '.join(map(str, missing))}")
+        return self._create(items, problems, user, chunk_size)
+
+    def _valid_items(self, items):
+        """Items with a problem and a non-empty list of string steps; the others are reported and skipped"""
+        valid = []
+        for index, item in enumerate(items):
+            steps = item.get('steps') if isinstance(item, dict) else None
+            if not isinstance(steps, list) or not steps or not all(isinstance(step, str) for step in steps):
+                self.stderr.write(f"Skipping item {index}: steps must be a non-empty list of strings")
+            elif 'problem' not in item:
+                self.stderr.write(f"Skipping item {index}: no problem id")
+            else:
+                valid.append(item)
+        return valid
+
+    def _create(self, items, problems, user, chunk_size):
+        """Yield new workings chunk by chunk so grading starts before the import finishes"""
+        for start in range(0, len(items), chunk_size):
+            yield from MathWorkings.objects.bulk_create([
+                MathWorkings(
+                    problem=problems[item['problem']],
+                    steps=item['steps'],
+                    answer=item.get('answer') or item['steps'][-1],
+                    submitted_by=user
+                )
+                for item in items[start:start + chunk_size]
+            ])
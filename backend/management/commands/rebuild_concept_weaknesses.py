@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from backend.models import UserProfile
+from backend.views import analyze_user_weaknesses
+from backend.weakness_stats import rebuild_concept_weaknesses
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the per-concept weakness counters and stored weakness report of every user with '
+        'test results from history, e.g. to check the running counters or after editing results by hand.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild the user with this email')
+
+    def handle(self, *args, **options):
+        users = UserProfile.objects.filter(test_results__isnull=False).distinct().order_by('id')
+        if options['user']:
+            users = users.filter(email=options['user'])
+
+        rebuilt = 0
+        for user in users.only('id', 'weaknesses').iterator():
+            rebuild_concept_weaknesses(user.id)
+            analyze_user_weaknesses(user)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt concept weaknesses for {rebuilt} users"))
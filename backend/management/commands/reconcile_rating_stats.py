@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from backend.models import UserProfile, UserRatingStats
+from backend.rating_stats import history_stats, rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Checks each user\'s running rating stats and rating against their TestResult history '
+        'and reports mismatches; --fix rebuilds the ones that differ or are missing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rebuild mismatched or missing stats from history')
+        parser.add_argument('--user', help='Only check the user with this email')
+        parser.add_argument('--tolerance', type=float, default=1e-6, help='Allowed drift in the score sum and rating')
+
+    def handle(self, *args, **options):
+        users = UserProfile.objects.filter(
+            Q(test_results__isnull=False) | Q(rating_stats__isnull=False)
+        ).distinct().order_by('id')
+        if options['user']:
+            users = users.filter(email=options['user'])
+        stats_by_user = {s.user_id: s for s in UserRatingStats.objects.filter(user__in=users)}
+
+        checked = mismatched = 0
+        for user in users.only('id', 'email', 'rating').iterator():
+            checked += 1
+            problems = self._compare(user, stats_by_user.get(user.id), options['tolerance'])
+            if not problems:
+                continue
+            mismatched += 1
+            self.stdout.write(f"{user.email}: {'; '.join(problems)}")
+            if options['fix']:
+                rebuild_rating_stats(user.id)
+
+        summary = f"{checked} users checked, {mismatched} mismatched"
+        if mismatched and options['fix']:
+            summary += ', rebuilt from history'
+        self.stdout.write(self.style.SUCCESS(summary) if not mismatched else self.style.WARNING(summary))
+
+    def _compare(self, user, stats, tolerance) -> list:
+        expected = UserRatingStats(user_id=user.id, **history_stats(user.id))
+        if stats is None:
+            return ['no running stats'] if expected.result_count else []
+
+        problems = []
+        if stats.result_count != expected.result_count:
+            problems.append(f"count {stats.result_count} != {expected.result_count}")
+        if abs(stats.score_sum - expected.score_sum) > tolerance:
+            problems.append(f"score sum {stats.score_sum} != {expected.score_sum}")
+        if stats.recent_scores != expected.recent_scores:
+            problems.append(f"recent scores {stats.recent_scores} != {expected.recent_scores}")
+        if abs(user.rating - expected.rating()) > tolerance:
+            problems.append(f"rating {user.rating} != {expected.rating()}")
+        return problems
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from backend.executors import shutdown_executors
+from backend.grading import requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Grades jobs left PENDING or PROCESSING past MATH_GRADING_STALE_SECONDS, e.g. by a worker '
+        'that was restarted. Web workers do this at start; run it from cron when they rarely restart.'
+    )
+
+    def handle(self, *args, **options):
+        counts = requeue_stale_jobs()
+        # The jobs run on this process's pool; wait for them before exiting
+        shutdown_executors(wait=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Requeued {counts['requeued']} stale grading jobs, failed {counts['failed']} interrupted too often"
+        ))
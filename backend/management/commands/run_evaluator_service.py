@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+import signal
+import threading
+from backend.evaluator_registry import get_local_math_evaluator, registry_status
+from backend.evaluator_service import EvaluatorServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the math evaluator as a service on a Unix domain socket. Web processes with '
+        'MATH_EVALUATOR_SOCKET set send evaluations here instead of loading the model.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket',
+            default=getattr(settings, 'MATH_EVALUATOR_SOCKET', None),
+            help='Socket path to listen on (default: MATH_EVALUATOR_SOCKET)'
+        )
+
+    def handle(self, *args, **options):
+        socket_path = options['socket']
+        if not socket_path:
+            raise CommandError('Pass --socket or set MATH_EVALUATOR_SOCKET')
+
+        evaluator = get_local_math_evaluator()
+        if not evaluator.is_ready():
+            self.stderr.write(self.style.WARNING('Step validator not loaded; serving symbolic checks only'))
+
+        server = EvaluatorServer(socket_path, evaluator, registry_status)
+
+        def stop(signum, frame):
+            # shutdown() waits for serve_forever to return, so it can't run on this thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(self.style.SUCCESS(f"Evaluator service listening on {socket_path}"))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+        self.stdout.write('Evaluator service stopped')
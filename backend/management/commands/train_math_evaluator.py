@@ -7,20 +7,160 @@ from datasets import load_dataset
 from backend.Math_testing import OpenMathProcessor
 import logging
 import os
+import time
+import numpy as np
 from django.conf import settings
 from tensorflow.keras.layers import Input, Dense
 from tensorflow.keras.models import Model
+from backend.tokenization import DEFAULT_LENGTH_BUCKETS, group_by_bucket
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
     help = 'Trains and saves the math evaluation model'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--length-buckets',
+            nargs='?',
+            const=','.join(str(b) for b in DEFAULT_LENGTH_BUCKETS),
+            default=None,
+            help=(
+                'Train on inputs padded to the smallest fitting bucket (default 64,128,256) '
+                'instead of always 256 tokens. The saved model accepts any of these lengths.'
+            )
+        )
+        parser.add_argument(
+            '--distill',
+            action='store_true',
+            help=(
+                'After training, also train a small CNN student on the BERT model\'s scores '
+                'and save it as math_step_validator_student.h5'
+            )
+        )
+        parser.add_argument(
+            '--reuse-teacher',
+            action='store_true',
+            help='With --distill, load the saved math_step_validator.h5 instead of training it again'
+        )
+        parser.add_argument(
+            '--distill-alpha',
+            type=float,
+            default=0.3,
+            help='Weight of the true labels in the student targets; the rest comes from the teacher'
+        )
+
+    def _build_model(self, seq_len=None):
+        """BERT + BiLSTM + attention validator; seq_len=None builds a variable-length model"""
+        bert = TFBertModel.from_pretrained('bert-base-uncased')
+        input_ids = Input(shape=(seq_len,), dtype=tf.int32, name='input_ids')
+        attention_mask = Input(shape=(seq_len,), dtype=tf.int32, name='attention_mask')
+        embeddings = bert(input_ids, attention_mask=attention_mask).last_hidden_state
+        lstm_out = tf.keras.layers.Bidirectional(
+            tf.keras.layers.LSTM(64, return_sequences=True))(embeddings)
+
+        attention = tf.keras.layers.MultiHeadAttention(
+            num_heads=4, key_dim=64)(lstm_out, lstm_out)
+        if seq_len is None:
+            # Flatten needs a fixed length; pooling lets one model serve every bucket
+            pooled = tf.keras.layers.GlobalMaxPooling1D()(attention)
+        else:
+            pooled = tf.keras.layers.Flatten()(attention)
+
+        dense = tf.keras.layers.Dense(64, activation='relu')(pooled)
+        output = tf.keras.layers.Dense(1, activation='sigmoid')(dense)
+
+        model = tf.keras.Model(
+            inputs=[input_ids, attention_mask],
+            outputs=output,
+            name="math_step_validator"
+        )
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(3e-5),
+            loss='binary_crossentropy',
+            metrics=['accuracy']
+        )
+        return model
+
+    def _build_student(self, vocab_size):
+        """Small CNN over token embeddings, trained to mimic the BERT model's scores"""
+        input_ids = Input(shape=(None,), dtype=tf.int32, name='input_ids')
+        # int32 like the teacher's, which is what pad_to_bucket and the TFLite validator feed
+        attention_mask = Input(shape=(None,), dtype=tf.int32, name='attention_mask')
+        embeddings = tf.keras.layers.Embedding(vocab_size, 128)(input_ids)
+        # Zero out padding positions so they can't win the max-pool
+        mask = tf.keras.layers.Reshape((-1, 1))(tf.cast(attention_mask, tf.float32))
+        embeddings = tf.keras.layers.Multiply()([embeddings, mask])
+        conv = tf.keras.layers.Conv1D(128, 5, padding='same', activation='relu')(embeddings)
+        conv = tf.keras.layers.Conv1D(128, 3, padding='same', activation='relu')(conv)
+        pooled = tf.keras.layers.GlobalMaxPooling1D()(conv)
+        dense = tf.keras.layers.Dense(64, activation='relu')(pooled)
+        output = tf.keras.layers.Dense(1, activation='sigmoid')(dense)
+
+        model = tf.keras.Model(
+            inputs=[input_ids, attention_mask],
+            outputs=output,
+            name="math_step_validator_student"
+        )
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(1e-3),
+            loss='binary_crossentropy',
+            metrics=['accuracy']
+        )
+        return model
+
+    def _encode_groups(self, tokenizer, texts, buckets):
+        """{length: (input_ids, attention_mask, row_indices)}; a single 256 group without buckets"""
+        if buckets:
+            return group_by_bucket(tokenizer, texts, buckets)
+        inputs = tokenizer(
+            texts, 
+            padding='max_length', 
+            truncation=True, 
+            max_length=256,
+            return_tensors='np'
+        )
+        return {256: (inputs['input_ids'], inputs['attention_mask'], list(range(len(texts))))}
+
+    def _make_dataset(self, groups, targets):
+        """Batches padded per length group, shuffled together"""
+        datasets = []
+        for length, (input_ids, attention_mask, indices) in groups.items():
+            datasets.append(tf.data.Dataset.from_tensor_slices((
+                {'input_ids': input_ids, 'attention_mask': attention_mask},
+                tf.constant([targets[i] for i in indices], dtype=tf.float32)
+            )).shuffle(1000).batch(32))
+
+        dataset = datasets[0]
+        for other in datasets[1:]:
+            dataset = dataset.concatenate(other)
+        if len(datasets) > 1:
+            dataset = dataset.shuffle(sum(len(g[2]) for g in groups.values()) // 32 + len(datasets))
+        return dataset
+
+    def _predict_groups(self, model, groups, count):
+        """Model scores for every row, in the original row order"""
+        scores = np.zeros(count, dtype=np.float32)
+        for input_ids, attention_mask, indices in groups.values():
+            scores[indices] = model.predict([input_ids, attention_mask], batch_size=64, verbose=0).reshape(-1)
+        return scores
+
+    def _latency_ms(self, model, groups, rows=50):
+        """Median single-row latency, the shape requests arrive in"""
+        times = []
+        for input_ids, attention_mask, _ in groups.values():
+            for i in range(min(rows, len(input_ids))):
+                started = time.perf_counter()
+                model([input_ids[i:i + 1], attention_mask[i:i + 1]], training=False)
+                times.append(time.perf_counter() - started)
+        return float(np.median(times)) * 1000 if times else 0.0
+
     def handle(self, *args, **options):
         # Define paths using Django's BASE_DIR
         MODEL_DIR = Path(settings.BASE_DIR) / 'backend' / 'models'
         MODEL_DIR.mkdir(parents=True, exist_ok=True)
         MODEL_PATH = MODEL_DIR / 'math_step_validator.h5'
+        STUDENT_PATH = MODEL_DIR / 'math_step_validator_student.h5'
         TOKENIZER_PATH = MODEL_DIR / 'math_tokenizer.pkl'
 
         self.stdout.write(f"Training math evaluator model, saving to {MODEL_PATH}")
@@ -43,66 +183,66 @@ class Command(BaseCommand):
             ]
             labels = [d['label'] for d in high_school_data]
 
-            inputs = tokenizer(
-                texts, 
-                padding='max_length', 
-                truncation=True, 
-                max_length=256,
-                return_tensors='tf'
-            )
+            buckets = None
+            if options['length_buckets']:
+                buckets = sorted(int(b) for b in options['length_buckets'].split(','))
+                self.stdout.write(f"Training with length buckets {buckets}")
 
-            train_dataset = tf.data.Dataset.from_tensor_slices((
-                {'input_ids': inputs['input_ids'], 'attention_mask': inputs['attention_mask']},
-                tf.constant(labels)
-            )).shuffle(1000).batch(32)
-
-            # Model building
-            bert = TFBertModel.from_pretrained('bert-base-uncased')
-            input_ids = Input(shape=(256,), dtype=tf.int32, name='input_ids')
-            attention_mask = Input(shape=(256,), dtype=tf.int32, name='attention_mask')
-            embeddings = bert(input_ids, attention_mask=attention_mask).last_hidden_state
-            lstm_out = tf.keras.layers.Bidirectional(
-                tf.keras.layers.LSTM(64, return_sequences=True))(embeddings)
-            attention = tf.keras.layers.MultiHeadAttention(
-                num_heads=4, key_dim=64)(lstm_out, lstm_out)
-            flattened = tf.keras.layers.Flatten()(attention)
-            dense = tf.keras.layers.Dense(64, activation='relu')(flattened)
-            output = tf.keras.layers.Dense(1, activation='sigmoid')(dense)
-            
-            model = tf.keras.Model(
-                inputs=[input_ids, attention_mask],
-                outputs=output,
-                name="math_step_validator"
-            )
-            model.compile(
-                optimizer=tf.keras.optimizers.Adam(3e-5),
-                loss='binary_crossentropy',
-                metrics=['accuracy']
-            )
+            teacher = None
+            if options['distill'] and options['reuse_teacher']:
+                self.stdout.write(f"Reusing trained model at {MODEL_PATH}")
+                teacher = tf.keras.models.load_model(MODEL_PATH)
+                if teacher.inputs[0].shape[1] is not None:
+                    buckets = None  # A fixed-length teacher only accepts 256-token inputs
 
-            # Train/validation split
-            val_size = int(0.2 * len(high_school_data))
-            train_data = train_dataset.skip(val_size)
-            val_data = train_dataset.take(val_size)
-
-            # Training
-            history = model.fit(
-                train_data,
-                validation_data=val_data,
-                epochs=5,
-                callbacks=[
-                    tf.keras.callbacks.EarlyStopping(patience=3),
-                    tf.keras.callbacks.ModelCheckpoint(
-                        filepath=str(MODEL_PATH),
-                        save_best_only=True,
-                        save_weights_only=False,
-                        save_format='h5',
-                        monitor='val_accuracy',
-                        mode='max',
-                        verbose=1
-                    )
-                ]
-            )
+            # Train/validation split on samples, fixed so the teacher and student see the same split
+            order = np.random.default_rng(42).permutation(len(texts))
+            val_count = max(1, int(0.2 * len(texts)))
+            splits = {
+                'train': sorted(order[val_count:].tolist()),
+                'val': sorted(order[:val_count].tolist()),
+            }
+            groups = {
+                name: self._encode_groups(tokenizer, [texts[i] for i in rows], buckets)
+                for name, rows in splits.items()
+            }
+            split_labels = {name: [labels[i] for i in rows] for name, rows in splits.items()}
+            train_data = self._make_dataset(groups['train'], split_labels['train'])
+            val_data = self._make_dataset(groups['val'], split_labels['val'])
+
+            if teacher is not None:
+                model = teacher
+            else:
+                model = self._build_model(seq_len=None if buckets else 256)
+
+                # Training
+                history = model.fit(
+                    train_data,
+                    validation_data=val_data,
+                    epochs=5,
+                    callbacks=[
+                        tf.keras.callbacks.EarlyStopping(patience=3),
+                        tf.keras.callbacks.ModelCheckpoint(
+                            filepath=str(MODEL_PATH),
+                            save_best_only=True,
+                            save_weights_only=False,
+                            save_format='h5',
+                            monitor='val_accuracy',
+                            mode='max',
+                            verbose=1
+                        )
+                    ]
+                )
+                self.stdout.write(
+                    f"Final validation accuracy: {history.history['val_accuracy'][-1]:.2f}"
+                )
+                if options['distill']:
+                    # The checkpoint holds the best epoch, which is what ships; distill from that
+                    model = tf.keras.models.load_model(MODEL_PATH)
+
+            if options['distill']:
+                self._distill(model, groups, split_labels, tokenizer.vocab_size,
+                              options['distill_alpha'], STUDENT_PATH)
 
             # Save tokenizer
             with open(TOKENIZER_PATH, 'wb') as f:
@@ -111,8 +251,7 @@ class Command(BaseCommand):
             self.stdout.write(
                 self.style.SUCCESS(
                     f"Successfully trained and saved model to {MODEL_PATH}\n"
-                    f"Tokenizer saved to {TOKENIZER_PATH}\n"
-                    f"Final validation accuracy: {history.history['val_accuracy'][-1]:.2f}"
+                    f"Tokenizer saved to {TOKENIZER_PATH}"
                 )
             )
             
@@ -121,4 +260,45 @@ class Command(BaseCommand):
             self.stdout.write(
                 self.style.ERROR(f"Training failed: {str(e)}")
             )
-            raise
\ No newline at end of file
+            raise
+
+    def _distill(self, teacher, groups, split_labels, vocab_size, alpha, student_path):
+        """Train the student on a blend of true labels and teacher scores, then compare both"""
+        self.stdout.write(f"Distilling student model, saving to {student_path}")
+        train_count = len(split_labels['train'])
+        teacher_scores = self._predict_groups(teacher, groups['train'], train_count)
+        soft_targets = alpha * np.array(split_labels['train'], dtype=np.float32) + \
+            (1 - alpha) * teacher_scores
+
+        student = self._build_student(vocab_size)
+        student.fit(
+            self._make_dataset(groups['train'], soft_targets),
+            validation_data=self._make_dataset(groups['val'], split_labels['val']),
+            epochs=10,
+            callbacks=[
+                tf.keras.callbacks.EarlyStopping(patience=2, restore_best_weights=True),
+            ]
+        )
+        student.save(student_path, save_format='h5')
+
+        val_labels = np.array(split_labels['val'])
+        val_count = len(val_labels)
+        rows = []
+        val_scores = {}
+        for name, model in (('teacher', teacher), ('student', student)):
+            val_scores[name] = self._predict_groups(model, groups['val'], val_count)
+            rows.append((
+                name,
+                model.count_params(),
+                float(np.mean((val_scores[name] > 0.5) == val_labels)),
+                self._latency_ms(model, groups['val']),
+            ))
+        student_scores, teacher_scores = val_scores['student'], val_scores['teacher']
+
+        self.stdout.write(f"{'model':<10}{'params':>14}{'val acc':>10}{'ms/row':>10}")
+        for name, params, accuracy, latency in rows:
+            self.stdout.write(f"{name:<10}{params:>14,}{accuracy:>10.3f}{latency:>10.2f}")
+        self.stdout.write(
+            f"Student agrees with teacher on "
+            f"{np.mean((student_scores > 0.5) == (teacher_scores > 0.5)):.3f} of validation samples"
+        )
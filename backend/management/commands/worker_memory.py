@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from backend.process_memory import child_pids, process_memory
+
+
+class Command(BaseCommand):
+    help = (
+        'Memory of a gunicorn master and each of its workers. PSS splits pages shared '
+        'copy-on-write between processes, so its total is what the host really spends.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('master_pid', type=int, help='Pid of the gunicorn master')
+
+    def handle(self, *args, **options):
+        master = process_memory(options['master_pid'])
+        if master is None:
+            raise CommandError(f"No memory information for pid {options['master_pid']}")
+
+        rows = [('master', master)] + [
+            ('worker', memory)
+            for memory in (process_memory(pid) for pid in child_pids(options['master_pid']))
+            if memory is not None
+        ]
+
+        self.stdout.write(f"{'role':<8}{'pid':>8}{'rss MB':>10}{'pss MB':>10}{'shared MB':>11}{'private MB':>12}")
+        for role, memory in rows:
+            self.stdout.write(
+                f"{role:<8}{memory['pid']:>8}{memory['rss_mb']:>10}{memory['pss_mb']:>10}"
+                f"{memory['shared_mb']:>11}{memory['private_mb']:>12}"
+            )
+        self.stdout.write(
+            f"{'total':<16}{sum(m['rss_mb'] for _, m in rows):>10.1f}"
+            f"{sum(m['pss_mb'] for _, m in rows):>10.1f}"
+        )
@@ -1,107 +1,274 @@
-import tensorflow as tf
-from transformers import BertTokenizer, TFBertModel
 import numpy as np
-import re
-from sympy import sympify, Eq, simplify
-from sympy.parsing.sympy_parser import parse_expr
 import os
 from django.conf import settings
 import logging
+import threading
+from collections import Counter
+from .equivalence import TIER_CACHE, TIER_CANONICAL, fingerprint_match, step_probe_values, tiered_equivalence
+from .evaluation_cache import EvaluationResultCache
+from .evaluator_metrics import StageTimer
+from .evaluator_registry import get_artifact
+from .inference_batcher import MicroBatcher
+from .lazy_imports import lazy_module
+from .math_normalization import normalize_math
+from .symbolic_cache import SymbolicResultCache
+from .step_session import MAX_NEW_TERMS, SIGN_RUN, STEP_TOKENS
+from .symbolic_pool import get_symbolic_pool
+from .tflite_validator import load_tflite_validator
+from .tokenization import DEFAULT_LENGTH_BUCKETS, get_prefix_cache, get_tokenizer
 
 logger = logging.getLogger(__name__)
 
+# Only the Keras .h5 path needs TensorFlow, so a .tflite-only process never imports it
+tf = lazy_module('tensorflow')
+
+
+def _load_step_validator(model_path):
+    try:
+        if os.path.exists(model_path):
+            model = tf.keras.models.load_model(model_path)
+            logger.info("Math evaluator model loaded successfully")
+            return model
+        logger.warning(f"Math evaluator model not found at {model_path}")
+    except Exception as e:
+        logger.error(f"Failed to load math evaluator model: {str(e)}")
+    return None
+
+
+def default_model_dir():
+    return os.path.join(settings.BASE_DIR, 'backend', 'models')
+
+
+def step_validator_paths(model_dir):
+    """
+    (tflite_path, keras_path) of the configured step validator. tflite_path is
+    None unless the quantized model exists and is preferred.
+    """
+    # 'student' selects the distilled model written by train_math_evaluator --distill
+    name = 'math_step_validator'
+    if getattr(settings, 'MATH_EVALUATOR_VARIANT', 'teacher') == 'student':
+        name = 'math_step_validator_student'
+
+    tflite_path = os.path.join(model_dir, f'{name}.tflite')
+    if not (getattr(settings, 'MATH_EVALUATOR_PREFER_TFLITE', True) and os.path.exists(tflite_path)):
+        tflite_path = None
+    return tflite_path, os.path.join(model_dir, f'{name}.h5')
+
+
+def load_step_validator(model_dir, fork_safe_only=False):
+    """
+    Process-wide step validator as (model, path, backend): the .tflite when
+    preferred, else the .h5. fork_safe_only skips the Keras fallback.
+    """
+    tflite_path, keras_path = step_validator_paths(model_dir)
+    if tflite_path:
+        model = get_artifact(
+            f'model:{tflite_path}',
+            lambda: load_tflite_validator(
+                tflite_path,
+                num_threads=getattr(settings, 'MATH_EVALUATOR_TFLITE_THREADS', None)
+            )
+        )
+        if model is not None:
+            return model, tflite_path, 'tflite'
+    if fork_safe_only:
+        return None, None, None
+
+    model = get_artifact(f'model:{keras_path}', lambda: _load_step_validator(keras_path))
+    return model, keras_path, 'keras'
 
 
 class MathAnswerEvaluator:
     def __init__(self):
-        self.tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-        self.replacements = [
-            (r'\b(\d+)\s*([a-zA-Z])\b', r'\1*\2'),
-            (r'\s+', ' '),
-            ('×', '*'), ('÷', '/'), ('^', '**'),
-            (r'\\frac\{([^}]+)\}\{([^}]+)\}', r'(\1)/(\2)'),
-            (r'\\sqrt\{([^}]+)\}', r'sqrt(\1)')
-        ]
-        
-        self.step_validator = None
-        self.model_path = os.path.join(settings.BASE_DIR, 'backend', 'models', 'math_step_validator.h5')
-        
-        try:
-            if os.path.exists(self.model_path):
-                self.step_validator = tf.keras.models.load_model(self.model_path)
-                logger.info("Math evaluator model loaded successfully")
-            else:
-                logger.warning(f"Math evaluator model not found at {self.model_path}")
-        except Exception as e:
-            logger.error(f"Failed to load math evaluator model: {str(e)}")
+        self.tokenizer = get_tokenizer()
+        self.prefix_cache = get_prefix_cache()
+        self.model_dir = default_model_dir()
+        self.step_validator, self.model_path, self.model_backend = load_step_validator(self.model_dir)
+
+        self.length_buckets = self._resolve_length_buckets()
+        self.model_version = self._resolve_model_version()
+
+        # Identical resubmissions are answered from here without running the model
+        self.evaluation_cache = EvaluationResultCache(
+            model_version=self.model_version,
+            max_size=getattr(settings, 'MATH_EVALUATION_CACHE_SIZE', 20000),
+            ttl=getattr(settings, 'MATH_EVALUATION_CACHE_TTL', 3600),
+            shared_alias=getattr(settings, 'MATH_EVALUATION_SHARED_CACHE', None),
+            shared_timeout=getattr(settings, 'MATH_EVALUATION_SHARED_CACHE_TIMEOUT', 3600)
+        )
+
+        self.symbolic_cache = SymbolicResultCache(
+            max_size=getattr(settings, 'MATH_SYMBOLIC_CACHE_SIZE', 10000),
+            shared_alias=getattr(settings, 'MATH_SYMBOLIC_SHARED_CACHE', None),
+            shared_timeout=getattr(settings, 'MATH_SYMBOLIC_SHARED_CACHE_TIMEOUT', 86400)
+        )
+
+        # Numeric probing settles most comparisons before sympy.simplify is needed
+        self.numeric_probes = getattr(settings, 'MATH_NUMERIC_PROBES', 8)
+        self.numeric_tolerance = getattr(settings, 'MATH_NUMERIC_TOLERANCE', 1e-8)
+        self.symbolic_tiers = Counter()
+        self._tiers_lock = threading.Lock()
+
+        # sympy can run for seconds on hostile input, so it runs in killable worker processes
+        self.symbolic_pool = get_symbolic_pool()
+
+        self.batcher = None
+        if self.step_validator is not None and getattr(settings, 'MATH_EVALUATOR_BATCHING', True):
+            model = self.step_validator
+            self.batcher = get_artifact(
+                f'batcher:{self.model_path}',
+                lambda: MicroBatcher(
+                    lambda ids, mask: model.predict([ids, mask], verbose=0),
+                    max_batch_size=getattr(settings, 'MATH_EVALUATOR_MAX_BATCH_SIZE', 32),
+                    max_wait_ms=getattr(settings, 'MATH_EVALUATOR_MAX_WAIT_MS', 5)
+                )
+            )
 
     def is_ready(self):
         return self.step_validator is not None
 
-    def evaluate(self, problem_text: str, user_workings: list) -> dict:
-        """Main evaluation method"""
+    def _resolve_length_buckets(self) -> tuple:
+        """Sequence lengths the loaded model accepts; older models are fixed at 256"""
+        if self.step_validator is None:
+            return (256,)
+        if hasattr(self.step_validator, 'input_length'):
+            seq_len = self.step_validator.input_length
+        else:
+            seq_len = self.step_validator.inputs[0].shape[1]
+        if seq_len is not None:
+            return (int(seq_len),)
+        return tuple(getattr(settings, 'MATH_EVALUATOR_LENGTH_BUCKETS', DEFAULT_LENGTH_BUCKETS))
+
+    def _resolve_model_version(self) -> str:
+        """Identifies the loaded artifact; cached evaluations are only reused for the same version"""
+        configured = getattr(settings, 'MATH_EVALUATOR_MODEL_VERSION', None)
+        if configured:
+            return str(configured)
+        if self.step_validator is None:
+            return 'unloaded'
+        stat = os.stat(self.model_path)
+        return f"{self.model_backend}:{os.path.basename(self.model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def evaluate(self, problem_text: str, user_workings: list, timer: StageTimer = None,
+                 expected: dict = None) -> dict:
+        """
+        Main evaluation method. Stage durations are recorded, and also kept on ``timer`` if given.
+        ``expected`` is the problem's stored canonical answer (see canonical_answers); without
+        it the expected answer is taken from the problem text.
+        """
         if not self.step_validator:
-            return {
-                'is_correct': False,
-                'score': 0.0,
-                'errors': ['model_not_loaded'],
-                'expected_answer': ''
-            }
+            return self._unavailable_result('model_not_loaded')
+        timer = timer if timer is not None else StageTimer()
+
+        with timer.stage('cache_lookup'):
+            cached = self.evaluation_cache.get(problem_text, user_workings, expected)
+        if cached is not None:
+            return cached
         
         try:
             # Neural network evaluation
-            neural_result = self._neural_evaluation(problem_text, user_workings)
-            
-            # Symbolic verification
-            symbolic_correct = False
-            if user_workings:
-                try:
-                    final_answer = user_workings[-1].split('=')[-1].strip()
+            neural_result = self._neural_evaluation(problem_text, user_workings, timer)
+            if expected is not None:
+                neural_result['expected_answer'] = expected['source']
+            result, cacheable = self._combine(neural_result, user_workings, timer, expected)
+            if cacheable:
+                self.evaluation_cache.set(problem_text, user_workings, result, expected)
+            return result
+        except Exception as e:
+            logger.error(f"Evaluation failed: {str(e)}")
+            return self._unavailable_result('evaluation_error')
+
+    def evaluate_many(self, items: list, batch_size: int = 256, expected: list = None) -> list:
+        """
+        Evaluate (problem_text, workings) pairs in batched forward passes.
+        ``expected`` optionally holds each pair's canonical answer (or None), as for evaluate().
+        Results are in input order and match what evaluate() returns for each pair.
+        """
+        if not self.step_validator:
+            return [self._unavailable_result('model_not_loaded') for _ in items]
+
+        expected = expected if expected is not None else [None] * len(items)
+        timer = StageTimer()
+        results = [
+            self.evaluation_cache.get(problem_text, workings, answer)
+            for (problem_text, workings), answer in zip(items, expected)
+        ]
+        pending = [index for index, result in enumerate(results) if result is None]
+
+        scores = self._predict_many([items[index] for index in pending], batch_size, timer)
+        for index, score in zip(pending, scores):
+            problem_text, user_workings = items[index]
+            try:
+                with timer.stage('detect_errors'):
+                    errors = self._detect_errors(problem_text, user_workings)
+                answer = expected[index]
+                neural_result = {
+                    'score': score,
+                    'errors': errors,
+                    'expected_answer': (
+                        answer['source'] if answer is not None else self._extract_expected_answer(problem_text)
+                    )
+                }
+                results[index], cacheable = self._combine(neural_result, user_workings, timer, answer)
+                if cacheable:
+                    self.evaluation_cache.set(problem_text, user_workings, results[index], answer)
+            except Exception as e:
+                logger.error(f"Evaluation failed: {str(e)}")
+                results[index] = self._unavailable_result('evaluation_error')
+        return results
+
+    def _combine(self, neural_result: dict, user_workings: list, timer: StageTimer, expected: dict = None):
+        """
+        Blend the neural score with a symbolic check of the final answer.
+        Returns (result, cacheable); results that depended on a timed-out check aren't cacheable.
+        """
+        # Symbolic verification
+        symbolic_correct = False
+        if user_workings:
+            try:
+                final_answer = user_workings[-1].split('=')[-1].strip()
+                with timer.stage('symbolic'):
                     symbolic_correct = self._symbolic_check(
                         final_answer, 
-                        neural_result['expected_answer']
+                        neural_result['expected_answer'],
+                        expected
                     )
-                except Exception as sym_error:
-                    logger.debug(f"Symbolic check failed: {sym_error}")
-            
-            # Combined score
-            combined_score = (neural_result['score'] * 0.7) + (symbolic_correct * 0.3)
-            
-            return {
-                'is_correct': combined_score > 0.7,
-                'score': float(combined_score),
-                'errors': neural_result['errors'],
-                'expected_answer': neural_result['expected_answer']
-            }
-        except Exception as e:
-            logger.error(f"Evaluation failed: {str(e)}")
-            return {
-                'is_correct': False,
-                'score': 0.0,
-                'errors': ['evaluation_error'],
-                'expected_answer': ''
-            }
+            except Exception as sym_error:
+                logger.debug(f"Symbolic check failed: {sym_error}")
+        
+        # Combined score
+        combined_score = (neural_result['score'] * 0.7) + ((symbolic_correct is True) * 0.3)
+        
+        return {
+            'is_correct': bool(combined_score > 0.7),
+            'score': float(combined_score),
+            'errors': neural_result['errors'],
+            'expected_answer': neural_result['expected_answer']
+        }, symbolic_correct is not None
+
+    def _unavailable_result(self, error: str) -> dict:
+        return {
+            'is_correct': False,
+            'score': 0.0,
+            'errors': [error],
+            'expected_answer': ''
+        }
     
-    def _neural_evaluation(self, problem_text: str, user_workings: list) -> dict:
+    def _neural_evaluation(self, problem_text: str, user_workings: list, timer: StageTimer) -> dict:
         """Evaluate using neural network"""
-        # Prepare input
-        text = f"Problem: {problem_text}\nWorkings: {' '.join(user_workings)}"
-        inputs = self.tokenizer(
-            text,
-            return_tensors='tf',
-            padding='max_length',
-            truncation=True,
-            max_length=256
-        )
+        # Prepare input; the problem prefix is tokenized once per problem and cached
+        with timer.stage('tokenize'):
+            input_ids, attention_mask = self.prefix_cache.encode(
+                self.tokenizer, problem_text, user_workings, self.length_buckets
+            )
         
-        # Get prediction
-        score = self.step_validator.predict([
-            inputs['input_ids'],
-            inputs['attention_mask']
-        ])[0][0]
+        # Get prediction, sharing a forward pass with concurrent requests when batching is on
+        with timer.stage('predict'):
+            score = self._predict_score(input_ids, attention_mask)
         
         # Detect errors
-        errors = self._detect_errors(problem_text, user_workings)
+        with timer.stage('detect_errors'):
+            errors = self._detect_errors(problem_text, user_workings)
         
         return {
             'score': float(score),
@@ -109,14 +276,87 @@ class MathAnswerEvaluator:
             'expected_answer': self._extract_expected_answer(problem_text)
         }
     
-    def _symbolic_check(self, user_answer: str, correct_answer: str) -> bool:
-        """Check answer symbolically"""
-        try:
-            user_expr = parse_expr(self._normalize_math(user_answer))
-            correct_expr = parse_expr(self._normalize_math(correct_answer))
-            return simplify(user_expr - correct_expr) == 0
-        except:
-            return False
+    def _predict_score(self, input_ids, attention_mask) -> float:
+        """Score one tokenized row"""
+        if self.batcher is not None:
+            return self.batcher.submit(input_ids, attention_mask)
+        return float(self.step_validator.predict([input_ids, attention_mask], verbose=0)[0][0])
+    
+    def _predict_many(self, items: list, batch_size: int, timer: StageTimer) -> list:
+        """Scores for many rows; rows padded to the same bucket share forward passes of up to batch_size"""
+        rows = {}
+        for index, (problem_text, user_workings) in enumerate(items):
+            with timer.stage('tokenize'):
+                input_ids, attention_mask = self.prefix_cache.encode(
+                    self.tokenizer, problem_text, user_workings, self.length_buckets
+                )
+            rows.setdefault(input_ids.shape[1], []).append((index, input_ids, attention_mask))
+
+        scores = [0.0] * len(items)
+        for group in rows.values():
+            for start in range(0, len(group), batch_size):
+                chunk = group[start:start + batch_size]
+                input_ids = np.concatenate([ids for _, ids, _ in chunk])
+                attention_mask = np.concatenate([mask for _, _, mask in chunk])
+                with timer.stage('batch_predict'):
+                    predictions = np.asarray(
+                        self.step_validator.predict([input_ids, attention_mask], verbose=0)
+                    ).reshape(-1)
+                for (index, _, _), prediction in zip(chunk, predictions):
+                    scores[index] = float(prediction)
+        return scores
+
+    def _symbolic_check(self, user_answer: str, correct_answer: str, expected: dict = None):
+        """
+        Check answer symbolically, reusing results for pairs seen before.
+        Returns True/False, or None when the check timed out (undetermined).
+        """
+        return self._symbolic_check_with_tier(user_answer, correct_answer, expected)[0]
+
+    def _symbolic_check_with_tier(self, user_answer: str, correct_answer: str, expected: dict = None):
+        """
+        Symbolic check that also reports which tier (cache/canonical/numeric/simplify/...) decided it.
+        With ``expected`` (a stored canonical answer) only the user's side is parsed, unless
+        its fingerprint comparison is inconclusive.
+        """
+        user_norm = self._normalize_math(user_answer)
+        correct_norm = expected['normalized'] if expected is not None else self._normalize_math(correct_answer)
+
+        cached = self.symbolic_cache.get(user_norm, correct_norm)
+        if cached is not None:
+            result, tier = cached, TIER_CACHE
+        else:
+            result, tier = self._fingerprint_check(user_norm, expected)
+            if result is None:
+                result, tier = self._full_check(user_norm, correct_norm)
+
+        # None means sympy ran out of time; don't remember that as an answer
+        if result is not None and tier != TIER_CACHE:
+            self.symbolic_cache.set(user_norm, correct_norm, result)
+
+        with self._tiers_lock:
+            self.symbolic_tiers[tier] += 1
+        return result, tier
+
+    def _full_check(self, user_norm: str, correct_norm: str):
+        if self.symbolic_pool is not None:
+            return self.symbolic_pool.check(user_norm, correct_norm)
+        return tiered_equivalence(
+            user_norm, correct_norm,
+            probes=self.numeric_probes,
+            tolerance=self.numeric_tolerance
+        )
+
+    def _fingerprint_check(self, user_norm: str, expected: dict):
+        """Compare the user's answer with a stored fingerprint; (None, None) if that can't decide it"""
+        if expected is None or not expected.get('fingerprint') or expected.get('probes') != self.numeric_probes:
+            return None, None
+        if self.symbolic_pool is not None:
+            values = self.symbolic_pool.step_values(user_norm)
+        else:
+            values = step_probe_values(user_norm, probes=self.numeric_probes)
+        result = fingerprint_match(values, expected['fingerprint'], tolerance=self.numeric_tolerance)
+        return (result, TIER_CANONICAL) if result is not None else (None, None)
     
     def _detect_errors(self, problem_text: str, workings: list) -> list:
         """Detect common math errors"""
@@ -124,7 +364,7 @@ class MathAnswerEvaluator:
         text = problem_text + ' ' + ' '.join(workings)
         
         # Sign errors
-        if re.search(r'[\+\-]\s*[\+\-]', text):
+        if SIGN_RUN.search(text):
             errors.append('sign_error')
         
         # Missing steps (abrupt jumps)
@@ -132,20 +372,18 @@ class MathAnswerEvaluator:
             step_changes = []
             for i in range(1, len(workings)):
                 # Simple heuristic - count changed elements
-                prev = set(re.findall(r'[\w\+\-\*/=]+', workings[i-1]))
-                curr = set(re.findall(r'[\w\+\-\*/=]+', workings[i]))
+                prev = set(STEP_TOKENS.findall(workings[i-1]))
+                curr = set(STEP_TOKENS.findall(workings[i]))
                 step_changes.append(len(curr - prev))
             
-            if max(step_changes) > 5:  # Large jump in complexity
+            if max(step_changes) > MAX_NEW_TERMS:  # Large jump in complexity
                 errors.append('missing_step')
         
         return errors
     
     def _normalize_math(self, expr: str) -> str:
         """Normalize math expressions"""
-        for pattern, repl in self.replacements:
-            expr = re.sub(pattern, repl, expr)
-        return expr
+        return normalize_math(expr)
     
     def _extract_expected_answer(self, problem_text: str) -> str:
         """Extract expected answer from problem text"""
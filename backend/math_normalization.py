@@ -0,0 +1,50 @@
+"""
+Shared math text normalization for the runtime evaluator and dataset preprocessing.
+
+Literal symbol swaps are done with one str.translate call, and the regex rewrites
+run as a single compiled alternation, so each string is scanned once.
+"""
+import re
+
+# Single characters swapped for their Python/sympy spelling
+LITERAL_TABLE = str.maketrans({
+    '×': '*',
+    '÷': '/',
+    '^': '**',
+})
+
+_PATTERN = re.compile(
+    r'(?P<implicit>\b(?P<coeff>\d+)\s*(?P<var>[a-zA-Z])\b)'  # 2x → 2*x
+    r'|(?P<space>\s+)'  # Collapse whitespace
+    r'|(?P<frac>\\frac\{(?P<num>[^}]+)\}\{(?P<den>[^}]+)\})'  # LaTeX fractions
+    r'|(?P<sqrt>\\sqrt\{(?P<radicand>(?:\\frac\{[^}]+\}\{[^}]+\}|[^}])+)\})'  # LaTeX sqrt, may wrap a fraction
+)
+
+
+def _rewrite(match) -> str:
+    kind = match.lastgroup
+    if kind == 'implicit':
+        return f"{match.group('coeff')}*{match.group('var')}"
+    if kind == 'space':
+        return ' '
+    if kind == 'frac':
+        # Inner text gets the same rewrites it would have had before the fraction was expanded
+        return f"({_PATTERN.sub(_rewrite, match.group('num'))})/({_PATTERN.sub(_rewrite, match.group('den'))})"
+    return f"sqrt({_PATTERN.sub(_rewrite, match.group('radicand'))})"
+
+
+def normalize_math(expr: str) -> str:
+    """Normalize one math expression into sympy-parsable text"""
+    return _PATTERN.sub(_rewrite, expr.translate(LITERAL_TABLE))
+
+
+def normalize_many(exprs) -> list:
+    """Normalize a list of expressions, computing each distinct string once"""
+    seen = {}
+    result = []
+    for expr in exprs:
+        normalized = seen.get(expr)
+        if normalized is None:
+            normalized = seen[expr] = normalize_math(expr)
+        result.append(normalized)
+    return result
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0008_gradingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mathproblem',
+            name='canonical_answer',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='canonical_answer',
+            field=models.JSONField(blank=True, editable=False, help_text='Parsed correct_answer, computed after save', null=True),
+        ),
+    ]
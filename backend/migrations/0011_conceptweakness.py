@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-17 03:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+EXAMPLE_QUESTIONS = 3  # ConceptWeakness.EXAMPLE_QUESTIONS
+
+
+def build_counters(apps, schema_editor):
+    """Counters for the results saved before this table existed, as rebuild_concept_weaknesses builds them"""
+    TestResult = apps.get_model('backend', 'TestResult')
+    ConceptWeakness = apps.get_model('backend', 'ConceptWeakness')
+
+    counters = {}
+    results = TestResult.objects.order_by('id').values_list('user_id', 'detailed_results')
+    for user_id, detailed_results in results.iterator():
+        for item in detailed_results or []:
+            if item.get('is_correct'):
+                continue
+            tags = str(item.get('concept') or '').split(',')
+            for concept in dict.fromkeys(tag.strip() for tag in tags if tag.strip()):
+                counter = counters.setdefault(
+                    (user_id, concept),
+                    ConceptWeakness(user_id=user_id, concept=concept, wrong_count=0, example_questions=[])
+                )
+                counter.wrong_count += 1
+                if len(counter.example_questions) < EXAMPLE_QUESTIONS:
+                    counter.example_questions.append(item.get('question_text'))
+    ConceptWeakness.objects.bulk_create(counters.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0010_userratingstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConceptWeakness',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('concept', models.CharField(max_length=255)),
+                ('wrong_count', models.PositiveIntegerField(default=0)),
+                ('example_questions', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='concept_weaknesses', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'concept')},
+            },
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
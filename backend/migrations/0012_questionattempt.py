@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-17 03:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0011_conceptweakness'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_correct', models.BooleanField(default=False)),
+                ('concept', models.CharField(blank=True, max_length=255)),
+                ('timestamp', models.DateTimeField()),
+                ('assessment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_attempts', to='backend.assessment')),
+                ('question', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attempts', to='backend.question')),
+                ('test_result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='backend.testresult')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'concept'], name='backend_que_user_id_9d694a_idx'), models.Index(fields=['user', 'timestamp'], name='backend_que_user_id_31c557_idx'), models.Index(fields=['question', 'is_correct'], name='backend_que_questio_c8e1af_idx'), models.Index(fields=['assessment', 'timestamp'], name='backend_que_assessm_6eed92_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
@@ -6,6 +6,7 @@ import json
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 import re
+import uuid
 from django.core.exceptions import ValidationError
 
 class UserProfileManager(BaseUserManager):
@@ -101,26 +102,6 @@ class UserProfile(AbstractUser):
     def is_educator(self):
         return self.role == 'EDUCATOR' and self.is_approved
 
-    def update_rating(self):
-        results = self.test_results.all()
-        if not results.exists():
-            self.rating = 0
-            self.save()
-            return
-        
-        total_score = sum([r.score for r in results])
-        avg_score = total_score / results.count()
-        
-        recent_results = results.order_by('-timestamp')[:5]
-        if recent_results.exists():
-            recent_avg = sum([r.score for r in recent_results]) / recent_results.count()
-            weighted_avg = (avg_score * 0.6) + (recent_avg * 0.4)
-        else:
-            weighted_avg = avg_score
-            
-        self.rating = min(100, weighted_avg)
-        self.save()
-
     def __str__(self):
         return self.email
 
@@ -248,11 +229,31 @@ class Question(models.Model):
         default=list,
         help_text="List of math concepts tested"
     )
+    canonical_answer = models.JSONField(
+        null=True, blank=True, editable=False,
+        help_text="Parsed correct_answer, computed after save"
+    )
+
+    # Free-form answers are graded symbolically; options and true/false are not
+    CANONICAL_TYPES = ('FIB', 'SA')
+
+    def save(self, *args, **kwargs):
+        from .canonical_answers import prepare_canonical_on_save  # Import inside method to avoid circular imports
+        prepare_canonical_on_save(self)
+        _include_canonical_field(kwargs)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.assessment.title} - {self.text[:50]}..."
 
 
+def _include_canonical_field(save_kwargs):
+    """Saving correct_answer with update_fields must also clear its old canonical form"""
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None and 'correct_answer' in update_fields:
+        save_kwargs['update_fields'] = set(update_fields) | {'canonical_answer'}
+
+
 
 class UserProgress(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='user_progress', on_delete=models.CASCADE)
@@ -312,13 +313,97 @@ class TestResult(models.Model):
     weak_areas = models.JSONField(default=list)
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.user.update_rating()
-        from .views import analyze_user_weaknesses  # Import inside method to avoid circular imports
-        analyze_user_weaknesses(self.user)
+        from .profile_updates import schedule_profile_refresh  # Import inside method to avoid circular imports
+        from .rating_stats import rebuild_rating_stats, record_result
+        from .weakness_stats import rebuild_concept_weaknesses, record_weaknesses
+        from .question_attempts import record_attempts
+
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # A new result updates the running counters in O(1); an edited one needs the full history
+            if adding:
+                record_result(self.user_id, self.score)
+                record_weaknesses(self.user_id, self.detailed_results)
+            else:
+                rebuild_rating_stats(self.user_id)
+                rebuild_concept_weaknesses(self.user_id)
+                self.attempts.all().delete()
+            record_attempts(self)
+        # Copy the weakness report onto the profile off the request
+        schedule_profile_refresh(self.user_id)
 
     def __str__(self):
         return f"{self.user.username} - {self.assessment.title} - {self.score}%"
+
+
+class UserRatingStats(models.Model):
+    """Running totals behind UserProfile.rating, so a new result doesn't rescan the user's history"""
+    RECENT_RESULTS = 5
+
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, related_name='rating_stats', on_delete=models.CASCADE)
+    result_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    recent_scores = models.JSONField(default=list)  # Last RECENT_RESULTS scores, oldest first
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'User rating stats'
+
+    def add_score(self, score):
+        self.result_count += 1
+        self.score_sum += score
+        self.recent_scores = (list(self.recent_scores) + [score])[-self.RECENT_RESULTS:]
+
+    def rating(self) -> float:
+        """Average score weighted 60/40 with the average of the recent scores, capped at 100"""
+        if not self.result_count:
+            return 0
+        avg_score = self.score_sum / self.result_count
+        recent_avg = sum(self.recent_scores) / len(self.recent_scores) if self.recent_scores else avg_score
+        return min(100, (avg_score * 0.6) + (recent_avg * 0.4))
+
+    def __str__(self):
+        return f"{self.user} - {self.result_count} results"
+
+
+class ConceptWeakness(models.Model):
+    """How often a user got a concept wrong, kept up to date as test results are recorded"""
+    EXAMPLE_QUESTIONS = 3
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='concept_weaknesses', on_delete=models.CASCADE)
+    concept = models.CharField(max_length=255)
+    wrong_count = models.PositiveIntegerField(default=0)
+    example_questions = models.JSONField(default=list)  # First EXAMPLE_QUESTIONS questions answered wrong
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'concept')
+
+    def __str__(self):
+        return f"{self.user} - {self.concept}: {self.wrong_count}"
+
+
+class QuestionAttempt(models.Model):
+    """One answered question of a TestResult per concept tag, so item-level analytics run as SQL aggregations"""
+    test_result = models.ForeignKey(TestResult, related_name='attempts', on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='question_attempts', on_delete=models.CASCADE)
+    assessment = models.ForeignKey(Assessment, related_name='question_attempts', on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, related_name='attempts', null=True, on_delete=models.SET_NULL)
+    is_correct = models.BooleanField(default=False)
+    concept = models.CharField(max_length=255, blank=True)  # One of the question's concept tags, '' if it had none
+    timestamp = models.DateTimeField()  # The result's timestamp
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'concept']),
+            models.Index(fields=['user', 'timestamp']),
+            models.Index(fields=['question', 'is_correct']),
+            models.Index(fields=['assessment', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - question {self.question_id}: {'correct' if self.is_correct else 'wrong'}"
     
 
 
@@ -404,8 +489,15 @@ class MathProblem(models.Model):
     ])
     concepts = models.JSONField(default=list)  # List of math concepts
     correct_answer = models.TextField()
+    canonical_answer = models.JSONField(null=True, blank=True, editable=False)  # Parsed correct_answer
     correct_workings = models.JSONField(default=list)  # List of correct steps
     created_at = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        from .canonical_answers import prepare_canonical_on_save  # Import inside method to avoid circular imports
+        prepare_canonical_on_save(self)
+        _include_canonical_field(kwargs)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.domain} - {self.text[:50]}..."
@@ -427,4 +519,36 @@ class MathWorkings(models.Model):
         verbose_name_plural = "Math Workings"
     
     def __str__(self):
-        return f"Workings for {self.problem} by {self.submitted_by}"
\ No newline at end of file
+        return f"Workings for {self.problem} by {self.submitted_by}"
+
+
+class GradingJob(models.Model):
+    """Background grading of one submission; clients poll it for the result"""
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending Grading'),
+        ('PROCESSING', 'Grading'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    submitted_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    workings = models.ForeignKey(
+        MathWorkings, null=True, blank=True, on_delete=models.CASCADE, related_name='grading_jobs'
+    )
+    answer = models.ForeignKey(
+        Answer, null=True, blank=True, on_delete=models.CASCADE, related_name='grading_jobs'
+    )
+    status = models.CharField(max_length=20, default='PENDING', choices=STATUS_CHOICES)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)  # Times a worker claimed it
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"Grading job {self.id} ({self.status})"
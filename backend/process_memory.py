@@ -0,0 +1,52 @@
+"""
+Per-process memory figures from /proc (Linux only).
+
+RSS counts pages shared with the gunicorn master in full for every worker, so
+it overstates what preloading costs. PSS splits shared pages between the
+processes using them, and Private_* is what the worker alone holds.
+"""
+import os
+
+_SMAPS_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def process_memory(pid='self'):
+    """Memory of one process in MB, or None where /proc isn't available"""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+
+    values = {}
+    for line in lines[1:]:
+        name, _, rest = line.partition(':')
+        if name in _SMAPS_FIELDS:
+            values[name] = int(rest.split()[0])  # kB
+
+    shared = values.get('Shared_Clean', 0) + values.get('Shared_Dirty', 0)
+    private = values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+    return {
+        'pid': os.getpid() if pid == 'self' else int(pid),
+        'rss_mb': round(values.get('Rss', 0) / 1024, 1),
+        'pss_mb': round(values.get('Pss', 0) / 1024, 1),
+        'shared_mb': round(shared / 1024, 1),
+        'private_mb': round(private / 1024, 1),
+    }
+
+
+def child_pids(pid) -> list:
+    """Direct children of a process, e.g. the workers of a gunicorn master"""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # Field 4 is the parent pid; the command name before it may contain spaces
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == int(pid):
+            children.append(int(entry))
+    return sorted(children)
@@ -0,0 +1,70 @@
+"""
+Background refresh of a student's stored weakness report after new test results.
+
+TestResult.save keeps the rating and per-concept counters current (see
+rating_stats and weakness_stats); the report copied onto UserProfile.weaknesses
+is reassembled from the counters on a small per-process pool once the
+submitting transaction commits.
+Refreshes coalesce per user: a user with a refresh already queued or running
+isn't queued again, the running refresh just goes round once more, so a burst
+of submissions costs at most two recomputations.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .executors import get_executor
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_queued = {}  # user id -> whether results arrived since its refresh started
+
+
+def get_profile_executor():
+    """Shared profile refresh pool for this process, created on first use"""
+    return get_executor('profile-refresh', getattr(settings, 'PROFILE_REFRESH_WORKERS', 1))
+
+
+def schedule_profile_refresh(user_id):
+    """Refresh the user's weaknesses once the current transaction commits"""
+    transaction.on_commit(lambda: _enqueue(user_id))
+
+
+def _enqueue(user_id):
+    with _lock:
+        if user_id in _queued:
+            _queued[user_id] = True
+            return
+        _queued[user_id] = False
+    get_profile_executor().submit(_run, user_id)
+
+
+def _run(user_id):
+    close_old_connections()
+    try:
+        while True:
+            with _lock:
+                _queued[user_id] = False
+            try:
+                refresh_user_profile(user_id)
+            except Exception as e:
+                logger.error(f"Profile refresh for user {user_id} failed: {str(e)}", exc_info=True)
+            with _lock:
+                if not _queued[user_id]:
+                    del _queued[user_id]
+                    return
+    finally:
+        close_old_connections()
+
+
+def refresh_user_profile(user_id):
+    from .models import UserProfile
+    from .views import analyze_user_weaknesses  # Import inside function to avoid circular imports
+
+    user = UserProfile.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    analyze_user_weaknesses(user)
@@ -0,0 +1,79 @@
+"""
+Per-question attempts.
+
+Each answered question of a TestResult is also stored as QuestionAttempt rows
+(written with bulk_create when the result is saved), so item difficulty,
+concept mastery and similar analytics are SQL aggregations over indexed
+columns instead of deserializing every detailed_results blob in Python.
+A question gets one row per concept tag, split like weakness_stats does, so
+concepts group directly; per-question figures count distinct results.
+Results saved before the table existed are migrated by
+backfill_question_attempts.
+"""
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Question, QuestionAttempt
+from .weakness_stats import split_concepts
+
+
+def _question_id(item):
+    try:
+        return int(item['question_id'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def build_attempts(test_result, known_question_ids) -> list:
+    """Unsaved QuestionAttempt rows for a result; question ids not in known_question_ids are left null"""
+    attempts = []
+    for item in test_result.detailed_results or []:
+        question_id = _question_id(item)
+        for concept in split_concepts(item.get('concept')) or ['']:
+            attempts.append(QuestionAttempt(
+                test_result_id=test_result.id,
+                user_id=test_result.user_id,
+                assessment_id=test_result.assessment_id,
+                question_id=question_id if question_id in known_question_ids else None,
+                is_correct=bool(item.get('is_correct')),
+                concept=concept[:255],
+                timestamp=test_result.timestamp,
+            ))
+    return attempts
+
+
+def existing_question_ids(detailed_results_list) -> set:
+    """Which of the question ids referenced by these detailed_results still exist, in one query"""
+    ids = {_question_id(item) for detailed_results in detailed_results_list for item in detailed_results or []}
+    ids.discard(None)
+    if not ids:
+        return set()
+    return set(Question.objects.filter(id__in=ids).values_list('id', flat=True))
+
+
+def record_attempts(test_result) -> list:
+    """Write a saved result's attempts with one bulk_create"""
+    known = existing_question_ids([test_result.detailed_results])
+    return QuestionAttempt.objects.bulk_create(
+        build_attempts(test_result, known),
+        batch_size=getattr(settings, 'QUESTION_ATTEMPT_BATCH_SIZE', 500)
+    )
+
+
+def item_difficulty(assessment_id):
+    """Per question of an assessment: attempts, correct attempts and the share answered correctly"""
+    rows = QuestionAttempt.objects.filter(
+        assessment_id=assessment_id, question__isnull=False
+    ).values('question_id').annotate(
+        attempts=Count('test_result', distinct=True),
+        correct=Count('test_result', distinct=True, filter=Q(is_correct=True))
+    ).order_by('question_id')
+    return [{**row, 'p_value': row['correct'] / row['attempts']} for row in rows]
+
+
+def concept_mastery(user_id):
+    """Per concept: the user's attempts, correct attempts and the share answered correctly"""
+    rows = QuestionAttempt.objects.filter(user_id=user_id).exclude(concept='').values('concept').annotate(
+        attempts=Count('id'), correct=Count('id', filter=Q(is_correct=True))
+    ).order_by('concept')
+    return [{**row, 'mastery': row['correct'] / row['attempts']} for row in rows]
@@ -0,0 +1,52 @@
+"""
+Per-user running rating statistics.
+
+UserRatingStats keeps the result count, score sum and the last few scores, so
+a new TestResult updates the user's rating in constant time inside the
+transaction that saves it. Edited or deleted results, and users without stats
+yet, are rebuilt from history; reconcile_rating_stats checks the running
+figures against history.
+"""
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import TestResult, UserProfile, UserRatingStats
+
+
+def record_result(user_id, score) -> UserRatingStats:
+    """Add a just-saved result to the user's stats and rating"""
+    with transaction.atomic():
+        # The row lock serialises concurrent submissions for the same user
+        stats, created = UserRatingStats.objects.select_for_update().get_or_create(user_id=user_id)
+        if created:
+            # First result since stats were introduced: take in the whole history once
+            return rebuild_rating_stats(user_id)
+        stats.add_score(score)
+        stats.save()
+        UserProfile.objects.filter(pk=user_id).update(rating=stats.rating())
+    return stats
+
+
+def history_stats(user_id) -> dict:
+    """count, score_sum and recent_scores computed from the user's TestResult rows"""
+    results = TestResult.objects.filter(user_id=user_id)
+    totals = results.aggregate(count=Count('id'), score_sum=Sum('score'))
+    recent = list(
+        results.order_by('-timestamp', '-id').values_list('score', flat=True)[:UserRatingStats.RECENT_RESULTS]
+    )
+    return {
+        'result_count': totals['count'],
+        'score_sum': totals['score_sum'] or 0.0,
+        'recent_scores': recent[::-1],
+    }
+
+
+def rebuild_rating_stats(user_id) -> UserRatingStats:
+    """Recompute the user's stats and rating from history"""
+    with transaction.atomic():
+        stats, _ = UserRatingStats.objects.select_for_update().get_or_create(user_id=user_id)
+        for field, value in history_stats(user_id).items():
+            setattr(stats, field, value)
+        stats.save()
+        UserProfile.objects.filter(pk=user_id).update(rating=stats.rating())
+    return stats
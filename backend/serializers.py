@@ -4,7 +4,7 @@ from .models import (
     Assessment, Question, UserProfile,
     UserProgress, TestResult, ContentUpload,
     Answer, AnswerWorking,
-    MathProblem, MathWorkings
+    MathProblem, MathWorkings, GradingJob
 )
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
@@ -12,6 +12,7 @@ from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.utils import timezone
 from django.urls import reverse
+from django.conf import settings
 
 
 
@@ -382,18 +383,83 @@ class MathWorkingsSerializer(serializers.ModelSerializer):
     class Meta:
         model = MathWorkings
         fields = '__all__'
-        read_only_fields = ['submitted_at', 'feedback']
+        # Grading results are written by the background grader, not the client
+        read_only_fields = [
+            'submitted_by', 'submitted_at', 'is_correct',
+            'confidence', 'error_types', 'feedback'
+        ]
+
+class BulkWorkingsItemSerializer(serializers.Serializer):
+    problem = serializers.IntegerField()
+    steps = serializers.ListField(
+        child=serializers.CharField(max_length=1000),
+        allow_empty=False
+    )
+    answer = serializers.CharField(required=False, allow_blank=True)
+
+class BulkWorkingsSerializer(serializers.Serializer):
+    items = BulkWorkingsItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        max_items = getattr(settings, 'MATH_BULK_MAX_ITEMS', 5000)
+        if len(items) > max_items:
+            raise serializers.ValidationError(
+                f"At most {max_items} items per request; use the grade_math_workings command for more"
+            )
+
+        # One query for every referenced problem instead of one per item
+        problem_ids = {item['problem'] for item in items}
+        problems = MathProblem.objects.in_bulk(problem_ids)
+        missing = sorted(problem_ids - problems.keys())
+        if missing:
+            raise serializers.ValidationError(
+                f"Unknown problem ids: {', '.join(map(str, missing))}"
+            )
+        for item in items:
+            item['problem'] = problems[item['problem']]
+        return items
+
+class StepSessionCreateSerializer(serializers.Serializer):
+    problem = serializers.IntegerField(required=False)
+    problem_text = serializers.CharField(required=False)
+
+    def validate(self, data):
+        if 'problem' in data:
+            try:
+                data['problem_text'] = MathProblem.objects.get(id=data['problem']).text
+            except MathProblem.DoesNotExist:
+                raise serializers.ValidationError({'problem': "Unknown problem id"})
+        if not data.get('problem_text'):
+            raise serializers.ValidationError("Provide a problem id or problem_text")
+        return data
+
+class StepAppendSerializer(serializers.Serializer):
+    step = serializers.CharField(max_length=1000, trim_whitespace=False)
 
 class AnswerWithWorkingsSerializer(serializers.ModelSerializer):
-    workings = MathWorkingsSerializer(many=True, required=False)
+    workings = AnswerWorkingSerializer(many=True, read_only=True)
+    steps = serializers.ListField(
+        child=serializers.CharField(max_length=1000),
+        required=False,
+        write_only=True
+    )
     
     class Meta:
         model = Answer
         fields = [
             'id', 'user', 'question', 'response', 
-            'is_correct', 'workings', 'submitted_at'
+            'is_correct', 'workings', 'steps', 'submitted_at'
+        ]
+        read_only_fields = ['user', 'question', 'is_correct', 'submitted_at']
+
+class GradingJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GradingJob
+        fields = [
+            'id', 'status', 'workings', 'answer', 'result',
+            'error', 'created_at', 'started_at', 'completed_at'
         ]
-        read_only_fields = ['user', 'is_correct', 'submitted_at']
+        read_only_fields = fields
 
 class QuestionWithWorkingsSerializer(serializers.ModelSerializer):
     correct_workings = serializers.JSONField()
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .answer_key import invalidate_answer_key
+from .models import MathProblem, Question, TestResult, UserProfile
+
+
+@receiver(post_save, sender=MathProblem)
+@receiver(post_save, sender=Question)
+def warm_problem_prefix(sender, instance, **kwargs):
+    """Tokenize a new or edited problem's prefix before students start submitting"""
+    if getattr(settings, 'MATH_EVALUATOR_SOCKET', None):
+        return  # The evaluator service tokenizes; web workers don't load transformers
+    from .executors import get_executor
+    from .tokenization import warm_problem_prefixes  # Keeps transformers out of model import
+
+    text = instance.text
+    # One thread per process, so a bulk import queues its prefixes instead of starting a thread each
+    transaction.on_commit(lambda: get_executor('prefix-warm', 1).submit(warm_problem_prefixes, [text]))
+
+
+@receiver(pre_save, sender=Question)
+def remember_question_assessment(sender, instance, **kwargs):
+    """A question moved to another assessment must also leave the old one's answer key"""
+    if instance.pk is not None:
+        instance._previous_assessment_id = (
+            Question.objects.filter(pk=instance.pk).values_list('assessment_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_answer_key(sender, instance, **kwargs):
+    """Drop cached answer keys once the change is committed, so they can't be rebuilt from old rows"""
+    assessment_ids = {instance.assessment_id, getattr(instance, '_previous_assessment_id', None)}
+    for assessment_id in assessment_ids - {None}:
+        transaction.on_commit(lambda assessment_id=assessment_id: invalidate_answer_key(assessment_id))
+
+
+@receiver(post_delete, sender=TestResult)
+def rebuild_stats_after_delete(sender, instance, **kwargs):
+    """Running rating stats and concept counters can't subtract a result; rebuild them once the delete commits"""
+    from .profile_updates import schedule_profile_refresh  # Import inside function to avoid circular imports
+    from .rating_stats import rebuild_rating_stats
+    from .weakness_stats import rebuild_concept_weaknesses
+
+    user_id = instance.user_id
+
+    def rebuild():
+        if UserProfile.objects.filter(pk=user_id).exists():  # Gone if the user was being deleted
+            rebuild_rating_stats(user_id)
+            rebuild_concept_weaknesses(user_id)
+            schedule_profile_refresh(user_id)
+
+    transaction.on_commit(rebuild)
@@ -0,0 +1,142 @@
+"""
+Incremental feedback while a student enters workings one step at a time.
+
+A StepSession remembers what earlier steps already produced: the token set of
+the last step, the running error state, and each step's values at fixed probe
+points. Appending a step therefore tokenizes, parses and evaluates only that
+step, however long the workings get.
+"""
+import logging
+import re
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .equivalence import follows_from, step_probe_values
+from .math_normalization import normalize_math
+from .symbolic_pool import get_symbolic_pool
+
+logger = logging.getLogger(__name__)
+
+# Shared with MathAnswerEvaluator._detect_errors so both report the same errors
+STEP_TOKENS = re.compile(r'[\w\+\-\*/=]+')
+SIGN_RUN = re.compile(r'[\+\-]\s*[\+\-]')
+MAX_NEW_TERMS = 5  # More new terms than this between steps counts as a missing step
+
+
+class StepSession:
+    def __init__(self, problem_text: str, user_id=None, session_id=None):
+        self.id = session_id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.problem_text = problem_text
+        self.steps = []
+        self.step_feedback = []
+        self.sign_error = bool(SIGN_RUN.search(problem_text))
+        self.max_new_terms = 0
+        self._tail = problem_text.rstrip()[-1:]
+        self._last_tokens = None
+        self._last_values = None
+
+    def append(self, step: str) -> dict:
+        """Process one new step and return its feedback"""
+        tokens = set(STEP_TOKENS.findall(step))
+        new_terms = len(tokens - self._last_tokens) if self._last_tokens is not None else 0
+        self.max_new_terms = max(self.max_new_terms, new_terms)
+
+        # Only the previous text's last character can join a sign run with this step
+        step_sign_error = bool(SIGN_RUN.search(f"{self._tail} {step}"))
+        self.sign_error = self.sign_error or step_sign_error
+
+        values = self._probe(step)
+        feedback = {
+            'step': len(self.steps) + 1,
+            'text': step,
+            'parsed': values is not None,
+            'follows_previous': follows_from(self._last_values, values) if self.steps else None,
+            'new_terms': new_terms,
+            'sign_error': step_sign_error,
+        }
+
+        self.steps.append(step)
+        self.step_feedback.append(feedback)
+        self._tail = step.rstrip()[-1:] or self._tail
+        self._last_tokens = tokens
+        if values is not None:
+            self._last_values = values
+        return feedback
+
+    @property
+    def errors(self) -> list:
+        """Same result as MathAnswerEvaluator._detect_errors over all steps so far"""
+        errors = []
+        if self.sign_error:
+            errors.append('sign_error')
+        if len(self.steps) > 2 and self.max_new_terms > MAX_NEW_TERMS:
+            errors.append('missing_step')
+        return errors
+
+    def feedback(self) -> dict:
+        return {
+            'session_id': self.id,
+            'problem_text': self.problem_text,
+            'step_count': len(self.steps),
+            'errors': self.errors,
+            'latest': self.step_feedback[-1] if self.step_feedback else None,
+            'steps': self.step_feedback,
+        }
+
+    def _probe(self, step: str):
+        # Parsing untrusted input can blow up, so it goes to the killable sympy workers when enabled
+        normalized = normalize_math(step)
+        pool = get_symbolic_pool()
+        if pool is not None:
+            return pool.step_values(normalized)
+        return step_probe_values(normalized, probes=getattr(settings, 'MATH_NUMERIC_PROBES', 8))
+
+
+class StepSessionConflict(Exception):
+    """Another request is already changing the session"""
+
+
+class StepSessionStore:
+    """Sessions live in a Django cache so any worker can continue one"""
+
+    def __init__(self, alias='default', timeout=1800, prefix='stepsession', lock_timeout=30):
+        self.alias = alias
+        self.timeout = timeout
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+
+    @contextmanager
+    def lock(self, session_id: str):
+        """
+        Hold the session for one read-modify-write. cache.add only succeeds for one
+        caller, so an overlapping append raises StepSessionConflict instead of
+        saving over the other's step.
+        """
+        key = f"{self.prefix}:{session_id}:lock"
+        if not caches[self.alias].add(key, 1, self.lock_timeout):
+            raise StepSessionConflict(session_id)
+        try:
+            yield
+        finally:
+            caches[self.alias].delete(key)
+
+    def get(self, session_id: str):
+        return caches[self.alias].get(f"{self.prefix}:{session_id}")
+
+    def save(self, session: StepSession):
+        caches[self.alias].set(f"{self.prefix}:{session.id}", session, self.timeout)
+
+    def delete(self, session_id: str):
+        caches[self.alias].delete(f"{self.prefix}:{session_id}")
+
+
+def get_session_store():
+    return StepSessionStore(
+        alias=getattr(settings, 'MATH_STEP_SESSION_CACHE', 'default'),
+        timeout=getattr(settings, 'MATH_STEP_SESSION_TIMEOUT', 1800),
+        lock_timeout=getattr(settings, 'MATH_STEP_SESSION_LOCK_TIMEOUT', 30)
+    )
@@ -0,0 +1,33 @@
+import hashlib
+
+from .two_tier_cache import TwoTierCache
+
+
+class SymbolicResultCache:
+    """
+    Two-tier cache of symbolic equivalence results (see TwoTierCache).
+    Keys are the normalized expression pair, order-insensitive since
+    equivalence is symmetric.
+    """
+
+    def __init__(self, max_size=10000, shared_alias=None, shared_timeout=86400, prefix='symeq'):
+        self.cache = TwoTierCache(
+            prefix, max_size=max_size, shared_alias=shared_alias, shared_timeout=shared_timeout
+        )
+
+    def make_key(self, left: str, right: str) -> str:
+        pair = '\x00'.join(sorted((left.strip(), right.strip())))
+        return self.cache.make_key(hashlib.sha1(pair.encode('utf-8')).hexdigest())
+
+    def get(self, left: str, right: str):
+        """Cached result for the pair, or None on a miss"""
+        return self.cache.get(self.make_key(left, right))
+
+    def set(self, left: str, right: str, value):
+        self.cache.set(self.make_key(left, right), value)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        return self.cache.stats()
@@ -0,0 +1,179 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+from .equivalence import TIER_TIMEOUT
+from .evaluator_registry import get_artifact
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(conn, probes, tolerance):
+    """Child process loop: receive (kind, args), reply with the sympy result"""
+    import sympy  # noqa: F401  Pay the import before reporting ready, not on the first check
+    from .equivalence import canonical_form, step_probe_values, tiered_equivalence
+
+    conn.send('ready')
+    while True:
+        try:
+            kind, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        if kind == 'step_values':
+            conn.send(step_probe_values(*args, probes=probes))
+        elif kind == 'canonical':
+            conn.send(canonical_form(*args, probes=probes))
+        else:
+            conn.send(tiered_equivalence(*args, probes=probes, tolerance=tolerance))
+
+
+class _Worker:
+    def __init__(self, ctx, probes, tolerance):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, probes, tolerance),
+            name='sympy-worker', daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout) -> bool:
+        """Wait for the child to finish importing sympy, so startup isn't billed to a check"""
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = self.conn.recv() == 'ready'
+        return self.ready
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(timeout=1)
+        finally:
+            self.conn.close()
+
+
+class SymbolicWorkerPool:
+    """
+    Bounded pool of sympy worker processes with a hard per-call timeout.
+    A call that runs past ``timeout`` has its worker killed and replaced, and
+    returns None (undetermined) so the web thread is released on time.
+    """
+
+    def __init__(self, size=2, timeout=2.0, probes=8, tolerance=1e-8, acquire_timeout=1.0,
+                 startup_timeout=30.0, start_method='spawn'):
+        self.size = max(1, int(size))
+        self.probes = probes
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self.startup_timeout = startup_timeout
+        self._ctx = multiprocessing.get_context(start_method)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._metrics = {
+            'calls': 0, 'completed': 0, 'timeouts': 0, 'rejected': 0,
+            'worker_errors': 0, 'workers_replaced': 0, 'busy': 0, 'total_seconds': 0.0,
+        }
+        for _ in range(self.size):
+            self._idle.put(self._spawn())
+
+    def check(self, left: str, right: str):
+        """(result, tier) from the worker, or (None, 'timeout') if it was undetermined"""
+        return self._call('equivalence', (left, right), (None, TIER_TIMEOUT))
+
+    def step_values(self, step: str):
+        """Probe values of one normalized step (see step_probe_values), or None if it timed out"""
+        return self._call('step_values', (step,), None)
+
+    def canonical(self, expr: str):
+        """canonical_form of a normalized answer, or None if it timed out"""
+        return self._call('canonical', (expr,), None)
+
+    def _call(self, kind, args, undetermined):
+        self._count('calls')
+        try:
+            worker = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            self._count('rejected')
+            return undetermined
+
+        started = time.perf_counter()
+        self._count('busy')
+        try:
+            if not worker.wait_ready(self.startup_timeout):
+                raise OSError("worker did not start")
+
+            worker.conn.send((kind, args))
+            if worker.conn.poll(self.timeout):
+                result = worker.conn.recv()
+                self._idle.put(worker)
+                self._count('completed')
+                return result
+
+            logger.warning(f"Symbolic {kind} timed out after {self.timeout}s: {args!r}")
+            self._count('timeouts')
+            self._replace(worker)
+            return undetermined
+        except (EOFError, OSError) as e:
+            logger.error(f"Symbolic worker failed: {str(e)}")
+            self._count('worker_errors')
+            self._replace(worker)
+            return undetermined
+        finally:
+            with self._lock:
+                self._metrics['busy'] -= 1
+                self._metrics['total_seconds'] += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._metrics)
+        data['size'] = self.size
+        data['timeout'] = self.timeout
+        data['idle_workers'] = self._idle.qsize()
+        data['avg_seconds'] = (
+            round(data['total_seconds'] / data['calls'], 4) if data['calls'] else 0.0
+        )
+        data['total_seconds'] = round(data['total_seconds'], 3)
+        return data
+
+    def shutdown(self):
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                break
+
+    def _spawn(self):
+        return _Worker(self._ctx, self.probes, self.tolerance)
+
+    def _replace(self, worker):
+        """Kill a stuck or broken worker and put a fresh one in its place"""
+        worker.kill()
+        self._count('workers_replaced')
+        try:
+            self._idle.put(self._spawn())
+        except Exception as e:
+            logger.error(f"Could not start symbolic worker: {str(e)}")
+
+    def _count(self, name):
+        with self._lock:
+            self._metrics[name] += 1
+
+
+def get_symbolic_pool():
+    """Shared sympy worker pool for this process, or None when MATH_SYMBOLIC_POOL_SIZE is 0"""
+    if getattr(settings, 'MATH_SYMBOLIC_POOL_SIZE', 2) <= 0:
+        return None
+    return get_artifact(
+        'symbolic-pool',
+        lambda: SymbolicWorkerPool(
+            size=getattr(settings, 'MATH_SYMBOLIC_POOL_SIZE', 2),
+            timeout=getattr(settings, 'MATH_SYMBOLIC_TIMEOUT', 2.0),
+            probes=getattr(settings, 'MATH_NUMERIC_PROBES', 8),
+            tolerance=getattr(settings, 'MATH_NUMERIC_TOLERANCE', 1e-8)
+        )
+    )
@@ -1,9 +1,16 @@
+from django.apps import apps as django_apps
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.test import SimpleTestCase, TestCase, override_settings
+from unittest import skipUnless
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.core.cache import cache
+from django.utils import timezone
+from django.core.management import call_command
 from .models import (
+    Assessment,
+    Question,
     UserProfile,
     Program,
     Module,
@@ -11,10 +18,46 @@ from .models import (
     Enrollment,
     UserProgress,
     LearningSession,
-    Activity
+    Activity,
+    MathProblem,
+    MathWorkings,
+    GradingJob,
+    ConceptWeakness,
+    QuestionAttempt
 )
+from .answer_key import get_answer_key, grade_answers
+from .canonical_answers import current_canonical, stored_canonical
+from .profile_updates import _enqueue
+from .question_attempts import concept_mastery, item_difficulty
+from .rating_stats import history_stats
+from .weakness_stats import rebuild_concept_weaknesses, weakness_report
+from .equivalence import fingerprint_match, step_probe_values, tiered_equivalence
+from .evaluation_cache import EvaluationResultCache
+from .grading import grade_workings_bulk, requeue_stale_jobs, run_grading_job
+from .evaluator_metrics import StageMetrics, StageTimer, get_stage_metrics
+from .evaluator_registry import get_artifact, preload_for_fork, registry_status, reinit_after_fork, reset_registry
+from .evaluator_service import EvaluatorServer, EvaluatorServiceError, RemoteMathEvaluator
+from .inference_batcher import MicroBatcher
+from .management.commands.benchmark_evaluator import DEFAULT_CORPUS, latency_summary, load_corpus
+from .management.commands.benchmark_startup import measure_boot
+from .math_normalization import normalize_many, normalize_math
+from .step_session import StepSession, get_session_store
+from .symbolic_cache import SymbolicResultCache
+from .symbolic_pool import SymbolicWorkerPool
+from .tokenization import ProblemPrefixCache, group_by_bucket, pick_bucket
+from .two_tier_cache import TwoTierCache
+import importlib
+import importlib.util
+import json
 import logging
-from unittest.mock import patch
+import numpy as np
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import MagicMock, patch
 
 User = get_user_model()
 
@@ -204,4 +247,925 @@ class DashboardViewTests(APITestCase):
                 
                 self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR,
                               f"Expected 500 error but got {response.status_code}. Response: {response.data}")
-                self.assertIn('error', response.data)
\ No newline at end of file
+                self.assertIn('error', response.data)
+
+class EvaluatorRegistryTests(SimpleTestCase):
+    def setUp(self):
+        reset_registry()
+
+    def tearDown(self):
+        reset_registry()
+
+    def test_artifact_loaded_once_across_threads(self):
+        """Concurrent callers should share a single load"""
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return object()
+
+        threads = [
+            threading.Thread(target=get_artifact, args=('test-artifact', loader))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertIn('test-artifact', registry_status()['artifacts'])
+
+    def test_status_before_load(self):
+        """Cold workers should report the evaluator as not loaded"""
+        status_data = registry_status()
+        self.assertFalse(status_data['evaluator_loaded'])
+        self.assertFalse(status_data['model_ready'])
+
+    def test_status_endpoint_hides_details_from_anonymous_callers(self):
+        response = self.client.get(reverse('evaluator-status'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'model_ready': False})
+
+    def test_preload_needs_tflite_runtime(self):
+        """Without tflite_runtime the master skips the model rather than import TensorFlow"""
+        with patch('backend.tokenization.get_tokenizer'), \
+                patch('backend.tflite_validator.standalone_interpreter', return_value=None), \
+                patch('backend.math_evaluator.load_step_validator') as load:
+            preload_for_fork()
+        load.assert_not_called()
+
+    def test_reinit_after_fork_keeps_models_and_drops_threads(self):
+        """Forked workers keep inherited weights but rebuild thread-owning artifacts"""
+        model = type('Model', (), {'resets': 0})()
+        model.reset_after_fork = lambda: setattr(model, 'resets', model.resets + 1)
+        get_artifact('model:test', lambda: model)
+        get_artifact('batcher:test', object)
+
+        reinit_after_fork()
+
+        self.assertEqual(model.resets, 1)
+        self.assertIs(get_artifact('model:test', object), model)
+        self.assertNotIn('batcher:test', registry_status()['artifacts'])
+
+
+class StageMetricsTests(SimpleTestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = StageMetrics(buckets=(0.01, 0.1))
+        for seconds in (0.005, 0.05, 0.5):
+            metrics.observe('predict', seconds)
+
+        snapshot = metrics.snapshot()['predict']
+        self.assertEqual(snapshot['count'], 3)
+        self.assertEqual(snapshot['buckets'], {'0.01': 1, '0.1': 2, '+Inf': 3})
+        self.assertIn('math_evaluator_stage_seconds_bucket{stage="predict"', metrics.prometheus_text())
+
+    def test_timer_records_stages(self):
+        timer = StageTimer()
+        before = get_stage_metrics().snapshot().get('tokenize', {}).get('count', 0)
+        with timer.stage('tokenize'):
+            pass
+
+        self.assertIn('tokenize', timer.as_ms())
+        self.assertEqual(get_stage_metrics().snapshot()['tokenize']['count'], before + 1)
+
+    @override_settings(MATH_EVALUATOR_METRICS_TOKEN='scrape-secret')
+    def test_metrics_endpoint(self):
+        self.assertEqual(self.client.get(reverse('evaluator-metrics')).status_code, 403)
+        response = self.client.get(reverse('evaluator-metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('# TYPE math_evaluator_stage_seconds histogram', response.content.decode())
+
+
+class EvaluatorServiceTests(SimpleTestCase):
+    class FakeEvaluator:
+        def __init__(self):
+            self.calls = []
+
+        def evaluate(self, problem_text, workings, timer=None, expected=None):
+            self.calls.append(problem_text)
+            if problem_text == 'slow':
+                time.sleep(0.5)
+            with timer.stage('predict'):
+                return {'is_correct': workings[-1] == '4', 'problem': problem_text}
+
+        def evaluate_many(self, items, batch_size=256, expected=None):
+            return [self.evaluate(problem_text, workings, StageTimer()) for problem_text, workings in items]
+
+        def _symbolic_check_with_tier(self, user_answer, correct_answer):
+            return user_answer == correct_answer, 'string'
+
+    def setUp(self):
+        socket_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(socket_dir, 'evaluator.sock')
+        self.evaluator = self.FakeEvaluator()
+        self.server = EvaluatorServer(self.socket_path, self.evaluator, lambda: {'model_ready': True})
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(os.rmdir, socket_dir)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_remote_evaluator_round_trip(self):
+        remote = RemoteMathEvaluator(self.socket_path, timeout=5)
+
+        timer = StageTimer()
+        self.assertTrue(remote.evaluate('2+2', ['2+2', '4'], timer=timer)['is_correct'])
+        self.assertIn('predict', timer.as_ms())
+        self.assertEqual(
+            [r['is_correct'] for r in remote.evaluate_many([('2+2', ['4']), ('2+2', ['5'])])],
+            [True, False]
+        )
+        self.assertEqual(remote._symbolic_check_with_tier('x', 'x'), (True, 'string'))
+        self.assertTrue(remote.is_ready())
+
+    def test_unknown_operation_is_reported(self):
+        remote = RemoteMathEvaluator(self.socket_path, timeout=5)
+        with self.assertRaises(EvaluatorServiceError):
+            remote.client.call('train')
+
+    def test_timed_out_evaluation_not_resent(self):
+        remote = RemoteMathEvaluator(self.socket_path, timeout=0.1)
+        with self.assertRaises(EvaluatorServiceError):
+            remote.evaluate('slow', ['4'])
+        time.sleep(0.6)
+        self.assertEqual(self.evaluator.calls, ['slow'])
+
+    def test_unreachable_service(self):
+        remote = RemoteMathEvaluator(self.socket_path + '.missing', timeout=1)
+        self.assertFalse(remote.is_ready())
+        with self.assertRaises(EvaluatorServiceError):
+            remote.evaluate('2+2', ['4'])
+
+
+class EvaluatorBenchmarkTests(SimpleTestCase):
+    def test_checked_in_corpus_is_valid(self):
+        corpus = load_corpus(DEFAULT_CORPUS)
+        self.assertGreaterEqual(len(corpus), 40)
+
+    def test_latency_summary_percentiles(self):
+        stats = latency_summary([0.001] * 98 + [0.1, 0.2])
+        self.assertEqual(stats['calls'], 100)
+        self.assertAlmostEqual(stats['p50_ms'], 1.0)
+        self.assertGreater(stats['p99_ms'], stats['p95_ms'])
+
+
+@skipUnless(
+    importlib.util.find_spec('tensorflow') and importlib.util.find_spec('transformers'),
+    'needs tensorflow and transformers'
+)
+class StudentExportTests(SimpleTestCase):
+    def test_student_round_trips_through_tflite(self):
+        # Import inside method: the training and export commands import tensorflow at module level
+        from .management.commands.export_math_evaluator import convert_to_tflite
+        from .management.commands.train_math_evaluator import Command as TrainCommand
+        from .tflite_validator import TFLiteStepValidator
+        from .tokenization import pad_to_bucket
+
+        student = TrainCommand()._build_student(vocab_size=64)
+        encoded = [pad_to_bucket(list(range(1, n)), (16, 32)) for n in (5, 12, 20)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'student.tflite')
+            with open(path, 'wb') as f:
+                f.write(convert_to_tflite(student, 'dynamic', encoded))
+            validator = TFLiteStepValidator(path)
+            for input_ids, attention_mask in encoded:
+                expected = student.predict([input_ids, attention_mask], verbose=0)
+                np.testing.assert_allclose(validator.predict([input_ids, attention_mask]), expected, atol=0.05)
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_boot_does_not_import_heavy_ml_modules(self):
+        self.assertEqual(measure_boot()['heavy'], [])
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_scores_fan_out_to_callers(self):
+        """Each caller should get the score for its own row"""
+        batch_sizes = []
+
+        def predict(input_ids, attention_mask):
+            batch_sizes.append(len(input_ids))
+            return input_ids[:, :1] / 100.0
+
+        batcher = MicroBatcher(predict, max_batch_size=8, max_wait_ms=50)
+        results = {}
+
+        def call(i):
+            results[i] = batcher.submit(np.full((1, 4), i), np.ones((1, 4)))
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(results, {i: i / 100.0 for i in range(8)})
+        self.assertLess(len(batch_sizes), 8)
+        self.assertEqual(batcher.stats()['requests'], 8)
+
+
+class LengthBucketTests(SimpleTestCase):
+    class WordTokenizer:
+        pad_token_id = 0
+
+        def __call__(self, texts, truncation=True, max_length=None):
+            encode = lambda t: list(range(1, len(t.split()) + 1))[:max_length]
+            if isinstance(texts, str):
+                return {'input_ids': encode(texts)}
+            return {'input_ids': [encode(t) for t in texts]}
+
+    def test_pick_smallest_fitting_bucket(self):
+        self.assertEqual(pick_bucket(10, (64, 128, 256)), 64)
+        self.assertEqual(pick_bucket(65, (64, 128, 256)), 128)
+        self.assertEqual(pick_bucket(999, (64, 128, 256)), 256)
+
+    def test_group_by_bucket_pads_to_bucket_length(self):
+        texts = ['x ' * 3, 'x ' * 100, 'x ' * 5]
+        groups = group_by_bucket(self.WordTokenizer(), texts, (64, 128))
+
+        input_ids, attention_mask, indices = groups[64]
+        self.assertEqual(input_ids.shape, (2, 64))
+        self.assertEqual(indices, [0, 2])
+        self.assertEqual(attention_mask[1].sum(), 5)
+        self.assertEqual(groups[128][0].shape, (1, 128))
+
+
+class ProblemPrefixCacheTests(SimpleTestCase):
+    class CharTokenizer:
+        pad_token_id = 0
+        cls_token_id = 101
+        sep_token_id = 102
+
+        def __init__(self):
+            self.calls = []
+
+        def __call__(self, text, add_special_tokens=True, truncation=False, max_length=None):
+            self.calls.append(text)
+            ids = [ord(c) for c in text]
+            if add_special_tokens:
+                ids = [self.cls_token_id] + ids[:max_length - 2] + [self.sep_token_id]
+            return {'input_ids': ids}
+
+    def test_prefix_tokenized_once_per_problem(self):
+        tokenizer = self.CharTokenizer()
+        cache = ProblemPrefixCache()
+        cache.encode(tokenizer, 'Solve 2x = 4', ['x = 2'], (64,))
+        cache.encode(tokenizer, 'Solve 2x = 4', ['x = 3'], (64,))
+
+        self.assertEqual(sum(call.startswith('Problem:') for call in tokenizer.calls), 1)
+        self.assertEqual(cache.stats()['local_hits'], 1)
+
+    def test_matches_full_text_encoding(self):
+        tokenizer = self.CharTokenizer()
+        input_ids, attention_mask = ProblemPrefixCache().encode(tokenizer, 'p' * 40, ['x = 1'], (32, 64))
+        expected = tokenizer('Problem: ' + 'p' * 40 + '\nWorkings: x = 1', max_length=64)['input_ids']
+
+        self.assertEqual(input_ids.shape, (1, 64))
+        self.assertEqual(list(input_ids[0, :len(expected)]), expected)
+        self.assertEqual(attention_mask.sum(), len(expected))
+
+
+class PrefixWarmSignalTests(TestCase):
+    def save_problem(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            MathProblem.objects.create(
+                original_id='w1', text='Solve 3x = 9', domain='algebra', grade_level='9th', correct_answer='3'
+            )
+
+    @override_settings(MATH_SYMBOLIC_POOL_SIZE=0)
+    def test_warming_runs_on_shared_executor(self):
+        executor = MagicMock()
+        with patch('backend.executors.get_executor', return_value=executor) as get_executor, \
+                patch('backend.tokenization.warm_problem_prefixes') as warm:
+            self.save_problem()
+        get_executor.assert_called_once_with('prefix-warm', 1)
+        executor.submit.assert_called_once_with(warm, ['Solve 3x = 9'])
+
+    @override_settings(MATH_SYMBOLIC_POOL_SIZE=0, MATH_EVALUATOR_SOCKET='/tmp/evaluator.sock')
+    def test_no_warming_with_remote_evaluator(self):
+        with patch('backend.executors.get_executor') as get_executor:
+            self.save_problem()
+        get_executor.assert_not_called()
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def test_shared_tier_fills_local_and_prefixes_separate(self):
+        writer = TwoTierCache('tier-a', shared_alias='default')
+        writer.set(writer.make_key('k'), 1)
+        reader = TwoTierCache('tier-a', shared_alias='default')
+        other = TwoTierCache('tier-b', shared_alias='default')
+
+        self.assertEqual(reader.get(reader.make_key('k')), 1)
+        self.assertEqual(reader.get(reader.make_key('k')), 1)
+        self.assertIsNone(other.get(other.make_key('k')))
+        stats = reader.stats()
+        self.assertEqual((stats['shared_hits'], stats['local_hits']), (1, 1))
+
+
+class SymbolicResultCacheTests(SimpleTestCase):
+    def test_lru_hits_and_eviction(self):
+        cache_ = SymbolicResultCache(max_size=2)
+        cache_.set('2*x', 'x+x', True)
+        cache_.set('x', '1', False)
+
+        self.assertTrue(cache_.get('x+x', '2*x'))  # Order-insensitive
+        cache_.set('y', 'y', True)  # Evicts the least recently used pair
+        self.assertIsNone(cache_.get('x', '1'))
+
+        stats = cache_.stats()
+        self.assertEqual(stats['local_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size'], 2)
+
+
+class EvaluationResultCacheTests(SimpleTestCase):
+    result = {'is_correct': True, 'score': 0.9, 'errors': [], 'expected_answer': '2'}
+
+    def test_whitespace_variants_share_an_entry(self):
+        cache = EvaluationResultCache(model_version='v1')
+        cache.set('Solve 2x = 4', ['2x  = 4', 'x = 2'], self.result)
+        self.assertEqual(cache.get('Solve 2x = 4 ', [' 2x = 4', 'x\t= 2']), self.result)
+        self.assertIsNone(cache.get('Solve 2x = 4', ['x = 2']))
+
+    def test_new_model_version_misses(self):
+        old = EvaluationResultCache(model_version='v1', shared_alias='default')
+        old.set('p', ['x = 1'], self.result)
+        new = EvaluationResultCache(model_version='v2', shared_alias='default')
+        self.assertIsNone(new.get('p', ['x = 1']))
+
+    def test_entries_expire(self):
+        cache = EvaluationResultCache(model_version='v1', ttl=0)
+        cache.set('p', ['x = 1'], self.result)
+        self.assertIsNone(cache.get('p', ['x = 1']))
+        self.assertEqual(cache.stats()['expired'], 1)
+
+
+@override_settings(MATH_SYMBOLIC_POOL_SIZE=0)
+class StepSessionTests(SimpleTestCase):
+    def test_steps_checked_against_previous_step(self):
+        session = StepSession('Solve 2x + 3 = 7')
+        session.append('2x = 4')
+        self.assertTrue(session.append('x = 2')['follows_previous'])
+        self.assertFalse(session.append('x = 3')['follows_previous'])
+        self.assertFalse(session.append('so the answer is')['parsed'])
+
+    def test_errors_accumulate_across_steps(self):
+        session = StepSession('Solve x + 1 = 3')
+        for step in ['x = 3 -', '- 1', 'a b c d e f g = 2', 'x = 2']:
+            session.append(step)
+        self.assertEqual(session.errors, ['sign_error', 'missing_step'])
+
+    def test_session_survives_store_round_trip(self):
+        store = get_session_store()
+        session = StepSession('Solve 2x = 4', user_id=1)
+        session.append('x = 2')
+        store.save(session)
+
+        restored = store.get(session.id)
+        self.assertEqual(restored.steps, ['x = 2'])
+        self.assertFalse(restored.append('x = 5')['follows_previous'])
+
+
+@override_settings(MATH_SYMBOLIC_POOL_SIZE=0)
+class StepSessionViewSetTests(APITestCase):
+    def setUp(self):
+        self.user = UserProfile.objects.create_user(email='student@example.com', password='testpass123')
+        self.problem = MathProblem.objects.create(
+            original_id='s1', text='Solve 2x + 3 = 7', domain='algebra', grade_level='9th', correct_answer='2'
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_steps_posted_to_session_get_feedback(self):
+        created = self.client.post(reverse('step-session-list'), {'problem': self.problem.id}, format='json')
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        session_id = created.json()['session_id']
+        self.assertEqual(created.json()['problem_text'], 'Solve 2x + 3 = 7')
+
+        steps_url = reverse('step-session-steps', args=[session_id])
+        self.client.post(steps_url, {'step': '2x = 4'}, format='json')
+        response = self.client.post(steps_url, {'step': 'x = 3'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        feedback = response.json()
+        self.assertEqual(feedback['step_count'], 2)
+        self.assertFalse(feedback['latest']['follows_previous'])
+        self.assertEqual(self.client.get(reverse('step-session-detail', args=[session_id])).json(), feedback)
+
+    def test_overlapping_append_conflicts(self):
+        session_id = self.client.post(
+            reverse('step-session-list'), {'problem_text': 'Solve x = 1'}, format='json'
+        ).json()['session_id']
+        steps_url = reverse('step-session-steps', args=[session_id])
+        with get_session_store().lock(session_id):
+            response = self.client.post(steps_url, {'step': 'x = 1'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.post(steps_url, {'step': 'x = 1'}, format='json').json()['step_count'], 1)
+
+    def test_other_users_session_not_found(self):
+        session_id = self.client.post(
+            reverse('step-session-list'), {'problem_text': 'Solve x = 1'}, format='json'
+        ).json()['session_id']
+        other = UserProfile.objects.create_user(email='other@example.com', password='testpass123')
+        self.client.force_authenticate(user=other)
+        response = self.client.post(reverse('step-session-steps', args=[session_id]), {'step': 'x = 1'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TieredEquivalenceTests(SimpleTestCase):
+    def test_numeric_probe_decides_common_cases(self):
+        self.assertEqual(tiered_equivalence('(x+1)**2', 'x**2+2*x+1'), (True, 'numeric'))
+        self.assertEqual(tiered_equivalence('x', 'x+1'), (False, 'numeric'))
+
+    def test_inconclusive_probe_escalates_to_simplify(self):
+        # Agrees only on half the complex plane, so the probe can't decide
+        self.assertEqual(tiered_equivalence('sqrt(x**2)', 'x'), (False, 'simplify'))
+
+    def test_unparseable_input(self):
+        self.assertEqual(tiered_equivalence('(', '1'), (False, 'parse_error'))
+
+
+class SymbolicWorkerPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = SymbolicWorkerPool(size=1, timeout=1.0, probes=0)
+        self.addCleanup(self.pool.shutdown)
+        self.pool.check('x', 'x')  # Wait out the worker's sympy import
+
+    def test_hung_worker_is_killed_and_replaced(self):
+        started = time.perf_counter()
+        result = self.pool.check('expand((x + y + z)**200)', 'x')
+        self.assertLess(time.perf_counter() - started, self.pool.timeout + 1.0)
+        self.assertEqual(result, (None, 'timeout'))
+
+        # The replacement worker serves the next call
+        self.assertEqual(self.pool.check('2*x', 'x + x'), (True, 'simplify'))
+        stats = self.pool.stats()
+        self.assertEqual((stats['timeouts'], stats['workers_replaced']), (1, 1))
+        self.assertEqual(stats['idle_workers'], 1)
+
+
+class MathNormalizationTests(SimpleTestCase):
+    def test_rewrites(self):
+        self.assertEqual(normalize_math('2x  +  3 × 4'), '2*x + 3 * 4')
+        self.assertEqual(normalize_math('x^2 ÷ 2'), 'x**2 / 2')
+        self.assertEqual(normalize_math('\\frac{2x}{3}'), '(2*x)/(3)')
+        self.assertEqual(normalize_math('\\sqrt{\\frac{1}{2}}'), 'sqrt((1)/(2))')
+
+    def test_batch_matches_single(self):
+        steps = ['2x = 4', 'x^2', '2x = 4']
+        self.assertEqual(normalize_many(steps), [normalize_math(s) for s in steps])
+
+
+@override_settings(MATH_SYMBOLIC_POOL_SIZE=0)
+class AnswerKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.assessment = Assessment.objects.create(title='Quiz', description='')
+        self.mcq = Question.objects.create(
+            assessment=self.assessment, question_type='MCQ', text='Pick one',
+            options=['A', 'B'], correct_answer='B', concept_tags='algebra'
+        )
+        self.fib = Question.objects.create(
+            assessment=self.assessment, question_type='FIB', text='Solve 2x = 8',
+            correct_answer='x = 4', concept_tags='equations'
+        )
+
+    def test_grades_in_one_pass_from_cached_key(self):
+        get_answer_key(self.assessment.id)
+        with self.assertNumQueries(0):
+            graded = grade_answers(get_answer_key(self.assessment.id), [
+                {'question_id': str(self.fib.id), 'answer': ' X  =  4 '},
+                {'question_id': self.mcq.id, 'answer': 'a'},
+            ])
+
+        self.assertEqual((graded['correct'], graded['total'], graded['score']), (1, 2, 50.0))
+        results = {r['question_id']: r for r in graded['detailed_results']}
+        self.assertTrue(results[self.fib.id]['is_correct'])
+        self.assertFalse(results[self.mcq.id]['is_correct'])
+
+    @patch('backend.tokenization.warm_problem_prefixes')  # Also runs on commit; needs the tokenizer
+    def test_question_changes_invalidate_key(self, warm):
+        get_answer_key(self.assessment.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mcq.correct_answer = 'A'
+            self.mcq.save()
+        graded = grade_answers(get_answer_key(self.assessment.id), [{'question_id': self.mcq.id, 'answer': 'A'}])
+        self.assertEqual(graded['correct'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fib.delete()
+        self.assertEqual(len(get_answer_key(self.assessment.id)['questions']), 1)
+
+
+class ProfileRefreshTests(TestCase):
+    class DeferredExecutor:
+        def __init__(self):
+            self.submitted = []
+
+        def submit(self, fn, *args):
+            self.submitted.append((fn, args))
+
+        def run_all(self):
+            while self.submitted:
+                fn, args = self.submitted.pop(0)
+                fn(*args)
+
+    def setUp(self):
+        self.user = UserProfile.objects.create_user(email='student@example.com', password='testpass123')
+        self.assessment = Assessment.objects.create(title='Quiz', description='')
+        self.executor = self.DeferredExecutor()
+        patcher = patch('backend.profile_updates.get_profile_executor', return_value=self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rating_and_weaknesses_refreshed_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.test_results.create(
+                assessment=self.assessment, score=80,
+                detailed_results=[{'is_correct': False, 'concept': 'fractions', 'question_text': 'Q1'}]
+            )
+            self.assertEqual(self.executor.submitted, [])
+
+        self.executor.run_all()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.rating, 80)
+        self.assertEqual(self.user.weaknesses['primary_weakness'], 'fractions')
+
+    def test_burst_for_one_user_coalesces(self):
+        with patch('backend.profile_updates.refresh_user_profile') as refresh:
+            for _ in range(5):
+                _enqueue(self.user.id)
+            self.assertEqual(len(self.executor.submitted), 1)
+            self.executor.run_all()
+            _enqueue(self.user.id)
+            self.executor.run_all()
+
+        self.assertEqual(refresh.call_count, 2)
+
+
+class RatingStatsTests(TestCase):
+    def setUp(self):
+        self.user = UserProfile.objects.create_user(email='student@example.com', password='testpass123')
+        self.assessment = Assessment.objects.create(title='Quiz', description='')
+
+    def add_results(self, scores):
+        with patch('backend.profile_updates.schedule_profile_refresh'):
+            return [self.user.test_results.create(assessment=self.assessment, score=s, detailed_results=[]) for s in scores]
+
+    def test_incremental_rating_matches_history(self):
+        self.add_results([40, 90, 70, 100, 20, 60, 80])
+        stats = self.user.rating_stats
+        self.assertEqual(
+            {'result_count': stats.result_count, 'score_sum': stats.score_sum, 'recent_scores': stats.recent_scores},
+            history_stats(self.user.id)
+        )
+        self.user.refresh_from_db()
+        self.assertAlmostEqual(self.user.rating, (460 / 7) * 0.6 + 66 * 0.4)
+
+    def test_delete_rebuilds_from_history(self):
+        results = self.add_results([50, 100])
+        with patch('backend.profile_updates.schedule_profile_refresh'), self.captureOnCommitCallbacks(execute=True):
+            results[1].delete()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.rating_stats.result_count, 1)
+        self.assertEqual(self.user.rating, 50)
+
+
+class ConceptWeaknessTests(APITestCase):
+    def setUp(self):
+        self.user = UserProfile.objects.create_user(email='student@example.com', password='testpass123')
+        self.assessment = Assessment.objects.create(title='Quiz', description='')
+
+    def add_result(self, *wrong):
+        detailed_results = [
+            {'is_correct': False, 'concept': concept, 'question_text': question} for concept, question in wrong
+        ] + [{'is_correct': True, 'concept': 'geometry', 'question_text': 'Q0'}]
+        with patch('backend.profile_updates.schedule_profile_refresh'):
+            return self.user.test_results.create(assessment=self.assessment, score=50, detailed_results=detailed_results)
+
+    def test_counters_updated_per_result(self):
+        self.add_result(('fractions, algebra', 'Q1'))
+        self.add_result(('fractions', 'Q2'), ('fractions', 'Q3'), ('fractions', 'Q4'))
+
+        report = weakness_report(self.user.id)
+        self.assertEqual(report['primary_weakness'], 'fractions')
+        self.assertEqual(report['all_weaknesses'], {'fractions': 1.0, 'algebra': 0.25})
+        self.assertEqual(report['detailed_breakdown'][0]['example_questions'], ['Q1', 'Q2', 'Q3'])
+
+        rebuild_concept_weaknesses(self.user.id)
+        self.assertEqual(weakness_report(self.user.id), report)
+
+    def test_new_concept_inserted_concurrently_is_counted(self):
+        """Another submission adding the same new concept first must not make this save fail"""
+        bulk_create = ConceptWeakness.objects.bulk_create
+
+        def racing_bulk_create(objs, **kwargs):
+            # The other submission's row lands between this one's check and insert
+            ConceptWeakness.objects.create(user=self.user, concept='fractions', wrong_count=1, example_questions=['Q1'])
+            return bulk_create(objs, **kwargs)
+
+        with patch.object(ConceptWeakness.objects, 'bulk_create', side_effect=racing_bulk_create):
+            self.add_result(('fractions', 'Q2'))
+
+        breakdown = weakness_report(self.user.id)['detailed_breakdown']
+        self.assertEqual([(row['concept'], row['frequency']) for row in breakdown], [('fractions', 2)])
+        self.assertEqual(breakdown[0]['example_questions'], ['Q1', 'Q2'])
+
+    def test_migration_builds_counters_for_existing_results(self):
+        self.add_result(('fractions, algebra', 'Q1'))
+        self.add_result(('fractions', 'Q2'))
+        report = weakness_report(self.user.id)
+        ConceptWeakness.objects.all().delete()
+
+        migration = importlib.import_module('backend.migrations.0011_conceptweakness')
+        migration.build_counters(django_apps, None)
+        self.assertEqual(weakness_report(self.user.id), report)
+
+    def test_endpoint_reads_without_writing(self):
+        self.add_result(('algebra', 'Q1'))
+        self.client.force_authenticate(user=self.user)
+        with patch.object(UserProfile, 'save') as save:
+            response = self.client.get(reverse('userprofile-weaknesses'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['primary_weakness'], 'algebra')
+        save.assert_not_called()
+
+
+class QuestionAttemptTests(APITestCase):
+    def setUp(self):
+        self.user = UserProfile.objects.create_user(email='student@example.com', password='testpass123')
+        self.assessment = Assessment.objects.create(title='Quiz', description='')
+        self.questions = [
+            Question.objects.create(
+                assessment=self.assessment, text=f'Q{i}', question_type='MCQ',
+                correct_answer='A', concept_tags=concept
+            )
+            for i, concept in enumerate(['fractions', 'algebra, fractions'])
+        ]
+
+    def add_result(self, correct):
+        detailed_results = [
+            {'question_id': q.id, 'question_text': q.text, 'is_correct': ok, 'concept': q.concept_tags}
+            for q, ok in zip(self.questions, correct)
+        ]
+        with patch('backend.profile_updates.schedule_profile_refresh'):
+            return self.user.test_results.create(assessment=self.assessment, score=50, detailed_results=detailed_results)
+
+    def test_attempts_written_with_result(self):
+        self.add_result([True, False])
+        self.add_result([False, False])
+
+        # One row per concept tag, so the two-tag question is stored twice per result
+        self.assertEqual(QuestionAttempt.objects.filter(user=self.user).count(), 6)
+        self.assertEqual(
+            [(row['question_id'], row['attempts'], row['correct']) for row in item_difficulty(self.assessment.id)],
+            [(self.questions[0].id, 2, 1), (self.questions[1].id, 2, 0)]
+        )
+        self.assertEqual({row['concept']: row['mastery'] for row in concept_mastery(self.user.id)},
+                         {'algebra': 0.0, 'fractions': 0.25})
+
+    def test_backfill_skips_results_with_attempts(self):
+        self.add_result([True, False])
+        legacy = self.add_result([True, True])
+        legacy.attempts.all().delete()
+
+        call_command('backfill_question_attempts', chunk_size=1, stdout=StringIO())
+        call_command('backfill_question_attempts', stdout=StringIO())
+        self.assertEqual(legacy.attempts.count(), 3)
+        self.assertEqual(QuestionAttempt.objects.count(), 6)
+
+    def test_backfill_rebuild_splits_joined_concepts(self):
+        result = self.add_result([True, False])
+        result.attempts.filter(question=self.questions[1]).delete()
+        QuestionAttempt.objects.create(
+            test_result=result, user=self.user, assessment=self.assessment, question=self.questions[1],
+            is_correct=False, concept='algebra, fractions', timestamp=result.timestamp
+        )
+
+        call_command('backfill_question_attempts', rebuild=True, stdout=StringIO())
+        self.assertEqual(
+            sorted(result.attempts.values_list('concept', flat=True)), ['algebra', 'fractions', 'fractions']
+        )
+
+    def test_analytics_endpoints(self):
+        self.add_result([True, False])
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('userprofile-concept-mastery'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({row['concept']: row['mastery'] for row in response.json()}, {'algebra': 0.0, 'fractions': 0.5})
+
+        url = reverse('assessment-item-difficulty', args=[self.assessment.id])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        educator = UserProfile.objects.create_user(
+            email='teacher@example.com', password='testpass123', role='EDUCATOR', is_approved=True
+        )
+        self.client.force_authenticate(user=educator)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['p_value'] for row in response.json()], [1.0, 0.0])
+
+
+@override_settings(MATH_SYMBOLIC_POOL_SIZE=0)
+class CanonicalAnswerTests(TestCase):
+    def setUp(self):
+        for target, value in (
+            ('backend.canonical_answers.get_executor', ImmediateExecutor()),
+            ('backend.tokenization.warm_problem_prefixes', None),  # Also runs on commit; needs the tokenizer
+        ):
+            patcher = patch(target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.problem = MathProblem.objects.create(
+                original_id='c1', text='Simplify (x + 1)^2', domain='algebra',
+                grade_level='9th', correct_answer='y = x^2 + 2x + 1'
+            )
+        self.problem.refresh_from_db()
+
+    def test_save_does_not_parse(self):
+        with patch('backend.canonical_answers.canonicalize_answer') as canonicalize:
+            self.problem.correct_answer = '5'
+            self.problem.save()
+            canonicalize.assert_not_called()
+        self.assertIsNone(self.problem.canonical_answer)
+
+    def test_missing_form_computed_when_graded(self):
+        MathProblem.objects.filter(pk=self.problem.pk).update(canonical_answer=None)
+        self.problem.refresh_from_db()
+        self.assertEqual(stored_canonical(self.problem)['normalized'], 'x**2 + 2*x + 1')
+        self.problem.refresh_from_db()
+        self.assertIsNotNone(self.problem.canonical_answer)
+
+    def test_answer_canonicalized_on_save(self):
+        canonical = self.problem.canonical_answer
+        self.assertEqual(canonical['source'], 'y = x^2 + 2x + 1')
+        self.assertEqual(canonical['symbols'], ['x'])
+        self.assertIsNotNone(canonical['srepr'])
+
+        same = step_probe_values('(x + 1)**2', probes=canonical['probes'])
+        different = step_probe_values('(x - 1)**2', probes=canonical['probes'])
+        self.assertTrue(fingerprint_match(same, canonical['fingerprint']))
+        self.assertFalse(fingerprint_match(different, canonical['fingerprint']))
+
+    def test_changed_answer_recomputed(self):
+        self.problem.correct_answer = '7'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.problem.save(update_fields=['correct_answer'])
+
+        self.problem.refresh_from_db()
+        self.assertEqual(self.problem.canonical_answer['normalized'], '7')
+        self.assertIsNotNone(current_canonical('7', self.problem.canonical_answer))
+        self.assertIsNone(current_canonical('8', self.problem.canonical_answer))
+
+
+class GradingJobTests(TestCase):
+    class FakeEvaluator:
+        calls = 0
+
+        def evaluate(self, problem_text, steps, expected=None):
+            self.calls += 1
+            self.expected = expected
+            return {'is_correct': True, 'score': 0.9, 'errors': [], 'expected_answer': '2'}
+
+        def evaluate_many(self, items, batch_size=256, expected=None):
+            self.calls += 1
+            return [
+                {'is_correct': steps[-1] == 'x = 2', 'score': 0.5, 'errors': [], 'expected_answer': '2'}
+                for _, steps in items
+            ]
+
+    def setUp(self):
+        self.user = UserProfile.objects.create_user(email='grader@example.com', password='testpass123')
+        problem = MathProblem.objects.create(
+            original_id='p1', text='Solve 2x = 4', domain='algebra',
+            grade_level='9th', correct_answer='2'
+        )
+        self.workings = MathWorkings.objects.create(
+            problem=problem, steps=['x = 2'], answer='2', submitted_by=self.user
+        )
+        self.job = GradingJob.objects.create(submitted_by=self.user, workings=self.workings)
+
+    def test_job_graded_once_and_results_stored(self):
+        evaluator = self.FakeEvaluator()
+        with patch('backend.grading.get_math_evaluator', return_value=evaluator):
+            run_grading_job(self.job.id)
+            run_grading_job(self.job.id)
+
+        self.job.refresh_from_db()
+        self.workings.refresh_from_db()
+        self.assertEqual(evaluator.calls, 1)
+        self.assertEqual(evaluator.expected['normalized'], '2')
+        self.assertEqual(self.job.status, 'COMPLETED')
+        self.assertEqual(self.job.result['feedback'], "Your solution is correct!")
+        self.assertTrue(self.workings.is_correct)
+        self.assertEqual(self.workings.confidence, 0.9)
+
+    def test_bulk_grading_writes_results_in_chunks(self):
+        extra = MathWorkings.objects.create(
+            problem=self.workings.problem, steps=['x = 3'], answer='3', submitted_by=self.user
+        )
+        evaluator = self.FakeEvaluator()
+        with patch('backend.grading.get_math_evaluator', return_value=evaluator):
+            stats = grade_workings_bulk(
+                MathWorkings.objects.select_related('problem').order_by('id'), chunk_size=1
+            )
+
+        self.assertEqual((stats['graded'], stats['correct']), (2, 1))
+        self.assertEqual(evaluator.calls, 2)
+        self.workings.refresh_from_db()
+        extra.refresh_from_db()
+        self.assertTrue(self.workings.is_correct)
+        self.assertFalse(extra.is_correct)
+        self.assertEqual(extra.confidence, 0.5)
+
+
+class ImmediateExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@override_settings(MATH_SYMBOLIC_POOL_SIZE=0)
+class GradingJobViewTests(APITestCase):
+    def setUp(self):
+        self.user = UserProfile.objects.create_user(email='grader@example.com', password='testpass123')
+        self.problem = MathProblem.objects.create(
+            original_id='p1', text='Solve 2x = 4', domain='algebra',
+            grade_level='9th', correct_answer='2'
+        )
+        self.client.force_authenticate(user=self.user)
+        for target, value in (
+            ('backend.grading.get_grading_executor', ImmediateExecutor()),
+            ('backend.grading.get_math_evaluator', GradingJobTests.FakeEvaluator()),
+        ):
+            patcher = patch(target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def submit(self):
+        return self.client.post(
+            reverse('mathworkings-list'), {'problem': self.problem.id, 'steps': ['x = 2'], 'answer': '2'},
+            format='json'
+        )
+
+    def test_submission_accepted_then_graded(self):
+        with patch('backend.views.enqueue_grading'):
+            response = self.submit()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = response.json()['grading_job']
+        self.assertEqual(job['status'], 'PENDING')
+
+        pending = self.client.get(job['status_url'])
+        self.assertEqual(pending.json()['status'], 'PENDING')
+        self.assertEqual(pending['Retry-After'], '1')
+
+        run_grading_job(job['id'])
+        done = self.client.get(job['status_url'])
+        self.assertEqual(done.json()['status'], 'COMPLETED')
+        self.assertTrue(done.json()['result']['is_correct'])
+        self.assertNotIn('Retry-After', done)
+
+    def test_poll_requeues_job_lost_with_its_worker(self):
+        with patch('backend.views.enqueue_grading'):
+            job_id = self.submit().json()['grading_job']['id']
+        long_ago = timezone.now() - timedelta(minutes=10)
+        GradingJob.objects.filter(id=job_id).update(status='PROCESSING', started_at=long_ago, created_at=long_ago)
+
+        response = self.client.get(reverse('grading-job-status', args=[job_id]))
+        self.assertEqual(response.json()['status'], 'COMPLETED')
+        self.assertEqual(GradingJob.objects.get(id=job_id).attempts, 1)
+
+    @override_settings(MATH_GRADING_MAX_ATTEMPTS=2)
+    def test_job_interrupted_too_often_fails(self):
+        with patch('backend.views.enqueue_grading'):
+            job_id = self.submit().json()['grading_job']['id']
+        long_ago = timezone.now() - timedelta(minutes=10)
+        GradingJob.objects.filter(id=job_id).update(
+            status='PROCESSING', started_at=long_ago, created_at=long_ago, attempts=2
+        )
+
+        self.assertEqual(requeue_stale_jobs(), {'requeued': 0, 'failed': 1})
+        self.assertEqual(GradingJob.objects.get(id=job_id).status, 'FAILED')
+
+    def test_bulk_submission_queued_and_graded_in_batches(self):
+        educator = UserProfile.objects.create_user(
+            email='teacher@example.com', password='testpass123', role='EDUCATOR', is_approved=True
+        )
+        self.client.force_authenticate(user=educator)
+        items = [{'problem': self.problem.id, 'steps': [step]} for step in ('x = 2', 'x = 3')]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('mathworkings-bulk'), {'items': items}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()['count'], 2)
+        jobs = [self.client.get(r['grading_job']['status_url']).json() for r in response.json()['results']]
+        self.assertEqual([job['status'] for job in jobs], ['COMPLETED', 'COMPLETED'])
+        self.assertEqual([job['result']['is_correct'] for job in jobs], [True, False])
+
+    def test_import_command_skips_items_without_steps(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump([{'problem': self.problem.id, 'steps': []}, {'problem': self.problem.id, 'steps': ['x = 2']}], f)
+        self.addCleanup(os.remove, f.name)
+
+        stderr = StringIO()
+        call_command('grade_math_workings', input=f.name, user=self.user.email, stdout=StringIO(), stderr=stderr)
+        self.assertIn('Skipping item 0', stderr.getvalue())
+        self.assertEqual(MathWorkings.objects.filter(submitted_by=self.user).count(), 1)
@@ -0,0 +1,86 @@
+import logging
+import threading
+
+import numpy as np
+
+from .lazy_imports import lazy_module
+
+logger = logging.getLogger(__name__)
+
+tf = lazy_module('tensorflow')
+
+
+def standalone_interpreter():
+    """tflite_runtime's Interpreter, which runs .tflite models without importing TensorFlow, or None"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        return None
+    return Interpreter
+
+
+class TFLiteStepValidator:
+    """
+    Runs a quantized math_step_validator.tflite with the same predict() call
+    the evaluator makes on the Keras model.
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        # The weights stay in this buffer; interpreters built after a fork reuse it copy-on-write
+        with open(model_path, 'rb') as f:
+            self.model_content = f.read()
+        self._build_interpreter()
+
+        inputs = self.interpreter.get_input_details()
+        self._ids_index = self._find_input(inputs, 'input_ids', 0)
+        self._mask_index = self._find_input(inputs, 'attention_mask', 1)
+        self._output_index = self.interpreter.get_output_details()[0]['index']
+
+        signature = next(d for d in inputs if d['index'] == self._ids_index)['shape_signature']
+        self.input_length = None if signature[-1] == -1 else int(signature[-1])
+
+    def _build_interpreter(self):
+        interpreter_class = standalone_interpreter() or tf.lite.Interpreter
+        self.interpreter = interpreter_class(
+            model_content=self.model_content, num_threads=self.num_threads
+        )
+        self.interpreter.allocate_tensors()
+        # The interpreter holds per-call state, so calls from different threads must not overlap
+        self._lock = threading.Lock()
+
+    def reset_after_fork(self):
+        """Give a forked worker its own interpreter and thread pool over the inherited weights"""
+        self._build_interpreter()
+
+    @staticmethod
+    def _find_input(details, name, fallback):
+        for detail in details:
+            if name in detail['name']:
+                return detail['index']
+        return details[fallback]['index']
+
+    def predict(self, inputs, verbose=0):
+        input_ids, attention_mask = (np.asarray(x, dtype=np.int32) for x in inputs)
+        with self._lock:
+            current = self.interpreter.get_input_details()
+            shape = next(d for d in current if d['index'] == self._ids_index)['shape']
+            if tuple(shape) != input_ids.shape:
+                self.interpreter.resize_tensor_input(self._ids_index, input_ids.shape)
+                self.interpreter.resize_tensor_input(self._mask_index, attention_mask.shape)
+                self.interpreter.allocate_tensors()
+            self.interpreter.set_tensor(self._ids_index, input_ids)
+            self.interpreter.set_tensor(self._mask_index, attention_mask)
+            self.interpreter.invoke()
+            return np.array(self.interpreter.get_tensor(self._output_index))
+
+
+def load_tflite_validator(model_path, num_threads=None):
+    try:
+        validator = TFLiteStepValidator(model_path, num_threads=num_threads)
+        logger.info(f"Quantized math evaluator model loaded from {model_path}")
+        return validator
+    except Exception as e:
+        logger.error(f"Failed to load quantized math evaluator model: {str(e)}")
+        return None
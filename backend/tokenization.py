@@ -0,0 +1,148 @@
+import hashlib
+import logging
+
+import numpy as np
+from django.conf import settings
+
+from .evaluator_registry import get_artifact
+from .two_tier_cache import TwoTierCache
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_NAME = 'bert-base-uncased'
+
+# Sequence lengths the step validator is run at. Inputs are padded up to the
+# smallest bucket that fits, so short workings don't pay for a 256-token pass.
+DEFAULT_LENGTH_BUCKETS = (64, 128, 256)
+
+
+def pick_bucket(length: int, buckets) -> int:
+    """Smallest bucket that fits ``length`` tokens, or the largest bucket"""
+    for bucket in sorted(buckets):
+        if length <= bucket:
+            return bucket
+    return max(buckets)
+
+
+def pad_to_bucket(token_ids: list, buckets, pad_token_id: int = 0):
+    """Pad one list of token ids to its bucket, returning (input_ids, attention_mask) as 1xN arrays"""
+    bucket = pick_bucket(len(token_ids), buckets)
+    token_ids = token_ids[:bucket]
+    input_ids = np.full((1, bucket), pad_token_id, dtype=np.int32)
+    attention_mask = np.zeros((1, bucket), dtype=np.int32)
+    input_ids[0, :len(token_ids)] = token_ids
+    attention_mask[0, :len(token_ids)] = 1
+    return input_ids, attention_mask
+
+
+def encode_to_bucket(tokenizer, text: str, buckets):
+    """Tokenize ``text`` once and pad it to the smallest bucket that fits"""
+    token_ids = tokenizer(
+        text,
+        truncation=True,
+        max_length=max(buckets)
+    )['input_ids']
+    return pad_to_bucket(token_ids, buckets, tokenizer.pad_token_id or 0)
+
+
+def group_by_bucket(tokenizer, texts: list, buckets) -> dict:
+    """
+    Tokenize a list of texts and group them by bucket.
+    Returns {bucket: (input_ids, attention_mask, row_indices)} where the arrays
+    are padded to the bucket length and row_indices point back into ``texts``.
+    """
+    encoded = tokenizer(texts, truncation=True, max_length=max(buckets))['input_ids']
+    pad_id = tokenizer.pad_token_id or 0
+
+    rows = {}
+    for index, token_ids in enumerate(encoded):
+        rows.setdefault(pick_bucket(len(token_ids), buckets), []).append(index)
+
+    groups = {}
+    for bucket, indices in rows.items():
+        input_ids = np.full((len(indices), bucket), pad_id, dtype=np.int32)
+        attention_mask = np.zeros((len(indices), bucket), dtype=np.int32)
+        for row, index in enumerate(indices):
+            token_ids = encoded[index][:bucket]
+            input_ids[row, :len(token_ids)] = token_ids
+            attention_mask[row, :len(token_ids)] = 1
+        groups[bucket] = (input_ids, attention_mask, indices)
+    return groups
+
+
+def get_tokenizer():
+    """Shared fast (Rust-backed) BERT tokenizer for this process"""
+    def load():
+        from transformers import BertTokenizerFast
+        return BertTokenizerFast.from_pretrained(TOKENIZER_NAME)
+    return get_artifact(f'tokenizer:{TOKENIZER_NAME}', load)
+
+
+class ProblemPrefixCache:
+    """
+    Token ids of the "Problem: ..." prefix, keyed by a hash of the problem text.
+    Every student answering the same problem shares one tokenization, so only
+    their workings are tokenized per request. The shared tier of its TwoTierCache
+    lets a prefix tokenized in one worker (e.g. when the problem was saved)
+    be reused by the others.
+    """
+
+    def __init__(self, max_size=5000, shared_alias=None, shared_timeout=86400):
+        self.cache = TwoTierCache(
+            f"prefix:{TOKENIZER_NAME}", max_size=max_size,
+            shared_alias=shared_alias, shared_timeout=shared_timeout
+        )
+
+    def make_key(self, problem_text: str) -> str:
+        return self.cache.make_key(hashlib.sha1(problem_text.encode('utf-8')).hexdigest())
+
+    def get_prefix(self, tokenizer, problem_text: str) -> list:
+        """Prefix token ids (no special tokens), tokenizing on a miss"""
+        key = self.make_key(problem_text)
+        token_ids = self.cache.get(key)
+        if token_ids is None:
+            token_ids = tokenizer(
+                f"Problem: {problem_text}\n", add_special_tokens=False
+            )['input_ids']
+            self.cache.set(key, token_ids)
+        return token_ids
+
+    def warm(self, tokenizer, problem_texts):
+        """Tokenize prefixes ahead of the first submission"""
+        for problem_text in problem_texts:
+            self.get_prefix(tokenizer, problem_text)
+
+    def encode(self, tokenizer, problem_text: str, workings: list, buckets):
+        """
+        Same ids as tokenizing f"Problem: {problem_text}\nWorkings: {...}" in one go,
+        padded to the smallest fitting bucket, but with the prefix served from cache.
+        """
+        prefix = self.get_prefix(tokenizer, problem_text)
+        body = tokenizer(
+            f"Workings: {' '.join(workings)}", add_special_tokens=False
+        )['input_ids']
+        content = (prefix + body)[:max(buckets) - 2]
+        token_ids = [tokenizer.cls_token_id] + content + [tokenizer.sep_token_id]
+        return pad_to_bucket(token_ids, buckets, tokenizer.pad_token_id or 0)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+def get_prefix_cache():
+    return get_artifact(
+        'problem-prefix-cache',
+        lambda: ProblemPrefixCache(
+            max_size=getattr(settings, 'MATH_PREFIX_CACHE_SIZE', 5000),
+            shared_alias=getattr(settings, 'MATH_PREFIX_SHARED_CACHE', None),
+            shared_timeout=getattr(settings, 'MATH_PREFIX_SHARED_CACHE_TIMEOUT', 86400)
+        )
+    )
+
+
+def warm_problem_prefixes(problem_texts):
+    """Tokenize and cache problem prefixes; run after problems are created or imported"""
+    try:
+        get_prefix_cache().warm(get_tokenizer(), problem_texts)
+    except Exception as e:
+        logger.warning(f"Could not warm problem prefix cache: {str(e)}")
@@ -0,0 +1,105 @@
+"""
+Bounded in-process LRU in front of an optional Django cache shared between
+workers. The evaluation, symbolic and problem-prefix caches all sit on this;
+each namespaces its keys with its own prefix.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class TwoTierCache:
+    """
+    A local hit is served from this process; a local miss falls back to the
+    shared tier (``shared_alias``, if set) and keeps what it finds locally.
+    Entries optionally expire ``ttl`` seconds after they were stored locally.
+    """
+
+    def __init__(self, prefix, max_size=10000, ttl=None, shared_alias=None, shared_timeout=86400):
+        self.prefix = prefix
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_alias = shared_alias
+        self.shared_timeout = shared_timeout
+        self._entries = OrderedDict()  # key -> (expires_at or None, value)
+        self._lock = threading.Lock()
+        self._counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'expired': 0}
+
+    def make_key(self, digest: str) -> str:
+        return f"{self.prefix}:{digest}"
+
+    def get(self, key):
+        """Cached value for a full key (see make_key), or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters['local_hits'] += 1
+                    return value
+                del self._entries[key]
+                self._counters['expired'] += 1
+
+        value = self._shared_get(key)
+        if value is not None:
+            self._store_local(key, value)
+            self._count('shared_hits')
+            return value
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        self._store_local(key, value)
+        self._shared_set(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._counters)
+            data['size'] = len(self._entries)
+        lookups = data['local_hits'] + data['shared_hits'] + data['misses']
+        data['max_size'] = self.max_size
+        data['hit_rate'] = round((lookups - data['misses']) / lookups, 3) if lookups else 0.0
+        return data
+
+    def _store_local(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _shared_get(self, key):
+        if not self.shared_alias:
+            return None
+        try:
+            return caches[self.shared_alias].get(key)
+        except Exception as e:
+            logger.warning(f"Shared {self.prefix} cache read failed: {str(e)}")
+            return None
+
+    def _shared_set(self, key, value):
+        if not self.shared_alias:
+            return
+        try:
+            caches[self.shared_alias].set(key, value, self.shared_timeout)
+        except Exception as e:
+            logger.warning(f"Shared {self.prefix} cache write failed: {str(e)}")
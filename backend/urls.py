@@ -3,12 +3,13 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     ProgramViewSet, ModuleViewSet, TopicViewSet,
     TopicResourceViewSet, AssessmentViewSet,
-    UserViewSet, QuestionViewSet, ContentUploadViewSet, check_math_answer,
+    UserViewSet, QuestionViewSet, ContentUploadViewSet, check_math_answer, evaluator_status, grading_job_status,
+    evaluator_metrics,
     RegisterView, LoginView, LogoutView, check_auth, get_csrf,
     CustomTokenObtainPairView,UserProfileView,
     UserManagementAPIView, UserDetailAPIView, dashboard_view,
     MathWorkingsViewSet, MathProblemViewSet,
-    SubmitAnswerView
+    SubmitAnswerView, StepSessionViewSet
 )
 from rest_framework_simplejwt.views import (
     TokenRefreshView,TokenVerifyView
@@ -25,6 +26,7 @@ router.register(r'math-problems', MathProblemViewSet)
 router.register(r'math-workings', MathWorkingsViewSet)
 router.register(r'questions', QuestionViewSet)
 router.register(r'content-uploads', ContentUploadViewSet, basename='content-upload')
+router.register(r'step-sessions', StepSessionViewSet, basename='step-session')
 
 urlpatterns = [
     path('auth/csrf/', get_csrf, name='get-csrf'),
@@ -32,6 +34,9 @@ urlpatterns = [
     path('auth/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/check-math/', check_math_answer, name='check_math'),
+    path('api/evaluator-status/', evaluator_status, name='evaluator-status'),
+    path('api/evaluator-metrics/', evaluator_metrics, name='evaluator-metrics'),
+    path('api/grading-jobs/<uuid:job_id>/', grading_job_status, name='grading-job-status'),
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/login/', LoginView.as_view(), name='login'),
     path('auth/logout/', LogoutView.as_view(), name='logout'),
@@ -12,8 +12,8 @@ from .models import (
     Program, Module, Topic, TopicResource,
     Assessment, Question, UserProfile,
     UserProgress, TestResult, ContentUpload,
-    Question, Answer,
-    MathProblem, MathWorkings
+    Question, Answer, AnswerWorking,
+    MathProblem, MathWorkings, GradingJob
 )
 from .serializers import (
     ProgramSerializer, ModuleSerializer, TopicSerializer,
@@ -24,29 +24,27 @@ from .serializers import (
     UserRegisterSerializer, UserLoginSerializer,
     AnswerSubmissionSerializer, AnswerSerializer, AnswerWorkingSerializer,
     MathWorkingsSerializer, MathProblemSerializer,
-    AnswerWithWorkingsSerializer
+    AnswerWithWorkingsSerializer, GradingJobSerializer, BulkWorkingsSerializer,
+    StepSessionCreateSerializer, StepAppendSerializer
 
 )
 from django.contrib.auth.models import User
 from django.db.models import Sum, FloatField, F, Count, Q
 from django.db.models.functions import Cast
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-from collections import defaultdict
 from django.contrib.auth import get_user_model, authenticate, logout
 import threading
-from django.http import JsonResponse
-from sympy import sympify, simplify, Eq, symbols
-from sympy.parsing.sympy_parser import parse_expr
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import permission_classes
 import os
 from django.conf import settings
 from pathlib import Path
-from firebase_admin import auth
 from django.contrib.auth import login
 import re
+import hmac
 from rest_framework.views import APIView
 from rest_framework.permissions import BasePermission
 from .permissions import IsApprovedEducator, IsAdminUser
@@ -58,19 +56,25 @@ from django.core.exceptions import ValidationError as DjangoValidationError
 from .services import process_content_upload, update_upload_status
 from django.core.cache import cache
 from concurrent.futures import ThreadPoolExecutor
-import tensorflow as tf
-from tensorflow.keras.preprocessing.text import Tokenizer
-from tensorflow.keras.preprocessing.sequence import pad_sequences
-import numpy as np
-from .math_evaluator import MathAnswerEvaluator
+from .lazy_imports import lazy_module
+from .answer_key import get_answer_key, grade_answers
+from .evaluator_metrics import StageTimer, get_stage_metrics
+from .evaluator_registry import get_math_evaluator, registry_status
+from .evaluator_service import EvaluatorServiceError
+from .grading import enqueue_bulk_grading, enqueue_grading, is_stale, requeue_stale_jobs
+from .step_session import StepSession, StepSessionConflict, get_session_store
+from .question_attempts import concept_mastery, item_difficulty
+from .weakness_stats import weakness_report
 
 
 
 logger = logging.getLogger(__name__)
 
+# Only EnhancedWeaknessAnalysis needs TensorFlow; import it there, not at worker boot
+tf = lazy_module('tensorflow')
+
 User = get_user_model()
 
-math_evaluator = MathAnswerEvaluator()
 
 class RegisterView(APIView):
     permission_classes = [AllowAny]
@@ -217,40 +221,25 @@ class AssessmentViewSet(viewsets.ModelViewSet):
     queryset = Assessment.objects.all()
     serializer_class = AssessmentSerializer
 
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsApprovedEducator | IsAdminUser])
+    def item_difficulty(self, request, pk=None):
+        assessment = self.get_object()
+        return Response(item_difficulty(assessment.id))
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def submit(self, request, pk=None):
         assessment = self.get_object()
         answers = request.data.get('answers', [])
         
-        # Calculate score
-        questions = assessment.questions.all()
-        total_questions = questions.count()
-        correct = 0
-        
-        detailed_results = []
-        for question in questions:
-            user_answer = next((a for a in answers if a['question_id'] == question.id), None)
-            is_correct = user_answer and str(user_answer['answer']).lower() == str(question.correct_answer).lower()
-            if is_correct:
-                correct += 1
-                
-            detailed_results.append({
-                'question_id': question.id,
-                'question_text': question.text,
-                'correct_answer': question.correct_answer,
-                'user_answer': user_answer['answer'] if user_answer else None,
-                'is_correct': is_correct,
-                'concept': question.concept_tags
-            })
-        
-        score = (correct / total_questions) * 100 if total_questions > 0 else 0
+        # Calculate score against the cached answer key
+        graded = grade_answers(get_answer_key(assessment.id), answers)
         
         # Create test result
         test_result = TestResult.objects.create(
             user=request.user,
             assessment=assessment,
-            score=score,
-            detailed_results=detailed_results
+            score=graded['score'],
+            detailed_results=graded['detailed_results']
         )
         
         serializer = TestResultSerializer(test_result)
@@ -278,68 +267,18 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=['get'])
     def weaknesses(self, request):
-        weaknesses = analyze_user_weaknesses(request.user)
-        return Response(weaknesses)
+        return Response(weakness_report(request.user.id))
+
+    @action(detail=False, methods=['get'])
+    def concept_mastery(self, request):
+        return Response(concept_mastery(request.user.id))
 
 def analyze_user_weaknesses(user):
-    # Get all test results for the user
-    test_results = TestResult.objects.filter(user=user)
-    
-    if not test_results.exists():
-        return {}
-    
-    # Collect all wrong answers with their concepts
-    wrong_answers = []
-    for result in test_results:
-        for item in result.detailed_results:
-            if not item['is_correct']:
-                wrong_answers.append({
-                    'concept': item['concept'],
-                    'question': item['question_text']
-                })
-    
-    if not wrong_answers:
-        return {}
-    
-    # Simple frequency analysis of wrong concepts
-    concept_counts = defaultdict(int)
-    for answer in wrong_answers:
-        concepts = [c.strip() for c in answer['concept'].split(',') if c.strip()]
-        for concept in concepts:
-            concept_counts[concept] += 1
-    
-    # Normalize counts to 0-1 range
-    max_count = max(concept_counts.values()) if concept_counts else 1
-    weaknesses = {
-        concept: count / max_count
-        for concept, count in concept_counts.items()
-    }
-    
-    # Sort by severity
-    sorted_weaknesses = sorted(weaknesses.items(), key=lambda x: x[1], reverse=True)
-    
-    # Prepare weakness data
-    weakness_data = {
-        'primary_weakness': sorted_weaknesses[0][0] if sorted_weaknesses else None,
-        'all_weaknesses': dict(sorted_weaknesses[:5]),  # Top 5 weaknesses
-        'detailed_breakdown': [
-            {
-                'concept': concept,
-                'frequency': count,
-                'normalized_score': weaknesses[concept],
-                'example_questions': [
-                    a['question'] for a in wrong_answers 
-                    if concept in [c.strip() for c in a['concept'].split(',')]
-                ][:3]  # Show 3 example questions
-            }
-            for concept, count in concept_counts.items()
-        ]
-    }
-    
-    # Update user directly (no profile attribute needed)
-    user.weaknesses = weakness_data
-    user.save()
-    
+    """Weakness report from the user's concept counters, stored on the profile when it changed"""
+    weakness_data = weakness_report(user.id)
+    if user.weaknesses != weakness_data:
+        user.weaknesses = weakness_data
+        user.save(update_fields=['weaknesses'])
     return weakness_data
 
 
@@ -496,29 +435,101 @@ class ContentUploadViewSet(viewsets.ModelViewSet):
 @permission_classes([AllowAny])
 def check_math_answer(request):
     data = request.data
-    evaluator = MathAnswerEvaluator()  # Your TensorFlow service
+    evaluator = get_math_evaluator()
     
     try:
         problem_text = data.get('problem_text', '')
         user_workings = data.get('workings', [])
         user_answer = data.get('user_answer', '')
+
+        # Staff (or DEBUG) can ask for the per-stage timings of this evaluation
+        debug = str(data.get('debug', request.query_params.get('debug', ''))).lower() in ('1', 'true')
+        timer = StageTimer() if debug and (settings.DEBUG or request.user.is_staff) else None
         
         # Evaluate using hybrid approach
-        result = evaluator.evaluate(problem_text, user_workings)
+        result = evaluator.evaluate(problem_text, user_workings, timer=timer)
         
         # Additional symbolic check if needed
         if user_answer:
-            symbolic_check = evaluator._symbolic_check(
+            symbolic_check, symbolic_tier = evaluator._symbolic_check_with_tier(
                 user_answer, 
                 result['expected_answer']
             )
             result['symbolic_correct'] = symbolic_check
+            result['symbolic_tier'] = symbolic_tier
+            result['symbolic_status'] = (
+                'undetermined' if symbolic_check is None
+                else 'correct' if symbolic_check else 'incorrect'
+            )
+
+        if timer is not None:
+            result['timings_ms'] = timer.as_ms()
         
         return Response(result)
     
     except Exception as e:
         return Response({'error': str(e)}, status=400)
-    
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def evaluator_status(request):
+    """Report whether this worker has the evaluator warm, for cold-worker alerts"""
+    status_data = registry_status()
+    if not IsAdminUser().has_permission(request, None):
+        # Health checks only need warm/cold; pid, memory and model paths are for admins
+        return Response({'model_ready': status_data['model_ready']})
+    return Response(status_data)
+
+
+def can_scrape_metrics(request) -> bool:
+    """Admins, or a scraper sending 'Authorization: Bearer <MATH_EVALUATOR_METRICS_TOKEN>'"""
+    token = getattr(settings, 'MATH_EVALUATOR_METRICS_TOKEN', None)
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return IsAdminUser().has_permission(request, None)
+
+
+@require_GET
+def evaluator_metrics(request):
+    """Evaluation stage histograms in the Prometheus text format, from the evaluator service if one is configured"""
+    if not can_scrape_metrics(request):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    if getattr(settings, 'MATH_EVALUATOR_SOCKET', None):
+        try:
+            text = get_math_evaluator().metrics_text()
+        except EvaluatorServiceError as e:
+            return HttpResponse(str(e), status=503, content_type='text/plain')
+    else:
+        metrics = get_stage_metrics()
+        text = metrics.prometheus_text() if metrics is not None else ''
+    return HttpResponse(text, content_type='text/plain; version=0.0.4')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def grading_job_status(request, job_id):
+    """Poll a background grading job; result is filled in once it is COMPLETED"""
+    job = get_object_or_404(GradingJob, id=job_id, submitted_by=request.user)
+    if is_stale(job):
+        # Its worker was likely restarted; hand it to this process instead
+        requeue_stale_jobs(job_ids=[job.id])
+        job.refresh_from_db()
+    headers = {'Retry-After': '1'} if job.status in ('PENDING', 'PROCESSING') else None
+    return Response(GradingJobSerializer(job).data, headers=headers)
+
+
+def _grading_job_payload(request, job):
+    return {
+        'grading_job': {
+            'id': str(job.id),
+            'status': job.status,
+            'status_url': request.build_absolute_uri(
+                reverse('grading-job-status', args=[job.id])
+            ),
+        }
+    }
+
 
 class IsApprovedEducator(BasePermission):
     def has_permission(self, request, view):
@@ -815,42 +826,32 @@ class SubmitAnswerView(APIView):
         serializer = AnswerWithWorkingsSerializer(data=request.data)
         
         if serializer.is_valid():
+            steps = serializer.validated_data.get('steps', [])
             with transaction.atomic():
                 answer = Answer.objects.create(
                     user=request.user,
                     question=question,
                     response=serializer.validated_data['response'],
-                    is_correct=False  # Will be updated
+                    is_correct=False  # Set by the background grader
                 )
-                
-                if 'workings' in serializer.validated_data:
-                    workings_data = serializer.validated_data['workings']
-                    workings = MathWorkings.objects.create(
-                        problem=question,
-                        steps=workings_data['steps'],
-                        answer=serializer.validated_data['response'],
-                        submitted_by=request.user
-                    )
-                    
-                    # Evaluate and update answer based on workings
-                    evaluation = math_evaluator.evaluate(
-                        question.text,
-                        workings.steps
+                if not steps:
+                    return Response(
+                        AnswerWithWorkingsSerializer(answer).data,
+                        status=status.HTTP_201_CREATED
                     )
-                    answer.is_correct = evaluation['is_correct']
-                    answer.save()
-                    
-                    # Update workings with evaluation results
-                    workings.is_correct = evaluation['is_correct']
-                    workings.confidence = evaluation['score']
-                    workings.error_types = evaluation['errors']
-                    workings.feedback = self._generate_feedback(evaluation)
-                    workings.save()
-                
-                return Response(
-                    AnswerWithWorkingsSerializer(answer).data,
-                    status=status.HTTP_201_CREATED
-                )
+
+                AnswerWorking.objects.bulk_create([
+                    AnswerWorking(answer=answer, step_number=index, content=step)
+                    for index, step in enumerate(steps, start=1)
+                ])
+                # Grading runs after commit, so no transaction is held open during inference
+                job = GradingJob.objects.create(submitted_by=request.user, answer=answer)
+                enqueue_grading(job.id)
+
+            return Response(
+                {**AnswerWithWorkingsSerializer(answer).data, **_grading_job_payload(request, job)},
+                status=status.HTTP_202_ACCEPTED
+            )
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -874,12 +875,12 @@ class EnhancedWeaknessAnalysis(APIView):
             return Response({})
         
         # Enhanced analysis with TF
-        tokenizer = Tokenizer(num_words=1000)
+        tokenizer = tf.keras.preprocessing.text.Tokenizer(num_words=1000)
         questions = [item['question'] for item in incorrect_answers]
         tokenizer.fit_on_texts(questions)
         
         sequences = tokenizer.texts_to_sequences(questions)
-        padded = pad_sequences(sequences, maxlen=50)
+        padded = tf.keras.preprocessing.sequence.pad_sequences(sequences, maxlen=50)
         
         # Load pre-trained concept classifier
         concept_model = tf.keras.models.load_model('concept_classifier.h5')
@@ -918,35 +919,97 @@ class MathWorkingsViewSet(viewsets.ModelViewSet):
     serializer_class = MathWorkingsSerializer
     permission_classes = [IsAuthenticated]
 
-    def perform_create(self, serializer):
-        workings = serializer.save(submitted_by=self.request.user)
-        
-        # Evaluate the workings
-        evaluation = math_evaluator.evaluate(
-            workings.problem.text,
-            workings.steps
+    def create(self, request, *args, **kwargs):
+        """Store the workings and queue grading; poll the returned status_url for the result"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            workings = serializer.save(submitted_by=request.user)
+            job = GradingJob.objects.create(submitted_by=request.user, workings=workings)
+            enqueue_grading(job.id)
+
+        return Response(
+            {**serializer.data, **_grading_job_payload(request, job)},
+            status=status.HTTP_202_ACCEPTED
         )
-        
-        # Update with evaluation results
-        workings.is_correct = evaluation['is_correct']
-        workings.confidence = evaluation['score']
-        workings.error_types = evaluation['errors']
-        workings.feedback = self._generate_feedback(evaluation)
-        workings.save()
-
-    def _generate_feedback(self, evaluation):
-        if evaluation['is_correct']:
-            return "Your solution is correct!"
-        
-        feedback = "There are some issues with your solution:\n"
-        if 'sign_error' in evaluation['errors']:
-            feedback += "- Check your sign changes when moving terms\n"
-        if 'missing_step' in evaluation['errors']:
-            feedback += "- Some steps seem to be missing in your reasoning\n"
-        
-        return feedback
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsApprovedEducator | IsAdminUser])
+    def bulk(self, request):
+        """
+        Store many workings in one call, e.g. when importing a class's submissions, and queue
+        them for batched grading; each returned grading job can be polled like a single submission
+        """
+        serializer = BulkWorkingsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        chunk_size = getattr(settings, 'MATH_BULK_CHUNK_SIZE', 1000)
+        with transaction.atomic():
+            workings = MathWorkings.objects.bulk_create([
+                MathWorkings(
+                    problem=item['problem'],
+                    steps=item['steps'],
+                    answer=item.get('answer') or item['steps'][-1],
+                    submitted_by=request.user
+                )
+                for item in serializer.validated_data['items']
+            ], batch_size=chunk_size)
+            jobs = GradingJob.objects.bulk_create([
+                GradingJob(submitted_by=request.user, workings=w) for w in workings
+            ], batch_size=chunk_size)
+            # Grading runs after commit, off the request, so large imports can't hit the worker timeout
+            enqueue_bulk_grading([job.id for job in jobs])
+
+        return Response({
+            'count': len(jobs),
+            'results': [
+                {'id': w.id, 'problem': w.problem_id, **_grading_job_payload(request, job)}
+                for w, job in zip(workings, jobs)
+            ]
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class StepSessionViewSet(viewsets.ViewSet):
+    """
+    Live feedback while workings are entered: create a session for a problem,
+    post steps one at a time, and read the accumulated feedback.
+    """
+    permission_classes = [IsAuthenticated]
 
+    def create(self, request):
+        serializer = StepSessionCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = StepSession(serializer.validated_data['problem_text'], user_id=request.user.id)
+        get_session_store().save(session)
+        return Response(session.feedback(), status=status.HTTP_201_CREATED)
 
+    def retrieve(self, request, pk=None):
+        return Response(self._get_session(request, pk).feedback())
+
+    def destroy(self, request, pk=None):
+        self._get_session(request, pk)
+        get_session_store().delete(pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=True, methods=['post'])
+    def steps(self, request, pk=None):
+        """Append one step; only that step is tokenized and parsed"""
+        serializer = StepAppendSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        store = get_session_store()
+        try:
+            with store.lock(pk):
+                session = self._get_session(request, pk)
+                session.append(serializer.validated_data['step'])
+                store.save(session)
+        except StepSessionConflict:
+            return Response(
+                {'error': 'Another step is being added to this session; retry'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(session.feedback())
 
+    def _get_session(self, request, session_id):
+        session = get_session_store().get(session_id)
+        if session is None or session.user_id != request.user.id:
+            raise Http404("No such step session")
+        return session
@@ -0,0 +1,109 @@
+"""
+Per-user, per-concept weakness counters.
+
+ConceptWeakness keeps how many answers of each concept a user got wrong and the
+first few of those questions. A new TestResult adds its wrong answers inside
+the transaction that saves it, so the weakness report is assembled from one
+indexed query over the user's counters instead of every detailed_results blob.
+Edited or deleted results are rebuilt from history; counters for results
+saved before this table existed are built by its migration.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ConceptWeakness, TestResult
+
+
+def split_concepts(concept_tags) -> list:
+    """A question's comma-separated concept tags, stripped, without blanks or repeats"""
+    return list(dict.fromkeys(tag.strip() for tag in str(concept_tags or '').split(',') if tag.strip()))
+
+
+def wrong_concepts(detailed_results) -> list:
+    """(concept, question_text) for every concept of every wrong answer, in order"""
+    wrong = []
+    for item in detailed_results or []:
+        if item.get('is_correct'):
+            continue
+        for concept in split_concepts(item.get('concept')):
+            wrong.append((concept, item.get('question_text')))
+    return wrong
+
+
+def _apply(counters: dict, wrong: list):
+    for concept, question in wrong:
+        counter = counters.setdefault(concept, {'wrong_count': 0, 'example_questions': []})
+        counter['wrong_count'] += 1
+        if len(counter['example_questions']) < ConceptWeakness.EXAMPLE_QUESTIONS:
+            counter['example_questions'].append(question)
+
+
+def record_weaknesses(user_id, detailed_results):
+    """Add a just-saved result's wrong answers to the user's concept counters"""
+    wrong = wrong_concepts(detailed_results)
+    if not wrong:
+        return
+    concepts = list(dict.fromkeys(concept for concept, _ in wrong))  # First-seen order becomes row order
+    with transaction.atomic():
+        # Insert missing rows first, skipping any a concurrent submission just added,
+        # so the locked read below sees every row and the two can't both insert one
+        ConceptWeakness.objects.bulk_create(
+            [ConceptWeakness(user_id=user_id, concept=concept) for concept in concepts], ignore_conflicts=True
+        )
+        rows = {
+            row.concept: row for row in ConceptWeakness.objects.select_for_update().filter(
+                user_id=user_id, concept__in=concepts
+            )
+        }
+        counters = {
+            concept: {'wrong_count': row.wrong_count, 'example_questions': list(row.example_questions)}
+            for concept, row in rows.items()
+        }
+        _apply(counters, wrong)
+
+        for concept, row in rows.items():
+            row.wrong_count = counters[concept]['wrong_count']
+            row.example_questions = counters[concept]['example_questions']
+            row.updated_at = timezone.now()  # bulk_update doesn't apply auto_now
+        ConceptWeakness.objects.bulk_update(rows.values(), ['wrong_count', 'example_questions', 'updated_at'])
+
+
+def rebuild_concept_weaknesses(user_id):
+    """Recompute the user's concept counters from all of their test results"""
+    counters = {}
+    results = TestResult.objects.filter(user_id=user_id).order_by('id').values_list('detailed_results', flat=True)
+    for detailed_results in results.iterator():
+        _apply(counters, wrong_concepts(detailed_results))
+    with transaction.atomic():
+        ConceptWeakness.objects.filter(user_id=user_id).delete()
+        ConceptWeakness.objects.bulk_create(
+            ConceptWeakness(user_id=user_id, concept=concept, **counter) for concept, counter in counters.items()
+        )
+
+
+def weakness_report(user_id) -> dict:
+    """The weaknesses payload (primary, top 5, per-concept breakdown) from the user's counters"""
+    rows = list(
+        ConceptWeakness.objects.filter(user_id=user_id, wrong_count__gt=0).order_by('id').values_list(
+            'concept', 'wrong_count', 'example_questions'
+        )
+    )
+    if not rows:
+        return {}
+
+    max_count = max(count for _, count, _ in rows)
+    # Stable sort keeps first-seen order among equally weak concepts
+    ranked = sorted(rows, key=lambda row: row[1], reverse=True)
+    return {
+        'primary_weakness': ranked[0][0],
+        'all_weaknesses': {concept: count / max_count for concept, count, _ in ranked[:5]},  # Top 5 weaknesses
+        'detailed_breakdown': [
+            {
+                'concept': concept,
+                'frequency': count,
+                'normalized_score': count / max_count,
+                'example_questions': examples,
+            }
+            for concept, count, examples in rows
+        ]
+    }
@@ -267,3 +267,107 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Math evaluator inference
+# Concurrent evaluations are grouped into one forward pass. Requests wait at
+# most MAX_WAIT_MS for others to join before the batch is sent to the model.
+MATH_EVALUATOR_BATCHING = True
+MATH_EVALUATOR_MAX_BATCH_SIZE = 32
+MATH_EVALUATOR_MAX_WAIT_MS = 5
+
+# Models trained with --length-buckets accept any of these sequence lengths.
+# Each input is padded to the smallest one that fits.
+MATH_EVALUATOR_LENGTH_BUCKETS = (64, 128, 256)
+
+# Symbolic equivalence results are memoized in an in-process LRU. Set
+# MATH_SYMBOLIC_SHARED_CACHE to a CACHES alias to also share them between workers.
+MATH_SYMBOLIC_CACHE_SIZE = 10000
+MATH_SYMBOLIC_SHARED_CACHE = 'default'
+MATH_SYMBOLIC_SHARED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# sympy checks run in this many worker processes. A check that runs longer
+# than MATH_SYMBOLIC_TIMEOUT seconds is killed and reported as undetermined.
+# Set the pool size to 0 to run checks in the request thread.
+MATH_SYMBOLIC_POOL_SIZE = 2
+MATH_SYMBOLIC_TIMEOUT = 2.0
+
+# Answers are first compared numerically at MATH_NUMERIC_PROBES random points.
+# sympy.simplify is only used when that comparison is inconclusive.
+MATH_NUMERIC_PROBES = 8
+MATH_NUMERIC_TOLERANCE = 1e-8
+
+# 'student' serves the distilled model from train_math_evaluator --distill.
+MATH_EVALUATOR_VARIANT = 'teacher'
+
+# Use backend/models/math_step_validator.tflite (written by export_math_evaluator)
+# instead of the .h5 when it exists.
+MATH_EVALUATOR_PREFER_TFLITE = True
+MATH_EVALUATOR_TFLITE_THREADS = None
+
+# Tokenized "Problem: ..." prefixes, shared by every submission for a problem.
+# Prefixes are warmed when a problem is saved; the shared tier lets other workers reuse them.
+MATH_PREFIX_CACHE_SIZE = 5000
+MATH_PREFIX_SHARED_CACHE = 'default'
+MATH_PREFIX_SHARED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Submitted workings are graded by this many background threads per process;
+# clients poll /api/grading-jobs/<id>/ for the result.
+MATH_GRADING_WORKERS = 2
+
+# A job still PENDING or PROCESSING after this many seconds is assumed lost with
+# its worker and requeued; after MATH_GRADING_MAX_ATTEMPTS claims it is FAILED.
+MATH_GRADING_STALE_SECONDS = 60
+MATH_GRADING_MAX_ATTEMPTS = 3
+
+# Bulk grading (POST math-workings/bulk/ and grade_math_workings): rows per
+# forward pass, rows per bulk_update, and the per-request item limit.
+MATH_BULK_BATCH_SIZE = 256
+MATH_BULK_CHUNK_SIZE = 1000
+MATH_BULK_MAX_ITEMS = 5000
+
+# Finished evaluations keyed by model version, problem and whitespace-normalized
+# steps, so resubmitted workings skip the model. Set MATH_EVALUATOR_MODEL_VERSION
+# to pin the version explicitly; otherwise it comes from the artifact's size and mtime.
+MATH_EVALUATION_CACHE_SIZE = 20000
+MATH_EVALUATION_CACHE_TTL = 60 * 60
+MATH_EVALUATION_SHARED_CACHE = 'default'
+MATH_EVALUATION_SHARED_CACHE_TIMEOUT = 60 * 60
+MATH_EVALUATOR_MODEL_VERSION = None
+
+# Live step-by-step feedback sessions are kept in this cache for this many seconds
+MATH_STEP_SESSION_CACHE = 'default'
+MATH_STEP_SESSION_TIMEOUT = 60 * 30
+
+# How long one step append may hold its session; an overlapping append gets a 409
+MATH_STEP_SESSION_LOCK_TIMEOUT = 30
+
+# benchmark_startup fails if a web worker takes longer than this to boot
+STARTUP_IMPORT_BUDGET_SECONDS = 3.0
+
+# With gunicorn.conf.py (preload_app), load the tokenizer and the .tflite step
+# validator in the master so workers share them instead of each loading a copy.
+# The model is only preloaded when tflite_runtime is installed, so the master never imports TensorFlow.
+MATH_EVALUATOR_PRELOAD = True
+
+# Path of the run_evaluator_service socket. When set, web processes send evaluations
+# there (waiting at most MATH_EVALUATOR_SOCKET_TIMEOUT seconds) instead of loading the model.
+MATH_EVALUATOR_SOCKET = None
+MATH_EVALUATOR_SOCKET_TIMEOUT = 30.0
+
+# Record how long each evaluation stage (tokenize, predict, detect_errors, symbolic)
+# takes into histograms served at /api/evaluator-metrics/; bucket bounds in seconds.
+MATH_EVALUATOR_STAGE_METRICS = True
+MATH_EVALUATOR_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Bearer token a Prometheus scraper sends for /api/evaluator-metrics/; otherwise admins only.
+MATH_EVALUATOR_METRICS_TOKEN = os.getenv('MATH_EVALUATOR_METRICS_TOKEN')
+
+# Compiled assessment answer keys used by AssessmentViewSet.submit; dropped
+# whenever one of the assessment's questions is saved or deleted.
+ASSESSMENT_ANSWER_KEY_CACHE = 'default'
+ASSESSMENT_ANSWER_KEY_TIMEOUT = 60 * 60
+
+# Threads per process that refresh a student's stored weakness report after
+# they submit an assessment (coalesced per student)
+PROFILE_REFRESH_WORKERS = 1
+
+# Rows per INSERT when a result's per-question attempts are written
+QUESTION_ATTEMPT_BATCH_SIZE = 500
@@ -0,0 +1,64 @@
+"""
+Gunicorn settings for the education API:
+
+    gunicorn -c gunicorn.conf.py education.wsgi
+
+The app is imported once in the master (preload_app) and the math evaluator's
+fork-safe artifacts, the BERT tokenizer and the quantized .tflite step
+validator, are loaded there too. Workers inherit those pages copy-on-write
+instead of each holding a copy, so a host fits more workers. post_fork gives
+every worker its own TFLite interpreter, thread pool, micro-batcher and sympy
+workers; those can't be shared across fork. Once booted, a worker requeues
+grading jobs that a killed or restarted worker left pending.
+
+The master never imports TensorFlow, whose runtime does not survive fork: the
+.tflite model is preloaded only when tflite_runtime is installed, and a Keras
+.h5 model never is. Run export_math_evaluator to get a .tflite model.
+
+Each worker logs its memory after boot; compare pss_mb (shared pages split
+between processes) rather than rss_mb. GET /api/evaluator-status/ reports the
+same figures to admins for whichever worker serves it.
+"""
+import gc
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+worker_class = 'gthread'
+# Concurrent requests in one worker share forward passes through the micro-batcher
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = 60
+preload_app = True
+
+
+def when_ready(server):
+    """Master, after the app is imported and before any worker is forked"""
+    from backend.evaluator_registry import preload_for_fork
+    from backend.process_memory import process_memory
+
+    preload_for_fork()
+    # Stop the collector from touching, and so copying, objects the workers inherit
+    gc.freeze()
+    server.log.info(f"Master memory after preload: {process_memory()}")
+
+
+def post_fork(server, worker):
+    from backend.evaluator_registry import reinit_after_fork
+    from backend.executors import reset_after_fork
+
+    reinit_after_fork()
+    reset_after_fork()
+
+
+def post_worker_init(worker):
+    from backend.grading import requeue_stale_jobs
+    from backend.process_memory import process_memory
+
+    worker.log.info(f"Worker memory: {process_memory()}")
+    # Pick up grading jobs a killed or restarted worker left behind
+    try:
+        requeued = requeue_stale_jobs()
+        if requeued['requeued'] or requeued['failed']:
+            worker.log.info(f"Grading jobs recovered: {requeued}")
+    except Exception as e:
+        worker.log.error(f"Could not requeue stale grading jobs: {str(e)}")